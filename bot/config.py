@@ -3,6 +3,7 @@
 """
 
 import os
+import socket
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -23,11 +24,72 @@ class Config:
         if id_.strip()
     ]
     
+    # --- Режим получения обновлений ---
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling")  # polling | webhook
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")  # публичный URL, путь = путь сервера
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_LISTEN: str = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    PORT: int = int(os.getenv("PORT", "8080"))
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+    UPDATE_QUEUE_SIZE: int = int(os.getenv("UPDATE_QUEUE_SIZE", "1000"))
+    
     # --- Database ---
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
     
     # --- OpenAI ---
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    # Другой адрес API — например, локальный фейк (python -m bot.fake_openai): http://localhost:8099/v1
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
+    
+    # --- Очередь проверки ДЗ ---
+    GRADING_CONCURRENCY: int = int(os.getenv("GRADING_CONCURRENCY", "5"))
+    GRADING_MAX_QUEUE: int = int(os.getenv("GRADING_MAX_QUEUE", "100"))
+    GRADING_NOTICE_DEPTH: int = int(os.getenv("GRADING_NOTICE_DEPTH", "3"))  # с какой глубины писать «вы в очереди»
+    GRADING_STALE_SECONDS: int = int(os.getenv("GRADING_STALE_SECONDS", "600"))  # PROCESSING дольше — сбрасывает периодическая задача
+    
+    # --- Кэш вердиктов LLM ---
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    LLM_CACHE_TTL_HOURS: int = int(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+    LLM_CACHE_MEMORY_SIZE: int = int(os.getenv("LLM_CACHE_MEMORY_SIZE", "1000"))
+    
+    # --- Circuit breaker OpenAI ---
+    LLM_BREAKER_THRESHOLD: int = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))  # ошибок подряд до размыкания
+    LLM_BREAKER_RESET_SECONDS: int = int(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))  # пауза до пробного запроса
+    
+    # --- Повторы запросов к OpenAI (временные ошибки: 429, 5xx, обрыв, таймаут) ---
+    LLM_RETRY_MAX_ATTEMPTS: int = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3"))
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))  # сек, удваивается
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", "4"))
+    LLM_DEADLINE_SECONDS: float = float(os.getenv("LLM_DEADLINE_SECONDS", "0"))  # на все попытки; 0 — 2 × LLM_TIMEOUT
+    # Страхующий второй запрос, если первый дольше p95 (не для потокового режима)
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+    LLM_HEDGE_MIN_SECONDS: float = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "2"))
+    
+    # --- Потоковый отзыв на ДЗ (правки сообщения «Проверяю ответ...» по мере ответа модели) ---
+    LLM_STREAMING: bool = os.getenv("LLM_STREAMING", "true").lower() in ("1", "true", "yes")
+    STREAM_EDIT_INTERVAL: float = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))  # сек между правками
+    
+    # --- Телеметрия LLM (таблица llm_calls) ---
+    LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-4o-mini")
+    LLM_TELEMETRY_BATCH_SIZE: int = int(os.getenv("LLM_TELEMETRY_BATCH_SIZE", "100"))
+    LLM_TELEMETRY_FLUSH_SECONDS: float = float(os.getenv("LLM_TELEMETRY_FLUSH_SECONDS", "10"))
+    LLM_TELEMETRY_MAX_BUFFER: int = int(os.getenv("LLM_TELEMETRY_MAX_BUFFER", "10000"))
+    # Цены модели, USD за 1M токенов (для /llmstat)
+    LLM_PRICE_INPUT_PER_1M: float = float(os.getenv("LLM_PRICE_INPUT_PER_1M", "0.15"))
+    LLM_PRICE_CACHED_INPUT_PER_1M: float = float(os.getenv("LLM_PRICE_CACHED_INPUT_PER_1M", "0.075"))
+    LLM_PRICE_OUTPUT_PER_1M: float = float(os.getenv("LLM_PRICE_OUTPUT_PER_1M", "0.60"))
+    
+    # --- Контексты уроков для проверки ДЗ (profile.md + lessons.json, перезагружаются без рестарта) ---
+    GRADING_CONTEXTS_DIR: str = os.getenv("GRADING_CONTEXTS_DIR", "")  # пусто — grading_contexts/ в корне проекта
+    GRADING_CONTEXTS_POLL_SECONDS: float = float(os.getenv("GRADING_CONTEXTS_POLL_SECONDS", "10"))  # 0 — только /reload_contexts
+    
+    # --- Бюджет ответа студента во входе модели (токенов; по урокам — answer_token_budget в grading_contexts/lessons.json) ---
+    LLM_ANSWER_TOKEN_BUDGET: int = int(os.getenv("LLM_ANSWER_TOKEN_BUDGET", "1200"))
+    
+    # --- Похожие ответы (MinHash-индекс по урокам) ---
+    SIMILARITY_ENABLED: bool = os.getenv("SIMILARITY_ENABLED", "true").lower() in ("1", "true", "yes")
+    SIMILARITY_THRESHOLD: float = float(os.getenv("SIMILARITY_THRESHOLD", "0.9"))  # оценка сходства Жаккара
+    SIMILARITY_REFRESH_SECONDS: float = float(os.getenv("SIMILARITY_REFRESH_SECONDS", "30"))  # догрузка новых подписей
     
     # --- Settings ---
     TIMEZONE: str = os.getenv("TIMEZONE", "Asia/Almaty")
@@ -36,6 +98,25 @@ class Config:
     RATE_LIMIT_PER_HOUR: int = int(os.getenv("RATE_LIMIT_PER_HOUR", "7"))
     TOTAL_LESSONS: int = int(os.getenv("TOTAL_LESSONS", "18"))
     
+    # --- Отправка сообщений (лимиты Telegram) ---
+    SEND_RATE_PER_SECOND: float = float(os.getenv("SEND_RATE_PER_SECOND", "30"))
+    SEND_PER_CHAT_INTERVAL: float = float(os.getenv("SEND_PER_CHAT_INTERVAL", "1"))
+    SEND_CONCURRENCY: int = int(os.getenv("SEND_CONCURRENCY", "10"))
+    
+    # Имя процесса (для метаданных задач планировщика при нескольких worker-ах)
+    INSTANCE_NAME: str = os.getenv("DYNO", f"{socket.gethostname()}:{os.getpid()}")
+    
+    # --- Открытие уроков (календарные дни в TIMEZONE) ---
+    UNLOCK_DELAY_DAYS: int = int(os.getenv("UNLOCK_DELAY_DAYS", "2"))
+    UNLOCK_HOUR: int = int(os.getenv("UNLOCK_HOUR", "10"))
+    UNLOCK_POLL_SECONDS: int = int(os.getenv("UNLOCK_POLL_SECONDS", "60"))
+    
+    # --- Outbox (очередь исходящих) ---
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+    OUTBOX_RETRY_SECONDS: int = int(os.getenv("OUTBOX_RETRY_SECONDS", "30"))
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+    
     @classmethod
     def validate(cls) -> list[str]:
         """Проверка обязательных переменных"""
@@ -49,6 +130,13 @@ class Config:
             errors.append("OPENAI_API_KEY не задан")
         if not cls.CURATOR_ID:
             errors.append("CURATOR_ID не задан")
+        if cls.BOT_MODE not in ("polling", "webhook"):
+            errors.append(f"BOT_MODE должен быть polling или webhook, а не {cls.BOT_MODE}")
+        if cls.BOT_MODE == "webhook":
+            if not cls.WEBHOOK_URL:
+                errors.append("WEBHOOK_URL не задан (BOT_MODE=webhook)")
+            if not cls.WEBHOOK_SECRET:
+                errors.append("WEBHOOK_SECRET не задан (BOT_MODE=webhook)")
             
         return errors
 
@@ -3,6 +3,8 @@
 """
 
 import asyncpg
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Optional
 
 from bot.config import config
@@ -12,6 +14,75 @@ from bot.config import config
 _pool: Optional[asyncpg.Pool] = None
 
 
+# ============================================
+# Счётчик запросов (на одно обновление / блок кода)
+# ============================================
+
+class QueryCounter:
+    """Количество SQL-запросов внутри count_queries()"""
+
+    def __init__(self):
+        self.count = 0
+
+
+# Активные счётчики: вложенные count_queries() считают запросы вместе
+_query_counters: ContextVar[tuple] = ContextVar("query_counters", default=())
+
+
+@contextmanager
+def count_queries():
+    """
+    Считать запросы к БД внутри блока (в текущем asyncio-контексте).
+
+        with count_queries() as counter:
+            await handler(update, context)
+        counter.count  # сколько раз сходили в БД
+    """
+    counter = QueryCounter()
+    token = _query_counters.set(_query_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _query_counters.reset(token)
+
+
+def _track_query():
+    for counter in _query_counters.get():
+        counter.count += 1
+
+
+class CountingConnection(asyncpg.Connection):
+    """Соединение, которое отмечает каждый запрос в активном QueryCounter"""
+
+    async def execute(self, *args, **kwargs):
+        _track_query()
+        return await super().execute(*args, **kwargs)
+
+    async def executemany(self, *args, **kwargs):
+        _track_query()
+        return await super().executemany(*args, **kwargs)
+
+    async def fetch(self, *args, **kwargs):
+        _track_query()
+        return await super().fetch(*args, **kwargs)
+
+    async def fetchrow(self, *args, **kwargs):
+        _track_query()
+        return await super().fetchrow(*args, **kwargs)
+
+    async def fetchval(self, *args, **kwargs):
+        _track_query()
+        return await super().fetchval(*args, **kwargs)
+
+    async def reset(self, *, timeout=None):
+        # Сброс соединения при возврате в пул — служебный запрос, не считаем
+        token = _query_counters.set(())
+        try:
+            return await super().reset(timeout=timeout)
+        finally:
+            _query_counters.reset(token)
+
+
 async def get_pool() -> asyncpg.Pool:
     """Получить пул соединений (создаёт при первом вызове)"""
     global _pool
@@ -20,7 +91,8 @@ async def get_pool() -> asyncpg.Pool:
         _pool = await asyncpg.create_pool(
             config.DATABASE_URL,
             min_size=2,
-            max_size=10
+            max_size=10,
+            connection_class=CountingConnection
         )
     
     return _pool
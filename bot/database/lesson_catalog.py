@@ -0,0 +1,152 @@
+"""
+Каталог уроков в памяти процесса
+
+Таблица lessons маленькая (18 строк) и меняется редко, поэтому загружаем её
+целиком при старте и отдаём уроки из памяти. Триггер на lessons шлёт NOTIFY,
+каталог перечитывается — так несколько воркеров остаются согласованными.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import asyncpg
+
+from bot.config import config
+from bot.database.connection import get_pool
+from bot.database.models import Lesson
+
+logger = logging.getLogger(__name__)
+
+# Канал NOTIFY (см. migrations/005_lessons_notify.sql)
+LESSONS_CHANNEL = "lessons_changed"
+
+# Пауза перед переподключением слушателя после обрыва соединения
+RECONNECT_DELAY = 5
+
+# Явный список колонок — лишние колонки в таблице не ломают Lesson(...)
+LESSON_COLUMNS = "id, order_num, title, content_text, video_url, has_homework, homework_type"
+
+
+class LessonCatalog:
+    """Кэш уроков с инвалидацией через LISTEN/NOTIFY"""
+
+    def __init__(self):
+        self._by_id: Dict[int, Lesson] = {}
+        self._by_order: Dict[int, Lesson] = {}
+        self._loaded = False
+        self._dirty = False
+        self._conn: Optional[asyncpg.Connection] = None
+        self._reload_task: Optional[asyncio.Task] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def loaded(self) -> bool:
+        """Каталог загружен и актуален"""
+        return self._loaded
+
+    def get(self, lesson_id: int) -> Optional[Lesson]:
+        """Урок по ID"""
+        return self._by_id.get(lesson_id)
+
+    def get_by_order(self, order_num: int) -> Optional[Lesson]:
+        """Урок по порядковому номеру"""
+        return self._by_order.get(order_num)
+
+    def all(self) -> List[Lesson]:
+        """Все уроки по порядку"""
+        return [self._by_order[n] for n in sorted(self._by_order)]
+
+    async def load(self):
+        """Перечитать все уроки из БД"""
+        pool = await get_pool()
+        rows = await pool.fetch(f"SELECT {LESSON_COLUMNS} FROM lessons ORDER BY order_num")
+        lessons = [Lesson(**dict(row)) for row in rows]
+
+        # Подменяем словари целиком — читатели не увидят полузагруженный каталог
+        self._by_id = {lesson.id: lesson for lesson in lessons}
+        self._by_order = {lesson.order_num: lesson for lesson in lessons}
+        self._loaded = True
+        logger.info(f"Каталог уроков загружен: {len(lessons)} шт.")
+
+    async def start(self):
+        """Загрузить каталог и подписаться на изменения"""
+        self._stopping = False
+        if self._conn is None:
+            await self._listen()
+        await self.load()
+
+    async def stop(self):
+        """Отписаться от изменений и сбросить каталог"""
+        self._stopping = True
+
+        for task in (self._reload_task, self._reconnect_task):
+            if task and not task.done():
+                task.cancel()
+        self._reload_task = None
+        self._reconnect_task = None
+
+        if self._conn is not None:
+            try:
+                await self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+        self.invalidate()
+
+    def invalidate(self):
+        """Сбросить каталог — до перезагрузки запросы идут в БД"""
+        self._by_id = {}
+        self._by_order = {}
+        self._loaded = False
+
+    async def _listen(self):
+        """Отдельное соединение под LISTEN (пул сбрасывает подписки при release)"""
+        self._conn = await asyncpg.connect(config.DATABASE_URL)
+        await self._conn.add_listener(LESSONS_CHANNEL, self._on_notify)
+        self._conn.add_termination_listener(self._on_terminate)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        """Уведомление об изменении lessons — перечитываем каталог"""
+        self._dirty = True
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload())
+
+    async def _reload(self):
+        """Перезагрузка, пока приходят новые уведомления"""
+        while self._dirty:
+            self._dirty = False
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error(f"Не удалось перечитать каталог уроков: {e}")
+                self.invalidate()
+                return
+
+    def _on_terminate(self, conn):
+        """Соединение слушателя оборвалось — уведомления могут потеряться"""
+        self._conn = None
+        self.invalidate()
+        if self._stopping:
+            return
+
+        logger.warning("Соединение LISTEN потеряно, каталог уроков сброшен")
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        """Переподключение слушателя с паузой"""
+        while not self._stopping:
+            await asyncio.sleep(RECONNECT_DELAY)
+            try:
+                await self.start()
+                logger.info("Слушатель каталога уроков переподключён")
+                return
+            except Exception as e:
+                logger.warning(f"Не удалось переподключить слушатель каталога: {e}")
+
+
+# Синглтон каталога
+lesson_catalog = LessonCatalog()
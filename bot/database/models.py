@@ -47,6 +47,7 @@ class UserProgress:
     lesson_id: int
     status: str  # LOCKED, OPEN, COMPLETED
     completed_at: Optional[datetime]
+    unlock_at: Optional[datetime] = None  # когда открыть следующий урок
 
 
 @dataclass
@@ -60,6 +61,7 @@ class Submission:
     ai_verdict: Optional[str]
     ai_message: Optional[str]
     created_at: datetime
+    is_fallback: bool = False  # вердикт без модели (OpenAI недоступен) — перепроверить позже
 
 
 @dataclass
@@ -79,3 +81,32 @@ class SupportQuestion:
     student_id: int
     lesson_id: Optional[int]
     created_at: datetime
+
+
+@dataclass
+class UserContext:
+    """Пользователь + зачисление + прогресс по текущему уроку (одним запросом)"""
+    user: User
+    enrollment: Optional[Enrollment]
+    progress: Optional[UserProgress]
+
+    @property
+    def state(self) -> str:
+        return self.user.state
+
+
+@dataclass
+class OutboxMessage:
+    """Исходящее сообщение в очереди"""
+    id: int
+    chat_id: int
+    text: str
+    kind: str
+    dedupe_key: Optional[str]
+    status: str  # PENDING, SENDING, DELIVERED, FAILED
+    attempts: int
+    last_error: Optional[str]
+    next_attempt_at: datetime
+    locked_until: Optional[datetime]
+    created_at: datetime
+    sent_at: Optional[datetime]
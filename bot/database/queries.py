@@ -2,11 +2,33 @@
 SQL-запросы к базе данных
 """
 
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List
 
+from bot.config import config
 from bot.database.connection import get_pool
-from bot.database.models import User, Lesson, Enrollment, UserProgress, Submission, AccessCode, SupportQuestion
+from bot.database.lesson_catalog import lesson_catalog, LESSON_COLUMNS
+from bot.database.models import (
+    User, Lesson, Enrollment, UserProgress, Submission, AccessCode, SupportQuestion, UserContext,
+    OutboxMessage
+)
+
+
+# Время открытия следующего урока: начало дня завершения в TIMEZONE
+# + UNLOCK_DELAY_DAYS календарных дней + UNLOCK_HOUR часов.
+# Параметры: часовой пояс, дни, час (номера плейсхолдеров — в _unlock_at_sql).
+# completed_at — момент завершения (timestamptz), по умолчанию сейчас.
+def _unlock_at_sql(first_param: int, completed_at: str = "NOW()") -> str:
+    tz, days, hour = (f"${first_param + i}" for i in range(3))
+    return (
+        f"(date_trunc('day', {completed_at} AT TIME ZONE {tz}::text)"
+        f" + make_interval(days => {days}::int, hours => {hour}::int)) AT TIME ZONE {tz}::text"
+    )
+
+
+def _unlock_policy() -> tuple:
+    return config.TIMEZONE, config.UNLOCK_DELAY_DAYS, config.UNLOCK_HOUR
 
 
 # ============================================
@@ -25,6 +47,59 @@ async def get_user(tg_id: int) -> Optional[User]:
     return None
 
 
+async def get_user_context(tg_id: int) -> Optional[UserContext]:
+    """
+    Пользователь, его зачисление и прогресс по текущему уроку — одним запросом.
+    Используется как контекст одного обновления (см. bot/services/user_context.py).
+    """
+    pool = await get_pool()
+    row = await pool.fetchrow(
+        """
+        SELECT
+            u.tg_id, u.username, u.full_name, u.created_at, u.state, u.last_activity,
+            e.id AS enrollment_id, e.start_date, e.current_lesson_id,
+            up.id AS progress_id, up.status AS progress_status, up.completed_at
+        FROM users u
+        LEFT JOIN enrollments e ON e.user_id = u.tg_id
+        LEFT JOIN user_progress up ON up.user_id = u.tg_id AND up.lesson_id = e.current_lesson_id
+        WHERE u.tg_id = $1
+        """,
+        tg_id
+    )
+    if not row:
+        return None
+
+    user = User(
+        tg_id=row["tg_id"],
+        username=row["username"],
+        full_name=row["full_name"],
+        created_at=row["created_at"],
+        state=row["state"],
+        last_activity=row["last_activity"]
+    )
+
+    enrollment = None
+    if row["enrollment_id"] is not None:
+        enrollment = Enrollment(
+            id=row["enrollment_id"],
+            user_id=tg_id,
+            start_date=row["start_date"],
+            current_lesson_id=row["current_lesson_id"]
+        )
+
+    progress = None
+    if row["progress_id"] is not None:
+        progress = UserProgress(
+            id=row["progress_id"],
+            user_id=tg_id,
+            lesson_id=row["current_lesson_id"],
+            status=row["progress_status"],
+            completed_at=row["completed_at"]
+        )
+
+    return UserContext(user=user, enrollment=enrollment, progress=progress)
+
+
 async def create_user(tg_id: int, username: str, full_name: str) -> User:
     """Создать нового пользователя"""
     pool = await get_pool()
@@ -48,6 +123,30 @@ async def update_user_state(tg_id: int, state: str):
     )
 
 
+async def release_processing(tg_id: int, state: str) -> bool:
+    """Сменить PROCESSING на state (False — проверка уже записала своё состояние)"""
+    pool = await get_pool()
+    row = await pool.fetchrow(
+        "UPDATE users SET state = $1 WHERE tg_id = $2 AND state = 'PROCESSING' RETURNING tg_id",
+        state, tg_id
+    )
+    return row is not None
+
+
+async def release_stale_processing(state: str, older_than_seconds: int) -> List[int]:
+    """Сбросить PROCESSING, не обновлявшийся дольше older_than_seconds (0 — все)"""
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """
+        UPDATE users SET state = $1
+        WHERE state = 'PROCESSING' AND last_activity <= NOW() - INTERVAL '1 second' * $2
+        RETURNING tg_id
+        """,
+        state, older_than_seconds
+    )
+    return [row["tg_id"] for row in rows]
+
+
 async def update_last_activity(tg_id: int):
     """Обновить время последней активности и сбросить напоминания"""
     pool = await get_pool()
@@ -67,10 +166,13 @@ async def update_last_activity(tg_id: int):
 # ============================================
 
 async def get_lesson(lesson_id: int) -> Optional[Lesson]:
-    """Получить урок по ID"""
+    """Получить урок по ID (из каталога в памяти, если он загружен)"""
+    if lesson_catalog.loaded:
+        return lesson_catalog.get(lesson_id)
+
     pool = await get_pool()
     row = await pool.fetchrow(
-        "SELECT * FROM lessons WHERE id = $1",
+        f"SELECT {LESSON_COLUMNS} FROM lessons WHERE id = $1",
         lesson_id
     )
     if row:
@@ -79,10 +181,13 @@ async def get_lesson(lesson_id: int) -> Optional[Lesson]:
 
 
 async def get_lesson_by_order(order_num: int) -> Optional[Lesson]:
-    """Получить урок по порядковому номеру"""
+    """Получить урок по порядковому номеру (из каталога, если он загружен)"""
+    if lesson_catalog.loaded:
+        return lesson_catalog.get_by_order(order_num)
+
     pool = await get_pool()
     row = await pool.fetchrow(
-        "SELECT * FROM lessons WHERE order_num = $1",
+        f"SELECT {LESSON_COLUMNS} FROM lessons WHERE order_num = $1",
         order_num
     )
     if row:
@@ -92,8 +197,11 @@ async def get_lesson_by_order(order_num: int) -> Optional[Lesson]:
 
 async def get_all_lessons() -> List[Lesson]:
     """Получить все уроки"""
+    if lesson_catalog.loaded:
+        return lesson_catalog.all()
+
     pool = await get_pool()
-    rows = await pool.fetch("SELECT * FROM lessons ORDER BY order_num")
+    rows = await pool.fetch(f"SELECT {LESSON_COLUMNS} FROM lessons ORDER BY order_num")
     return [Lesson(**dict(row)) for row in rows]
 
 
@@ -204,16 +312,16 @@ async def set_lesson_status(user_id: int, lesson_id: int, status: str):
 
 
 async def complete_lesson(user_id: int, lesson_id: int):
-    """Завершить урок"""
+    """Завершить урок и взвести таймер открытия следующего (unlock_at)"""
     pool = await get_pool()
     await pool.execute(
-        """
-        INSERT INTO user_progress (user_id, lesson_id, status, completed_at)
-        VALUES ($1, $2, 'COMPLETED', NOW())
+        f"""
+        INSERT INTO user_progress (user_id, lesson_id, status, completed_at, unlock_at)
+        VALUES ($1, $2, 'COMPLETED', NOW(), {_unlock_at_sql(3)})
         ON CONFLICT (user_id, lesson_id) 
-        DO UPDATE SET status = 'COMPLETED', completed_at = NOW()
+        DO UPDATE SET status = 'COMPLETED', completed_at = NOW(), unlock_at = EXCLUDED.unlock_at
         """,
-        user_id, lesson_id
+        user_id, lesson_id, *_unlock_policy()
     )
 
 
@@ -227,18 +335,61 @@ async def create_submission(
     content_text: str,
     content_type: str,
     ai_verdict: str,
-    ai_message: str
+    ai_message: str,
+    is_fallback: bool = False
 ) -> Submission:
     """Сохранить сданное ДЗ"""
     pool = await get_pool()
     row = await pool.fetchrow(
         """
         INSERT INTO submissions 
-        (user_id, lesson_id, content_text, content_type, ai_verdict, ai_message)
-        VALUES ($1, $2, $3, $4, $5, $6)
+        (user_id, lesson_id, content_text, content_type, ai_verdict, ai_message, is_fallback)
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
         RETURNING *
         """,
-        user_id, lesson_id, content_text, content_type, ai_verdict, ai_message
+        user_id, lesson_id, content_text, content_type, ai_verdict, ai_message, is_fallback
+    )
+    return Submission(**dict(row))
+
+
+async def record_homework_submission(
+    user_id: int,
+    lesson_id: int,
+    content_text: str,
+    content_type: str,
+    ai_verdict: str,
+    ai_message: str,
+    next_state: str,
+    is_fallback: bool = False
+) -> Submission:
+    """
+    Сохранить ДЗ одним запросом (атомарно):
+    submission + завершение урока (только ACCEPT) + новое состояние пользователя.
+    Завершение взводит таймер открытия следующего урока, как complete_lesson().
+    is_fallback — вердикт выставлен без модели (для последующей перепроверки).
+    """
+    pool = await get_pool()
+    row = await pool.fetchrow(
+        f"""
+        WITH sub AS (
+            INSERT INTO submissions
+            (user_id, lesson_id, content_text, content_type, ai_verdict, ai_message, is_fallback)
+            VALUES ($1, $2, $3, $4, $5, $6, $11)
+            RETURNING *
+        ), progress AS (
+            INSERT INTO user_progress (user_id, lesson_id, status, completed_at, unlock_at)
+            SELECT $1, $2, 'COMPLETED', NOW(), {_unlock_at_sql(8)}
+            WHERE $5 = 'ACCEPT'
+            ON CONFLICT (user_id, lesson_id)
+            DO UPDATE SET status = 'COMPLETED', completed_at = NOW(), unlock_at = EXCLUDED.unlock_at
+        ), user_state AS (
+            UPDATE users SET state = $7, last_activity = NOW()
+            WHERE tg_id = $1
+        )
+        SELECT * FROM sub
+        """,
+        user_id, lesson_id, content_text, content_type, ai_verdict, ai_message, next_state,
+        *_unlock_policy(), is_fallback
     )
     return Submission(**dict(row))
 
@@ -339,7 +490,7 @@ async def get_inactive_users(days: int = 3) -> List[User]:
 async def get_users_ready_for_next_lesson() -> List[dict]:
     """
     Получить пользователей, которым пора открыть следующий урок.
-    Условие: прошло >= 1 день с момента завершения текущего урока.
+    Условие: наступил unlock_at текущего урока (см. complete_lesson).
     """
     pool = await get_pool()
     rows = await pool.fetch(
@@ -354,7 +505,7 @@ async def get_users_ready_for_next_lesson() -> List[dict]:
         INNER JOIN user_progress up ON up.user_id = e.user_id AND up.lesson_id = e.current_lesson_id
         WHERE
             up.status = 'COMPLETED'
-            AND up.completed_at::date + 2 <= CURRENT_DATE
+            AND up.unlock_at <= LOCALTIMESTAMP
             AND l.order_num < 18
             -- Проверяем, что следующий урок ещё НЕ открыт
             AND NOT EXISTS (
@@ -403,6 +554,115 @@ async def unlock_next_lesson(user_id: int, current_order: int):
     return next_lesson_id
 
 
+async def arm_missing_unlock_timers() -> int:
+    """
+    Взвести таймеры для уроков, завершённых до появления unlock_at: по тому же
+    правилу, что при завершении (день завершения в TIMEZONE + UNLOCK_DELAY_DAYS,
+    UNLOCK_HOUR). Выполняется при каждом старте; повтор безопасен — выбираются
+    только завершённые текущие уроки без таймера, у которых следующий урок ещё
+    не открыт (открытие сбрасывает таймер и создаёт прогресс следующего урока).
+    """
+    pool = await get_pool()
+    result = await pool.execute(
+        f"""
+        UPDATE user_progress up
+        SET unlock_at = {_unlock_at_sql(1, "up.completed_at::timestamptz")}
+        FROM enrollments e, lessons l, lessons next_l
+        WHERE up.unlock_at IS NULL
+          AND up.status = 'COMPLETED'
+          AND up.completed_at IS NOT NULL
+          AND e.user_id = up.user_id
+          AND e.current_lesson_id = up.lesson_id
+          AND l.id = up.lesson_id
+          AND next_l.order_num = l.order_num + 1
+          AND NOT EXISTS (
+              SELECT 1 FROM user_progress up2
+              WHERE up2.user_id = up.user_id AND up2.lesson_id = next_l.id
+          )
+        """,
+        *_unlock_policy()
+    )
+    return int(result.split()[-1])
+
+
+async def unlock_ready_lessons(notification_template: Optional[str] = None) -> List[dict]:
+    """
+    Открыть следующий урок всем, у кого наступил таймер unlock_at — одним запросом.
+    Наступившие таймеры выбираются по частичному индексу и сбрасываются,
+    поэтому стоимость зависит от числа открытий, а не от размера когорты.
+
+    Сдвигает enrollments.current_lesson_id, открывает user_progress (OPEN)
+    и возвращает user_id, order_num, title открытых уроков для уведомлений.
+    Повторный/параллельный запуск безопасен: таймеры захватываются
+    FOR UPDATE SKIP LOCKED, UPDATE проверяет, что current_lesson_id не изменился.
+
+    notification_template: текст уведомления для outbox в формате SQL format()
+    (первый %s — номер урока, второй — название). Уведомления ставятся
+    в очередь в том же запросе — открытие урока без уведомления невозможно.
+    """
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """
+        WITH due AS (
+            SELECT id, user_id, lesson_id, status
+            FROM user_progress
+            WHERE unlock_at <= LOCALTIMESTAMP
+            FOR UPDATE SKIP LOCKED
+        ), cleared AS (
+            -- Таймер срабатывает один раз (в т.ч. если открывать уже нечего)
+            UPDATE user_progress up
+            SET unlock_at = NULL
+            FROM due d
+            WHERE up.id = d.id
+        ), ready AS (
+            SELECT
+                e.user_id,
+                e.current_lesson_id,
+                next_l.id AS next_lesson_id
+            FROM due d
+            INNER JOIN enrollments e ON e.user_id = d.user_id AND e.current_lesson_id = d.lesson_id
+            INNER JOIN lessons l ON l.id = d.lesson_id
+            INNER JOIN lessons next_l ON next_l.order_num = l.order_num + 1
+            WHERE
+                d.status = 'COMPLETED'
+                AND l.order_num < 18
+                -- Следующий урок ещё НЕ открыт
+                AND NOT EXISTS (
+                    SELECT 1 FROM user_progress up2
+                    WHERE up2.user_id = e.user_id AND up2.lesson_id = next_l.id
+                )
+        ), advanced AS (
+            UPDATE enrollments e
+            SET current_lesson_id = r.next_lesson_id
+            FROM ready r
+            WHERE e.user_id = r.user_id AND e.current_lesson_id = r.current_lesson_id
+            RETURNING e.user_id, e.current_lesson_id
+        ), opened AS (
+            INSERT INTO user_progress (user_id, lesson_id, status)
+            SELECT user_id, current_lesson_id, 'OPEN' FROM advanced
+            ON CONFLICT (user_id, lesson_id)
+            DO UPDATE SET status = 'OPEN'
+        ), notified AS (
+            INSERT INTO outbox (chat_id, text, kind, dedupe_key)
+            SELECT
+                a.user_id,
+                format($1::text, l.order_num, l.title),
+                'lesson_unlock',
+                'lesson_unlock:' || a.user_id || ':' || l.id
+            FROM advanced a
+            INNER JOIN lessons l ON l.id = a.current_lesson_id
+            WHERE $1::text IS NOT NULL
+            ON CONFLICT DO NOTHING
+        )
+        SELECT a.user_id, l.order_num, l.title
+        FROM advanced a
+        INNER JOIN lessons l ON l.id = a.current_lesson_id
+        """,
+        notification_template
+    )
+    return [dict(row) for row in rows]
+
+
 # ============================================
 # Reminders (напоминания без спама)
 # ============================================
@@ -455,6 +715,115 @@ async def clear_reminders_on_activity(user_id: int):
     )
 
 
+# ============================================
+# Outbox (очередь исходящих сообщений)
+# ============================================
+
+async def enqueue_messages(messages: List[tuple]) -> int:
+    """
+    Поставить сообщения в очередь одним запросом.
+    messages: [(chat_id, text, kind, dedupe_key), ...]
+    Сообщения с dedupe_key, которые уже ждут отправки, пропускаются.
+    """
+    if not messages:
+        return 0
+
+    chat_ids, texts, kinds, dedupe_keys = (list(col) for col in zip(*messages))
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """
+        INSERT INTO outbox (chat_id, text, kind, dedupe_key)
+        SELECT * FROM unnest($1::bigint[], $2::text[], $3::text[], $4::text[])
+        ON CONFLICT DO NOTHING
+        RETURNING id
+        """,
+        chat_ids, texts, kinds, dedupe_keys
+    )
+    return len(rows)
+
+
+async def claim_outbox_batch(limit: int, lease_seconds: int = 300) -> List[OutboxMessage]:
+    """
+    Забрать пачку сообщений на отправку (FOR UPDATE SKIP LOCKED — без конфликтов
+    между воркерами). Зависшие SENDING с истёкшей арендой забираются повторно.
+    """
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """
+        UPDATE outbox
+        SET status = 'SENDING',
+            attempts = attempts + 1,
+            locked_until = NOW() + INTERVAL '1 second' * $2
+        WHERE id IN (
+            SELECT id FROM outbox
+            WHERE (status = 'PENDING' AND next_attempt_at <= NOW())
+               OR (status = 'SENDING' AND locked_until < NOW())
+            ORDER BY id
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING *
+        """,
+        limit, lease_seconds
+    )
+    return [OutboxMessage(**dict(row)) for row in rows]
+
+
+async def mark_outbox_delivered(ids: List[int]):
+    """Отметить сообщения доставленными"""
+    if not ids:
+        return
+    pool = await get_pool()
+    await pool.execute(
+        """
+        UPDATE outbox
+        SET status = 'DELIVERED', sent_at = NOW(), locked_until = NULL, last_error = NULL
+        WHERE id = ANY($1::bigint[])
+        """,
+        ids
+    )
+
+
+async def mark_outbox_failed(failures: List[tuple], max_attempts: int, retry_base_seconds: int):
+    """
+    Отметить неудачные отправки.
+    failures: [(id, error), ...]
+    Пока попытки не исчерпаны — PENDING с экспоненциальной паузой, иначе FAILED.
+    """
+    if not failures:
+        return
+
+    ids, errors = (list(col) for col in zip(*failures))
+    pool = await get_pool()
+    await pool.execute(
+        """
+        UPDATE outbox o
+        SET status = CASE WHEN o.attempts >= $3 THEN 'FAILED' ELSE 'PENDING' END,
+            last_error = f.error,
+            locked_until = NULL,
+            next_attempt_at = NOW() + INTERVAL '1 second' * $4 * power(2, o.attempts - 1)
+        FROM unnest($1::bigint[], $2::text[]) AS f(id, error)
+        WHERE o.id = f.id
+        """,
+        ids, errors, max_attempts, retry_base_seconds
+    )
+
+
+async def log_reminders(user_ids: List[int], reminder_type: str):
+    """Записать отправленные напоминания пачкой"""
+    if not user_ids:
+        return
+    pool = await get_pool()
+    await pool.execute(
+        """
+        INSERT INTO reminders (user_id, reminder_type)
+        SELECT unnest($1::bigint[]), $2
+        ON CONFLICT (user_id, reminder_type) DO NOTHING
+        """,
+        user_ids, reminder_type
+    )
+
+
 # ============================================
 # Support Questions (маппинг вопросов куратору)
 # ============================================
@@ -479,3 +848,363 @@ async def get_student_by_message(message_id: int) -> Optional[int]:
         message_id
     )
     return student_id
+
+
+# ============================================
+# LLM verdict cache
+# ============================================
+
+async def get_cached_verdict(prompt_fingerprint: str, answer_hash: str, ttl_seconds: int) -> Optional[dict]:
+    """
+    Вердикт из кэша (если не устарел), со счётчиком попаданий.
+    ttl_left — сколько секунд записи осталось жить.
+    """
+    pool = await get_pool()
+    row = await pool.fetchrow(
+        """
+        UPDATE llm_verdict_cache
+        SET hits = hits + 1
+        WHERE prompt_fingerprint = $1 AND answer_hash = $2
+          AND created_at > NOW() - INTERVAL '1 second' * $3
+        RETURNING verdict, message,
+            EXTRACT(EPOCH FROM created_at + INTERVAL '1 second' * $3 - LOCALTIMESTAMP)::float8 AS ttl_left
+        """,
+        prompt_fingerprint, answer_hash, ttl_seconds
+    )
+    if row:
+        return dict(row)
+    return None
+
+
+async def save_cached_verdict(prompt_fingerprint: str, answer_hash: str, verdict: str, message: str):
+    """Сохранить вердикт в кэш (перезаписывает устаревший)"""
+    pool = await get_pool()
+    await pool.execute(
+        """
+        INSERT INTO llm_verdict_cache (prompt_fingerprint, answer_hash, verdict, message)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (prompt_fingerprint, answer_hash) DO UPDATE
+        SET verdict = $3, message = $4, hits = 0, created_at = NOW()
+        """,
+        prompt_fingerprint, answer_hash, verdict, message
+    )
+
+
+async def purge_verdict_cache(ttl_seconds: int) -> int:
+    """Удалить устаревшие записи кэша. Возвращает количество удалённых."""
+    pool = await get_pool()
+    result = await pool.execute(
+        "DELETE FROM llm_verdict_cache WHERE created_at <= NOW() - INTERVAL '1 second' * $1",
+        ttl_seconds
+    )
+    return int(result.split()[-1])
+
+
+# ============================================
+# LLM calls (телеметрия)
+# ============================================
+
+async def insert_llm_calls(calls: List[tuple]) -> int:
+    """
+    Записать пачку вызовов LLM одним запросом.
+    calls: [(recorded_at_epoch, model, lesson_number, prompt_fingerprint, prompt_tokens,
+             completion_tokens, cached_tokens, latency_ms, outcome, fallback_reason, streamed,
+             answer_tokens, answer_tokens_sent, attempt, hedged), ...]
+    """
+    if not calls:
+        return 0
+
+    columns = [list(col) for col in zip(*calls)]
+    pool = await get_pool()
+    await pool.execute(
+        """
+        INSERT INTO llm_calls
+        (created_at, model, lesson_number, prompt_fingerprint, prompt_tokens,
+         completion_tokens, cached_tokens, latency_ms, outcome, fallback_reason, streamed,
+         answer_tokens, answer_tokens_sent, attempt, hedged)
+        SELECT to_timestamp(t)::timestamp, model, lesson_number, fp, pt, ct, cached, latency, outcome, reason,
+               streamed, answer, answer_sent, attempt, hedged
+        FROM unnest(
+            $1::float8[], $2::text[], $3::int[], $4::text[], $5::int[], $6::int[],
+            $7::int[], $8::int[], $9::text[], $10::text[], $11::bool[], $12::int[], $13::int[],
+            $14::int[], $15::bool[]
+        ) AS c(t, model, lesson_number, fp, pt, ct, cached, latency, outcome, reason, streamed,
+               answer, answer_sent, attempt, hedged)
+        """,
+        *columns
+    )
+    return len(calls)
+
+
+async def get_llm_call_summary(hours: int) -> List[dict]:
+    """
+    Сводка вызовов LLM за последние N часов по урокам + итоговая строка
+    (lesson_number = NULL): число попыток, неуспешных, повторов, p50/p95 задержки
+    (без отбитых breaker-ом), токены и стоимость в USD по ценам из config,
+    токены ответов студентов до и после подготовки (answers — по одному
+    на проверку: первые попытки, без отбитых breaker-ом).
+    """
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """
+        SELECT
+            lesson_number,
+            COUNT(*) AS calls,
+            COUNT(*) FILTER (WHERE outcome <> 'ok') AS failures,
+            COUNT(*) FILTER (WHERE attempt > 1) AS retries,
+            COUNT(*) FILTER (WHERE attempt > 1 AND outcome = 'ok') AS retries_ok,
+            COUNT(*) FILTER (WHERE hedged) AS hedge_wins,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY latency_ms)
+                FILTER (WHERE outcome <> 'circuit_open') AS p50_ms,
+            percentile_cont(0.95) WITHIN GROUP (ORDER BY latency_ms)
+                FILTER (WHERE outcome <> 'circuit_open') AS p95_ms,
+            COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
+            COALESCE(SUM(completion_tokens), 0) AS completion_tokens,
+            COALESCE(SUM(cached_tokens), 0) AS cached_tokens,
+            COUNT(*) FILTER (WHERE attempt = 1 AND outcome <> 'circuit_open') AS answers,
+            COALESCE(SUM(answer_tokens) FILTER (WHERE attempt = 1 AND outcome <> 'circuit_open'), 0)
+                AS answer_tokens,
+            COALESCE(SUM(answer_tokens_sent) FILTER (WHERE attempt = 1 AND outcome <> 'circuit_open'), 0)
+                AS answer_tokens_sent,
+            COUNT(*) FILTER (
+                WHERE attempt = 1 AND outcome <> 'circuit_open' AND answer_tokens_sent < answer_tokens
+            ) AS answers_trimmed,
+            COALESCE(SUM(
+                (prompt_tokens - cached_tokens) * $2::float8
+                + cached_tokens * $3::float8
+                + completion_tokens * $4::float8
+            ), 0) / 1000000 AS cost_usd
+        FROM llm_calls
+        WHERE created_at > NOW() - INTERVAL '1 hour' * $1
+        GROUP BY GROUPING SETS ((lesson_number), ())
+        ORDER BY lesson_number NULLS LAST
+        """,
+        hours,
+        config.LLM_PRICE_INPUT_PER_1M,
+        config.LLM_PRICE_CACHED_INPUT_PER_1M,
+        config.LLM_PRICE_OUTPUT_PER_1M
+    )
+    return [dict(row) for row in rows]
+
+
+# ============================================
+# Regrade (массовая перепроверка сдач)
+# ============================================
+
+async def iter_regrade_submissions(
+    run_id: str,
+    lesson_numbers: Optional[List[int]] = None,
+    since: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    prefetch: int = 100
+) -> AsyncIterator[dict]:
+    """
+    Текстовые сдачи для перепроверки — серверным курсором, по prefetch строк.
+    Уже перепроверенные в этом run_id пропускаются.
+    Держит соединение (и транзакцию) до конца обхода.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            cursor = conn.cursor(
+                """
+                SELECT s.id, s.content_text, s.ai_verdict,
+                       l.order_num AS lesson_number, l.title AS lesson_title,
+                       COALESCE(l.content_text, '') AS homework_task
+                FROM submissions s
+                JOIN lessons l ON l.id = s.lesson_id
+                WHERE s.content_type = 'text' AND s.content_text IS NOT NULL
+                  AND ($2::int[] IS NULL OR l.order_num = ANY($2::int[]))
+                  AND ($3::timestamp IS NULL OR s.created_at >= $3::timestamp)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM regrade_results r
+                      WHERE r.run_id = $1 AND r.submission_id = s.id
+                  )
+                ORDER BY s.id
+                LIMIT $4
+                """,
+                run_id, lesson_numbers, since, limit,
+                prefetch=prefetch
+            )
+            async for row in cursor:
+                yield dict(row)
+
+
+async def save_regrade_results(run_id: str, results: List[tuple]) -> int:
+    """
+    Сохранить результаты перепроверки пачкой.
+    results: [(submission_id, prompt_fingerprint, verdict, message), ...]
+    """
+    if not results:
+        return 0
+
+    submission_ids, fingerprints, verdicts, messages = (list(col) for col in zip(*results))
+    pool = await get_pool()
+    await pool.execute(
+        """
+        INSERT INTO regrade_results (run_id, submission_id, prompt_fingerprint, verdict, message)
+        SELECT $1, * FROM unnest($2::int[], $3::text[], $4::text[], $5::text[])
+        ON CONFLICT (run_id, submission_id) DO UPDATE
+        SET prompt_fingerprint = EXCLUDED.prompt_fingerprint,
+            verdict = EXCLUDED.verdict,
+            message = EXCLUDED.message,
+            created_at = NOW()
+        """,
+        run_id, submission_ids, fingerprints, verdicts, messages
+    )
+    return len(results)
+
+
+async def get_regrade_report(run_id: str) -> List[dict]:
+    """Сравнение вердиктов прогона с исходными ai_verdict по урокам"""
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """
+        SELECT
+            l.order_num AS lesson_number,
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE r.verdict = s.ai_verdict) AS same,
+            COUNT(*) FILTER (WHERE s.ai_verdict = 'ACCEPT' AND r.verdict = 'REVISE') AS accept_to_revise,
+            COUNT(*) FILTER (WHERE s.ai_verdict = 'REVISE' AND r.verdict = 'ACCEPT') AS revise_to_accept,
+            COUNT(*) FILTER (WHERE s.is_fallback) AS was_fallback
+        FROM regrade_results r
+        JOIN submissions s ON s.id = r.submission_id
+        JOIN lessons l ON l.id = s.lesson_id
+        WHERE r.run_id = $1
+        GROUP BY l.order_num
+        ORDER BY l.order_num
+        """,
+        run_id
+    )
+    return [dict(row) for row in rows]
+
+
+# ============================================
+# Подписи ответов (индекс похожих ответов)
+# ============================================
+
+async def get_submission_signatures(after_submission_id: int = 0) -> List[dict]:
+    """Подписи сдач с id больше заданного (для инкрементальной загрузки индекса)"""
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """
+        SELECT ss.submission_id, ss.lesson_id, ss.signature, ss.prompt_fingerprint,
+               s.user_id, s.ai_verdict, s.ai_message
+        FROM submission_signatures ss
+        JOIN submissions s ON s.id = ss.submission_id
+        WHERE ss.submission_id > $1 AND ss.signature IS NOT NULL AND ss.prompt_fingerprint IS NOT NULL
+        ORDER BY ss.submission_id
+        """,
+        after_submission_id
+    )
+    return [dict(row) for row in rows]
+
+
+async def save_submission_signatures(signatures: List[tuple]) -> int:
+    """
+    Сохранить подписи пачкой.
+    signatures: [(submission_id, lesson_id, signature, duplicate_of, similarity, prompt_fingerprint), ...]
+    prompt_fingerprint = None — промпт, которым проверена сдача, неизвестен.
+    """
+    if not signatures:
+        return 0
+
+    submission_ids, lesson_ids, blobs, duplicates, similarities, fingerprints = (
+        list(col) for col in zip(*signatures)
+    )
+    pool = await get_pool()
+    await pool.execute(
+        """
+        INSERT INTO submission_signatures
+        (submission_id, lesson_id, signature, duplicate_of, similarity, prompt_fingerprint)
+        SELECT * FROM unnest($1::int[], $2::int[], $3::bytea[], $4::int[], $5::real[], $6::text[])
+        ON CONFLICT (submission_id) DO NOTHING
+        """,
+        submission_ids, lesson_ids, blobs, duplicates, similarities, fingerprints
+    )
+    return len(signatures)
+
+
+async def get_unsigned_text_submissions(limit: int) -> List[dict]:
+    """Текстовые сдачи без подписи (кроме fallback-вердиктов)"""
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """
+        SELECT s.id, s.lesson_id, s.content_text
+        FROM submissions s
+        WHERE s.content_type = 'text' AND s.content_text IS NOT NULL
+          AND NOT s.is_fallback
+          AND NOT EXISTS (SELECT 1 FROM submission_signatures ss WHERE ss.submission_id = s.id)
+        ORDER BY s.id
+        LIMIT $1
+        """,
+        limit
+    )
+    return [dict(row) for row in rows]
+
+
+# ============================================
+# Scheduler jobs (координация между worker-ами)
+# ============================================
+
+# Пространство ключей advisory lock для задач (первый ключ пары)
+JOB_LOCK_NAMESPACE = 4201
+
+
+@asynccontextmanager
+async def job_lock(job_name: str) -> AsyncIterator[bool]:
+    """
+    Сессионный advisory lock на время задачи.
+    Отдаёт True, если блокировка взята (иначе задачу уже выполняет другой процесс).
+    Если соединение оборвётся — Postgres снимет блокировку сам.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        acquired = await conn.fetchval(
+            "SELECT pg_try_advisory_lock($1, hashtext($2))",
+            JOB_LOCK_NAMESPACE, job_name
+        )
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(
+                    "SELECT pg_advisory_unlock($1, hashtext($2))",
+                    JOB_LOCK_NAMESPACE, job_name
+                )
+
+
+async def start_job_run(job_name: str, instance: str, min_interval_seconds: int = 0) -> bool:
+    """
+    Отметить начало запуска задачи.
+    Возвращает False (и ничего не пишет), если предыдущий запуск начался
+    меньше min_interval_seconds назад — задачу уже выполнил другой процесс.
+    """
+    pool = await get_pool()
+    started = await pool.fetchval(
+        """
+        INSERT INTO job_runs (job_name, instance, status, started_at, runs)
+        VALUES ($1, $2, 'RUNNING', NOW(), 1)
+        ON CONFLICT (job_name) DO UPDATE
+        SET instance = $2, status = 'RUNNING', started_at = NOW(),
+            finished_at = NULL, error = NULL, runs = job_runs.runs + 1
+        WHERE job_runs.started_at <= NOW() - INTERVAL '1 second' * $3
+        RETURNING TRUE
+        """,
+        job_name, instance, min_interval_seconds
+    )
+    return bool(started)
+
+
+async def finish_job_run(job_name: str, error: Optional[str] = None):
+    """Отметить завершение запуска задачи (OK или ERROR)"""
+    pool = await get_pool()
+    await pool.execute(
+        """
+        UPDATE job_runs
+        SET status = CASE WHEN $2::text IS NULL THEN 'OK' ELSE 'ERROR' END,
+            finished_at = NOW(), error = $2
+        WHERE job_name = $1
+        """,
+        job_name, error
+    )
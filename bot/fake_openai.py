@@ -0,0 +1,242 @@
+"""
+Локальная замена OpenAI API для нагрузочных и регрессионных тестов
+
+Реализует POST /v1/chat/completions (обычный и stream=True) с настраиваемой
+задержкой (логнормальное распределение), долей ошибок и заранее заданными
+вердиктами. Бот направляется на него через OPENAI_BASE_URL:
+
+    python -m bot.fake_openai --port 8099 --latency-ms 800 --error-rate 0.05
+    OPENAI_BASE_URL=http://localhost:8099/v1 python -m bot.main
+    OPENAI_BASE_URL=http://localhost:8099/v1 python -m bot.regrade run --run-id load --rate 0
+
+GET /stats — счётчики запросов (для нагрузочных прогонов).
+Токены считаются грубо (~3 символа на токен); первое системное сообщение
+длиной от 1024 токенов, пришедшее повторно, учитывается как cached_tokens —
+как кэш префикса у провайдера.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Минимальный префикс, который провайдер кэширует (токенов)
+CACHE_MIN_TOKENS = 1024
+
+
+@dataclass
+class FakeOpenAIConfig:
+    """Поведение сервера"""
+    latency_ms: float = 800          # медиана задержки ответа
+    latency_sigma: float = 0.5       # разброс (sigma логнормального распределения)
+    error_rate: float = 0.0          # доля запросов с ошибкой
+    error_status: int = 500          # HTTP-статус ошибки (429, 500, 503...)
+    verdicts: List[str] = field(default_factory=lambda: ["ACCEPT"])  # по кругу
+    rules: List[Tuple[str, str]] = field(default_factory=list)        # (подстрока ответа, вердикт)
+    message: str = "Тестовый отзыв: видно, что ты разобрался в теме."
+    stream_chunks: int = 8           # на сколько кусков делить потоковый ответ
+    seed: Optional[int] = None
+
+
+@dataclass
+class FakeOpenAIStats:
+    """Счётчики сервера"""
+    requests: int = 0
+    streamed: int = 0
+    errors: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 3)
+
+
+class FakeOpenAI:
+    """Состояние сервера: конфигурация, генератор задержек, счётчики"""
+
+    def __init__(self, config: Optional[FakeOpenAIConfig] = None):
+        self.config = config or FakeOpenAIConfig()
+        self.stats = FakeOpenAIStats()
+        self._random = random.Random(self.config.seed)
+        self._verdicts = itertools.cycle(self.config.verdicts)
+        self._seen_prefixes = set()
+
+    def latency(self) -> float:
+        """Задержка ответа, сек"""
+        if self.config.latency_ms <= 0:
+            return 0.0
+        mu = math.log(self.config.latency_ms / 1000)
+        return self._random.lognormvariate(mu, self.config.latency_sigma)
+
+    def verdict_for(self, answer: str) -> str:
+        for substring, verdict in self.config.rules:
+            if substring in answer:
+                return verdict
+        return next(self._verdicts)
+
+    def usage(self, messages: list, completion: str) -> dict:
+        prompt_tokens = sum(_tokens(m.get("content") or "") for m in messages)
+        cached = 0
+        if messages:
+            prefix = messages[0].get("content") or ""
+            prefix_tokens = _tokens(prefix)
+            key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+            if prefix_tokens >= CACHE_MIN_TOKENS and key in self._seen_prefixes:
+                cached = prefix_tokens
+            self._seen_prefixes.add(key)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _tokens(completion),
+            "total_tokens": prompt_tokens + _tokens(completion),
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+    # ------------------------------------------
+    # HTTP
+    # ------------------------------------------
+
+    async def completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.stats.requests += 1
+        self.stats.in_flight += 1
+        self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+        try:
+            delay = self.latency()
+            if self._random.random() < self.config.error_rate:
+                await asyncio.sleep(delay)
+                self.stats.errors += 1
+                return web.json_response(
+                    {"error": {"message": "fake error", "type": "server_error", "code": None}},
+                    status=self.config.error_status
+                )
+
+            messages = body.get("messages", [])
+            answer = messages[-1].get("content", "") if messages else ""
+            content = json.dumps(
+                {"verdict": self.verdict_for(answer), "message": self.config.message},
+                ensure_ascii=False
+            )
+            usage = self.usage(messages, content)
+            base = {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+            }
+
+            if body.get("stream"):
+                self.stats.streamed += 1
+                include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+                return await self._stream(request, base, content, usage if include_usage else None, delay)
+
+            await asyncio.sleep(delay)
+            return web.json_response({
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+        finally:
+            self.stats.in_flight -= 1
+
+    async def _stream(self, request, base: dict, content: str, usage: Optional[dict], delay: float):
+        """SSE: первый кусок через ~треть задержки, остальные — равномерно"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(payload):
+            data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+            await response.write(f"data: {data}\n\n".encode("utf-8"))
+
+        chunks = max(1, self.config.stream_chunks)
+        size = math.ceil(len(content) / chunks)
+        pieces = [content[i:i + size] for i in range(0, len(content), size)]
+        await asyncio.sleep(delay / 3)
+        for n, piece in enumerate(pieces):
+            if n:
+                await asyncio.sleep(2 * delay / 3 / len(pieces))
+            await send({
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            })
+        await send({
+            **base,
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        })
+        if usage is not None:
+            await send({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+        await send("[DONE]")
+        await response.write_eof()
+        return response
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats.__dict__)
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.completions)
+        app.router.add_post("/chat/completions", self.completions)
+        app.router.add_get("/stats", self.stats_handler)
+        return app
+
+
+# ============================================
+# CLI
+# ============================================
+
+def _rule(value: str) -> Tuple[str, str]:
+    substring, verdict = value.rsplit("=", 1)
+    return substring, verdict
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m bot.fake_openai", description="Фейковый OpenAI API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=800, help="медиана задержки (мс)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="разброс задержки (логнормальное)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ошибок 0..1")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP-статус ошибки")
+    parser.add_argument("--verdicts", default="ACCEPT", help="вердикты по кругу, через запятую")
+    parser.add_argument("--rule", type=_rule, action="append", default=[],
+                        help="подстрока=ВЕРДИКТ (приоритетнее --verdicts), можно несколько")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO
+    )
+    fake = FakeOpenAI(FakeOpenAIConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        verdicts=[v.strip() for v in args.verdicts.split(",") if v.strip()],
+        rules=args.rule,
+        seed=args.seed,
+    ))
+    logger.info(f"Fake OpenAI: http://{args.host}:{args.port}/v1")
+    web.run_app(fake.create_app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,6 @@
 Админ-команды
 """
 
-import asyncio
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes
@@ -10,6 +9,13 @@ from telegram.ext import ContextTypes
 from bot.config import config
 from bot.database import queries as db
 from bot.database.connection import get_pool
+from bot.services.sender import sender
+from bot.services.circuit_breaker import openai_breaker
+from bot.services.lesson_contexts import ContextValidationError, context_store
+from bot.services.retry import llm_retry_policy
+from bot.services.similarity import similarity_index
+from bot.services.grading import grading_pool
+from bot.services.verdict_cache import verdict_cache
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +43,43 @@ async def stat_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     text = f"Статистика курса\n\nВсего студентов: {total_users}\nЗавершили курс: {completed_all}"
 
+    # Кэш вердиктов LLM (счётчики этого процесса)
+    cache = verdict_cache.stats
+    text += (
+        f"\n\nКэш проверок ДЗ: попаданий {cache.hits} (из памяти {cache.memory_hits}), "
+        f"промахов {cache.misses}, в обход {cache.bypassed}"
+    )
+
+    # Очередь проверки ДЗ
+    grading = grading_pool.stats
+    text += (
+        f"\nОчередь проверки: выполняется {grading.running}, ждут {grading.queued}, "
+        f"проверено {grading.completed}, ошибок {grading.failed}, "
+        f"отклонено (очередь полна) {grading.rejected}, повторов {grading.duplicates}"
+    )
+
+    # Доступность OpenAI
+    breaker = openai_breaker.stats
+    fallback_count = await pool.fetchval("SELECT COUNT(*) FROM submissions WHERE is_fallback")
+    text += (
+        f"\nOpenAI: {openai_breaker.state.value}, ошибок {breaker.failures}, "
+        f"размыканий {breaker.trips}, без запроса {breaker.short_circuited}, "
+        f"сдач с fallback-вердиктом {fallback_count}"
+    )
+    retry = llm_retry_policy.stats
+    text += (
+        f"\nПовторы OpenAI: попыток {retry.attempts}, повторов {retry.retries}, "
+        f"временных ошибок {retry.transient_errors}, постоянных {retry.permanent_errors}, "
+        f"не хватило дедлайна {retry.deadline_exhausted}, страхующих {retry.hedges} (выиграли {retry.hedge_wins})"
+    )
+
+    # Похожие ответы
+    similar = similarity_index.stats
+    text += (
+        f"\nПохожие ответы: в индексе {len(similarity_index)}, проверено {similar.checks}, "
+        f"совпадений {similar.matches} (с чужим ответом {similar.cross_user})"
+    )
+
     await update.message.reply_text(text)
 
 
@@ -109,19 +152,25 @@ async def broadcast_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_text = " ".join(context.args)
     users = await db.get_all_enrolled_users()
 
-    sent = 0
-    failed = 0
+    # Рассылка идёт в фоне — хендлер админа не держим открытым
+    context.application.create_task(
+        _run_broadcast(context.bot, update.effective_chat.id, users, message_text)
+    )
 
-    for user in users:
-        try:
-            await context.bot.send_message(user.tg_id, message_text)
-            sent += 1
-            await asyncio.sleep(0.05)  # Анти-флуд задержка
-        except Exception:
-            failed += 1
+    await update.message.reply_text(f"Рассылка запущена\nПолучателей: {len(users)}")
 
-    await update.message.reply_text(
-        f"Рассылка завершена\nОтправлено: {sent}\nОшибок: {failed}"
+
+async def _run_broadcast(bot, admin_chat_id: int, users, message_text: str):
+    """Фоновая рассылка через общий отправитель, итог — админу"""
+    report = await sender.send_many(bot, [(user.tg_id, message_text) for user in users])
+
+    for result in report.results:
+        if not result.ok:
+            logger.warning(f"Рассылка: не доставлено {result.chat_id}: {result.error}")
+
+    await bot.send_message(
+        admin_chat_id,
+        f"Рассылка завершена\nОтправлено: {report.sent}\nОшибок: {report.failed}"
     )
 
 
@@ -200,6 +249,79 @@ async def force_accept_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     await update.message.reply_text(f"Урок {lesson_num} засчитан для {target_id}")
 
 
+@admin_only
+async def llm_stat_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Задержка и стоимость проверок ДЗ через LLM по урокам: /llmstat [часов]"""
+    try:
+        hours = int(context.args[0]) if context.args else 24
+    except ValueError:
+        await update.message.reply_text("Использование: /llmstat [часов]")
+        return
+
+    rows = await db.get_llm_call_summary(hours)
+    if not rows:
+        await update.message.reply_text(f"Вызовов LLM за {hours} ч не было")
+        return
+
+    def fmt_ms(value) -> str:
+        return "—" if value is None else f"{value / 1000:.1f}с"
+
+    lines = [f"LLM за {hours} ч (p50 / p95, ошибки, токены вход/кэш/выход, $):"]
+    for row in rows:
+        name = f"Урок {row['lesson_number']}" if row["lesson_number"] is not None else "Всего"
+        lines.append(
+            f"{name}: {row['calls']} выз., {fmt_ms(row['p50_ms'])} / {fmt_ms(row['p95_ms'])}, "
+            f"ошибок {row['failures']}, {row['prompt_tokens']}/{row['cached_tokens']}/{row['completion_tokens']}, "
+            f"${row['cost_usd']:.4f}"
+        )
+
+    # Доля входных токенов из кэша промптов провайдера (итоговая строка — последняя)
+    total = rows[-1]
+    if total["prompt_tokens"]:
+        lines.append(f"Из кэша промптов: {100 * total['cached_tokens'] / total['prompt_tokens']:.0f}% входных токенов")
+
+    # Повторы после временных ошибок и страхующие запросы
+    if total["retries"] or total["hedge_wins"]:
+        lines.append(
+            f"Повторов: {total['retries']} (успешных {total['retries_ok']}), "
+            f"ответил страхующий запрос: {total['hedge_wins']}"
+        )
+
+    # Ответы студентов: средний размер и сокращённые до бюджета урока
+    lines.append("Ответы студентов (средн. токенов, отправлено, сокращено):")
+    for row in rows:
+        if not row["answers"] or row["lesson_number"] is None:
+            continue
+        lines.append(
+            f"Урок {row['lesson_number']}: {row['answer_tokens'] // row['answers']}, "
+            f"{row['answer_tokens_sent'] // row['answers']}, {row['answers_trimmed']}"
+        )
+
+    await update.message.reply_text("\n".join(lines))
+
+
+@admin_only
+async def reload_contexts_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Перечитать контексты уроков из файлов (без перезапуска): /reload_contexts"""
+    try:
+        contexts, changed = context_store.reload()
+    except ContextValidationError as e:
+        errors = "\n".join(f"• {error}" for error in e.errors[:20])
+        await update.message.reply_text(
+            f"Контексты не применены, действует версия {context_store.current.version}:\n{errors}"
+        )
+        return
+
+    if not changed:
+        await update.message.reply_text(f"Контексты не изменились (версия {contexts.version})")
+        return
+
+    await update.message.reply_text(
+        f"Контексты обновлены: версия {contexts.version}, уроки {', '.join(map(str, changed))}.\n"
+        f"Новые проверки идут с новыми промптами."
+    )
+
+
 @admin_only
 async def backup_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Создать и отправить бэкап БД"""
@@ -2,6 +2,7 @@
 Обработчики сдачи домашних заданий
 """
 
+import asyncio
 import logging
 import re
 from telegram import Update
@@ -12,10 +13,19 @@ from bot.keyboards import main_menu_keyboard, cancel_keyboard
 from bot.database import queries as db
 from bot.database.connection import get_pool
 from bot.config import config
+from bot.services.grading import grading_pool, SubmitStatus
+from bot.services import similarity
+from bot.services.live_message import LiveMessage
 from bot.services.llm import check_homework_with_ai, get_file_video_response
+from bot.services.outbox import KIND_DUPLICATE_ALERT, KIND_GRADING_ABORTED, wake_outbox
+from bot.services.prompts import prompt_registry
+from bot.services.similarity import similarity_index
+from bot.services.user_context import get_user_context
 
 logger = logging.getLogger(__name__)
 
+GRADING_ABORTED_TEXT = "Не получилось проверить ответ. Отправь его, пожалуйста, ещё раз."
+
 
 async def submit_hw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Callback: начать сдачу ДЗ"""
@@ -76,11 +86,14 @@ async def receive_hw_text_handler(update: Update, context: ContextTypes.DEFAULT_
     text = update.message.text
 
     # Проверяем состояние
-    user = await db.get_user(tg_id)
-    if not user or user.state != UserState.WAITING_HW.value:
+    user_ctx = await get_user_context(update, context)
+    if not user_ctx or user_ctx.state != UserState.WAITING_HW.value:
         return
 
     lesson_id = context.user_data.get("current_lesson_id")
+    if not lesson_id and user_ctx.enrollment is not None:
+        # user_data не переживает перезапуск — берём текущий урок из зачисления
+        lesson_id = user_ctx.enrollment.current_lesson_id
     if not lesson_id:
         return
 
@@ -108,45 +121,172 @@ async def receive_hw_text_handler(update: Update, context: ContextTypes.DEFAULT_
         await accept_homework(update, context, tg_id, lesson, text, "video_link")
         return
 
-    # Для text — проверяем через AI
+    # Для text — проверяем через AI (в очереди, хендлер не ждёт модель)
     if lesson.homework_type == "text":
-        # Показываем что проверяем
-        await db.update_user_state(tg_id, UserState.PROCESSING.value)
-        processing_msg = await update.message.reply_text("⏳ Проверяю ответ...")
+        await submit_text_homework(update, context, tg_id, lesson, text)
+        return
+
+    await update.message.reply_text(
+        "Ожидался другой формат ответа.",
+        reply_markup=cancel_keyboard()
+    )
+
+
+async def submit_text_homework(update, context, tg_id: int, lesson, text: str):
+    """Поставить текстовый ответ в очередь проверки и сразу ответить статусом"""
+    status_msg = None
+    status_sent = asyncio.Event()
+
+    async def job():
+        # Ответ со статусом должен уйти раньше результата проверки
+        await status_sent.wait()
+        await grade_text_homework(update, context, tg_id, lesson, text, status_msg)
+
+    async def on_abort():
+        # Ошибка или отмена при остановке бота — не оставляем студента в PROCESSING
+        await abort_grading(tg_id, lesson)
 
-        # Вызываем AI
+    await db.update_user_state(tg_id, UserState.PROCESSING.value)
+    result = grading_pool.submit((tg_id, lesson.id), job, on_abort)
+
+    if result.status == SubmitStatus.DUPLICATE:
+        await update.message.reply_text("⏳ Предыдущий ответ ещё проверяется, дождись результата.")
+        return
+
+    if result.status == SubmitStatus.FULL:
+        await db.update_user_state(tg_id, UserState.WAITING_HW.value)
+        await update.message.reply_text(
+            "Сейчас много ответов на проверке. Отправь, пожалуйста, ещё раз через пару минут.",
+            reply_markup=cancel_keyboard()
+        )
+        return
+
+    if result.ahead >= config.GRADING_NOTICE_DEPTH:
+        status_text = f"⏳ Ответ в очереди на проверку (перед тобой {result.ahead}). Пришлю результат, как только проверю."
+    else:
+        status_text = "⏳ Проверяю ответ..."
+    try:
+        status_msg = await update.message.reply_text(status_text)
+    finally:
+        status_sent.set()
+
+
+async def grade_text_homework(update, context, tg_id: int, lesson, text: str, status_msg=None):
+    """
+    Проверка текстового ответа через AI и ответ студенту (выполняется в очереди).
+    Отзыв модели дописывается в сообщение-заглушку по мере генерации.
+    Почти совпадающий с уже проверенным ответ получает тот же вердикт без модели.
+    """
+    live = LiveMessage(status_msg) if status_msg is not None and config.LLM_STREAMING else None
+    signature = similarity.signature(text) if config.SIMILARITY_ENABLED else None
+    prompt_fingerprint = prompt_registry.get(lesson.order_num, lesson.title, lesson.content_text or "").fingerprint
+    match = await similarity_index.check(lesson.id, signature, prompt_fingerprint) if signature else None
+    if match is not None:
+        logger.info(
+            f"Похожий ответ: user={tg_id}, lesson={lesson.id}, "
+            f"сдача {match.answer.submission_id} ({match.similarity:.0%})"
+        )
+        result = {"verdict": match.answer.verdict, "message": match.answer.message, "fallback": False}
+    else:
         result = await check_homework_with_ai(
             lesson_number=lesson.order_num,
             lesson_topic=lesson.title,
             homework_task=lesson.content_text or "",
-            user_answer=text
+            user_answer=text,
+            on_progress=live.update if live else None
         )
 
-        await processing_msg.delete()
-
-        if result["verdict"] == "ACCEPT":
-            await accept_homework(update, context, tg_id, lesson, text, "text", result["message"])
-        else:
-            # REVISE — просим доработать
-            await db.create_submission(
-                user_id=tg_id,
-                lesson_id=lesson.id,
-                content_text=text,
-                content_type="text",
-                ai_verdict="REVISE",
-                ai_message=result["message"]
-            )
-            await db.update_user_state(tg_id, UserState.WAITING_HW.value)
-            await update.message.reply_text(
-                f"{result['message']}\n\nПопробуй ещё раз:",
-                reply_markup=cancel_keyboard()
-            )
-        return
+    # Отзыв уже на экране — итог допишем в то же сообщение, иначе заглушку убираем
+    if live is None or not live.shown:
+        live = None
+        if status_msg is not None:
+            await status_msg.delete()
+
+    is_fallback = result.get("fallback", False)
+    if result["verdict"] == "ACCEPT":
+        submission = await accept_homework(
+            update, context, tg_id, lesson, text, "text", result["message"],
+            is_fallback=is_fallback, live=live
+        )
+    else:
+        # REVISE — просим доработать (submission + состояние одним запросом)
+        submission = await db.record_homework_submission(
+            user_id=tg_id,
+            lesson_id=lesson.id,
+            content_text=text,
+            content_type="text",
+            ai_verdict="REVISE",
+            ai_message=result["message"],
+            next_state=UserState.WAITING_HW.value,
+            is_fallback=is_fallback
+        )
+        await reply_result(update, f"{result['message']}\n\nПопробуй ещё раз:", cancel_keyboard(), live)
 
-    await update.message.reply_text(
-        "Ожидался другой формат ответа.",
-        reply_markup=cancel_keyboard()
+    # Fallback-вердикт не эталон — в индекс не попадает
+    if signature and not is_fallback:
+        await similarity_index.remember(
+            submission.id, lesson.id, tg_id, signature, result["verdict"], result["message"],
+            prompt_fingerprint, match
+        )
+    if match is not None and match.answer.user_id != tg_id:
+        similarity_index.stats.cross_user += 1
+        await alert_curator_duplicate(tg_id, lesson, submission.id, match)
+
+
+async def abort_grading(tg_id: int, lesson):
+    """
+    Проверка не завершилась: вернуть WAITING_HW и попросить прислать ответ ещё раз.
+    Сообщение — через outbox: при остановке бота Telegram-клиент уже закрыт,
+    уйдёт после перезапуска. Если вердикт уже записан, ничего не делаем.
+    """
+    if await db.release_processing(tg_id, UserState.WAITING_HW.value):
+        logger.warning(f"Проверка не завершилась: user={tg_id}, lesson={lesson.id}")
+        await notify_grading_aborted([tg_id])
+
+
+async def release_stale_processing(older_than_seconds: int = 0) -> int:
+    """
+    Сбросить PROCESSING, чья проверка потерялась (падение или перезапуск worker-а).
+    При старте — все (older_than_seconds=0): обновления ещё не принимаются,
+    проверок этого процесса нет. Периодически — дольше GRADING_STALE_SECONDS
+    (см. scheduler.release_stale_gradings), чтобы не задеть живые проверки соседних worker-ов.
+    """
+    user_ids = await db.release_stale_processing(UserState.WAITING_HW.value, older_than_seconds)
+    if user_ids:
+        logger.warning(f"Сброшено зависших проверок: {len(user_ids)}")
+        await notify_grading_aborted(user_ids)
+    return len(user_ids)
+
+
+async def notify_grading_aborted(user_ids):
+    """Попросить студентов прислать ответ ещё раз (через outbox, одно сообщение на студента)"""
+    await db.enqueue_messages([
+        (tg_id, GRADING_ABORTED_TEXT, KIND_GRADING_ABORTED, f"grading_aborted:{tg_id}")
+        for tg_id in user_ids
+    ])
+    wake_outbox()
+
+
+async def alert_curator_duplicate(tg_id: int, lesson, submission_id: int, match):
+    """Уведомить куратора о совпадении с ответом другого студента (через outbox)"""
+    text = (
+        f"🔁 Похожий ответ — урок {lesson.order_num}\n"
+        f"Студент {tg_id}, сдача #{submission_id}\n"
+        f"Совпадает на {match.similarity:.0%} со сдачей #{match.answer.submission_id} "
+        f"студента {match.answer.user_id}\n"
+        f"Вердикт переиспользован: {match.answer.verdict}"
     )
+    await db.enqueue_messages([
+        (config.CURATOR_ID, text, KIND_DUPLICATE_ALERT, f"duplicate:{submission_id}")
+    ])
+    wake_outbox()
+
+
+async def reply_result(update, text: str, reply_markup, live: LiveMessage = None):
+    """Итог проверки: правкой потокового сообщения (если было), иначе новым сообщением"""
+    if live is not None and await live.finish(text, reply_markup=reply_markup):
+        return
+    await update.message.reply_text(text, reply_markup=reply_markup)
 
 
 async def receive_hw_file_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -154,8 +294,8 @@ async def receive_hw_file_handler(update: Update, context: ContextTypes.DEFAULT_
     tg_id = update.effective_user.id
 
     # Проверяем состояние
-    user = await db.get_user(tg_id)
-    if not user or user.state != UserState.WAITING_HW.value:
+    user_ctx = await get_user_context(update, context)
+    if not user_ctx or user_ctx.state != UserState.WAITING_HW.value:
         return
 
     lesson_id = context.user_data.get("current_lesson_id")
@@ -202,31 +342,34 @@ async def receive_hw_file_handler(update: Update, context: ContextTypes.DEFAULT_
     await accept_homework(update, context, tg_id, lesson, f"file:{document.file_id}", "file")
 
 
-async def accept_homework(update, context, tg_id: int, lesson, content: str, content_type: str, ai_message: str = None):
-    """Принять и засчитать домашнее задание"""
+async def accept_homework(
+    update, context, tg_id: int, lesson, content: str, content_type: str,
+    ai_message: str = None, is_fallback: bool = False, live: LiveMessage = None
+):
+    """
+    Принять и засчитать домашнее задание. Возвращает сохранённую сдачу.
+    is_fallback — вердикт без модели; live — сообщение с потоковым отзывом.
+    """
 
     # Для файлов/видео — получаем стандартный ответ
     if ai_message is None:
         response_data = get_file_video_response()
         ai_message = response_data["message"]
 
-    # Сохраняем submission
-    await db.create_submission(
+    # Submission + завершение урока + IDLE — одной транзакцией
+    submission = await db.record_homework_submission(
         user_id=tg_id,
         lesson_id=lesson.id,
         content_text=content,
         content_type=content_type,
         ai_verdict="ACCEPT",
-        ai_message=ai_message
+        ai_message=ai_message,
+        next_state=UserState.IDLE.value,
+        is_fallback=is_fallback
     )
 
-    # Завершаем урок
-    await db.complete_lesson(tg_id, lesson.id)
-
     # НЕ открываем следующий урок сразу — это сделает scheduler через 1 день
 
-    await db.update_user_state(tg_id, UserState.IDLE.value)
-
     logger.info(f"ДЗ принято: user={tg_id}, lesson={lesson.id}")
 
     # Определяем финальное сообщение
@@ -235,15 +378,14 @@ async def accept_homework(update, context, tg_id: int, lesson, content: str, con
     else:
         final_text = f"{ai_message}\n\nУрок {lesson.order_num} завершён! Следующий урок откроется через 1 день."
 
-    await update.message.reply_text(final_text, reply_markup=main_menu_keyboard())
+    await reply_result(update, final_text, main_menu_keyboard(), live)
+    return submission
 
 
 async def receive_hw_voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка голосовых сообщений при сдаче ДЗ — не принимаем"""
-    tg_id = update.effective_user.id
-
-    user = await db.get_user(tg_id)
-    if not user or user.state != UserState.WAITING_HW.value:
+    user_ctx = await get_user_context(update, context)
+    if not user_ctx or user_ctx.state != UserState.WAITING_HW.value:
         return
 
     await update.message.reply_text(
@@ -0,0 +1,88 @@
+"""
+Маршрутизация текстовых и медиа-сообщений по состоянию пользователя
+
+Состояние загружается один раз (контекст обновления), затем сообщение уходит
+ровно в один хендлер из таблицы. Ответы куратора определяются заранее по
+отправителю — без загрузки состояния.
+"""
+
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from bot.config import config
+from bot.database.connection import count_queries
+from bot.states import UserState
+from bot.services.user_context import get_user_context
+from bot.handlers.start import code_input_handler
+from bot.handlers.homework import receive_hw_text_handler, receive_hw_voice_handler
+from bot.handlers.support import receive_question_handler, curator_reply_handler
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+
+
+# Текст: состояние → хендлер
+TEXT_ROUTES: Dict[UserState, Handler] = {
+    UserState.WAITING_QUESTION: receive_question_handler,
+    UserState.WAITING_CODE: code_input_handler,
+    UserState.WAITING_HW: receive_hw_text_handler,
+}
+
+# Фото и голосовые: вопросы куратору принимаются в любом виде
+MEDIA_ROUTES: Dict[UserState, Handler] = {
+    UserState.WAITING_QUESTION: receive_question_handler,
+}
+
+# Голосовые при сдаче ДЗ — отдельный ответ (не принимаем)
+VOICE_ROUTES: Dict[UserState, Handler] = {
+    **MEDIA_ROUTES,
+    UserState.WAITING_HW: receive_hw_voice_handler,
+}
+
+
+def is_curator_reply(update: Update) -> bool:
+    """Ответ куратора (reply) на пересланный вопрос"""
+    return (
+        update.effective_user.id == config.CURATOR_ID
+        and update.message.reply_to_message is not None
+    )
+
+
+async def resolve_state(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[UserState]:
+    """Состояние пользователя текущего обновления (None — неизвестный пользователь/состояние)"""
+    user_ctx = await get_user_context(update, context)
+    if not user_ctx:
+        return None
+
+    try:
+        return UserState(user_ctx.state)
+    except ValueError:
+        return None
+
+
+async def receive_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Текстовые сообщения: ответ куратора или хендлер по состоянию"""
+    with count_queries() as counter:
+        if is_curator_reply(update):
+            await curator_reply_handler(update, context)
+        else:
+            state = await resolve_state(update, context)
+            handler = TEXT_ROUTES.get(state)
+            if handler:
+                await handler(update, context)
+
+    logger.debug(f"Текстовое сообщение {update.effective_user.id}: SQL-запросов {counter.count}")
+
+
+async def receive_media_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Фото и голосовые сообщения: хендлер по состоянию"""
+    routes = VOICE_ROUTES if update.message.voice else MEDIA_ROUTES
+
+    state = await resolve_state(update, context)
+    handler = routes.get(state)
+    if handler:
+        await handler(update, context)
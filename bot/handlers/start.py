@@ -9,6 +9,7 @@ from telegram.ext import ContextTypes
 from bot.states import UserState
 from bot.keyboards import no_auth_keyboard, main_menu_keyboard
 from bot.database import queries as db
+from bot.services.user_context import get_user_context
 
 logger = logging.getLogger(__name__)
 
@@ -64,8 +65,8 @@ async def code_input_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     code = update.message.text.strip()
 
     # Проверяем состояние
-    user = await db.get_user(tg_id)
-    if not user or user.state != UserState.WAITING_CODE.value:
+    user_ctx = await get_user_context(update, context)
+    if not user_ctx or user_ctx.state != UserState.WAITING_CODE.value:
         return
 
     # Проверяем код
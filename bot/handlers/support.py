@@ -10,6 +10,7 @@ from bot.states import UserState
 from bot.keyboards import main_menu_keyboard, cancel_keyboard
 from bot.database import queries as db
 from bot.config import config
+from bot.services.user_context import get_user_context
 
 logger = logging.getLogger(__name__)
 
@@ -39,10 +40,10 @@ async def ask_curator_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 async def receive_question_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Получение вопроса и пересылка куратору"""
     tg_id = update.effective_user.id
-    user = await db.get_user(tg_id)
+    user_ctx = await get_user_context(update, context)
 
     # Проверяем состояние
-    if not user or user.state != UserState.WAITING_QUESTION.value:
+    if not user_ctx or user_ctx.state != UserState.WAITING_QUESTION.value:
         return
 
     # Формируем информацию о студенте
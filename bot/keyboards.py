@@ -1,38 +1,55 @@
 """
 Клавиатуры бота
+
+Разметка собирается один раз: статичные клавиатуры — готовые объекты,
+клавиатуры урока — мемоизированы по (has_homework, lesson_id). Объекты
+telegram неизменяемы после создания, поэтому один экземпляр безопасно
+отдавать во все ответы.
 """
 
+from functools import lru_cache
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
+# Клавиатур урока: 18 уроков × 2 варианта, с запасом
+LESSON_KEYBOARD_CACHE_SIZE = 64
+
 
 # ============================================
 # Неавторизованный пользователь
 # ============================================
 
+NO_AUTH_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔑 Ввести код доступа", callback_data="enter_code")],
+    [InlineKeyboardButton("💬 Написать в поддержку", callback_data="contact_support")]
+])
+
+
 def no_auth_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для неавторизованных"""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("🔑 Ввести код доступа", callback_data="enter_code")],
-        [InlineKeyboardButton("💬 Написать в поддержку", callback_data="contact_support")]
-    ])
+    return NO_AUTH_KEYBOARD
 
 
 # ============================================
 # Главное меню
 # ============================================
 
+MAIN_MENU_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📚 Текущий урок", callback_data="current_lesson")],
+    [InlineKeyboardButton("📊 Мой прогресс", callback_data="my_progress")]
+])
+
+
 def main_menu_keyboard() -> InlineKeyboardMarkup:
     """Главное меню авторизованного пользователя"""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("📚 Текущий урок", callback_data="current_lesson")],
-        [InlineKeyboardButton("📊 Мой прогресс", callback_data="my_progress")]
-    ])
+    return MAIN_MENU_KEYBOARD
 
 
 # ============================================
 # Урок
 # ============================================
 
+@lru_cache(maxsize=LESSON_KEYBOARD_CACHE_SIZE)
 def lesson_keyboard(has_homework: bool, lesson_id: int) -> InlineKeyboardMarkup:
     """Клавиатура урока"""
     buttons = []
@@ -48,6 +65,7 @@ def lesson_keyboard(has_homework: bool, lesson_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(buttons)
 
 
+@lru_cache(maxsize=LESSON_KEYBOARD_CACHE_SIZE)
 def back_to_lesson_keyboard(lesson_id: int) -> InlineKeyboardMarkup:
     """Кнопка возврата к уроку"""
     return InlineKeyboardMarkup([
@@ -55,8 +73,11 @@ def back_to_lesson_keyboard(lesson_id: int) -> InlineKeyboardMarkup:
     ])
 
 
+CANCEL_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("❌ Отмена", callback_data="cancel")]
+])
+
+
 def cancel_keyboard() -> InlineKeyboardMarkup:
     """Кнопка отмены"""
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("❌ Отмена", callback_data="cancel")]
-    ])
+    return CANCEL_KEYBOARD
@@ -2,28 +2,35 @@
 Главная точка входа бота
 """
 
+import asyncio
 import logging
 
-from telegram import Update
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
-    ContextTypes,
     filters
 )
 
 from bot.config import config
+from bot.database import queries as db
 from bot.database.connection import get_pool, close_pool
 from bot.database.migrations import run_migrations
-from bot.services.scheduler import setup_scheduler, shutdown_scheduler, set_bot
+from bot.database.lesson_catalog import lesson_catalog
+from bot.services.scheduler import setup_scheduler, shutdown_scheduler
+from bot.services.outbox import start_outbox_worker, stop_outbox_worker
+from bot.services.grading import grading_pool
+from bot.services.similarity import similarity_index
+from bot.services.telemetry import llm_telemetry
+from bot.services.prompts import prompt_registry
+from bot.services.lesson_contexts import context_store
+from bot.services.verdict_cache import verdict_cache
 
 # Хендлеры
 from bot.handlers.start import (
     start_handler,
     enter_code_callback,
-    code_input_handler,
     contact_support_callback,
     main_menu_callback,
     cancel_callback
@@ -36,9 +43,8 @@ from bot.handlers.lessons import (
 )
 from bot.handlers.homework import (
     submit_hw_callback,
-    receive_hw_text_handler,
     receive_hw_file_handler,
-    receive_hw_voice_handler
+    release_stale_processing
 )
 from bot.handlers.admin import (
     stat_handler,
@@ -48,13 +54,13 @@ from bot.handlers.admin import (
     broadcast_handler,
     unlock_all_handler,
     unlock_lesson_handler,
-    force_accept_handler
-)
-from bot.handlers.support import (
-    ask_curator_callback,
-    receive_question_handler,
-    curator_reply_handler
+    force_accept_handler,
+    llm_stat_handler,
+    reload_contexts_handler
 )
+from bot.handlers.support import ask_curator_callback
+from bot.handlers.router import receive_text_handler, receive_media_handler
+from bot.webhook import run_webhook
 
 
 # Настройка логирования
@@ -64,26 +70,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-
-async def receive_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Универсальный обработчик текстовых сообщений"""
-    # Сначала проверяем ответ куратора
-    await curator_reply_handler(update, context)
-    # Затем вопрос от студента
-    await receive_question_handler(update, context)
-    # Пытаемся обработать как код доступа
-    await code_input_handler(update, context)
-    # Затем как ДЗ
-    await receive_hw_text_handler(update, context)
-
-
-async def receive_media_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик фото и голосовых сообщений"""
-    # Проверяем голосовое при сдаче ДЗ (отклоняем)
-    if update.message.voice:
-        await receive_hw_voice_handler(update, context)
-    # Вопросы куратору (фото/голосовые)
-    await receive_question_handler(update, context)
+ALLOWED_UPDATES = ["message", "callback_query"]
 
 
 def register_handlers(app: Application):
@@ -101,6 +88,8 @@ def register_handlers(app: Application):
     app.add_handler(CommandHandler("unlock_all", unlock_all_handler))
     app.add_handler(CommandHandler("unlock_lesson", unlock_lesson_handler))
     app.add_handler(CommandHandler("force_accept", force_accept_handler))
+    app.add_handler(CommandHandler("llmstat", llm_stat_handler))
+    app.add_handler(CommandHandler("reload_contexts", reload_contexts_handler))
 
     # Callbacks — start
     app.add_handler(CallbackQueryHandler(enter_code_callback, pattern="^enter_code$"))
@@ -126,21 +115,65 @@ def register_handlers(app: Application):
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, receive_text_handler))
 
 
+def on_contexts_changed(old, new):
+    """Контексты уроков изменились — перерисовать промпты, сбросить кэш вердиктов в памяти"""
+    prompt_registry.load(lesson_catalog.all())
+    verdict_cache.clear_memory()
+
+
 async def post_init(app: Application):
     """Инициализация после запуска"""
     await get_pool()
     await run_migrations()
     logger.info("База данных подключена, миграции выполнены")
 
+    # Таймеры открытия для уроков, завершённых до появления unlock_at
+    armed = await db.arm_missing_unlock_timers()
+    if armed:
+        logger.info(f"Взведено таймеров открытия уроков: {armed}")
+
+    # Проверки, потерянные при падении прошлого процесса: обновления ещё не принимаются,
+    # поэтому любой PROCESSING начат до старта этого процесса
+    await release_stale_processing()
+
+    # Каталог уроков в памяти (обновляется через LISTEN/NOTIFY)
+    await lesson_catalog.start()
+
+    # Контексты уроков из файлов (перезагрузка — /reload_contexts или при изменении файлов)
+    context_store.subscribe(on_contexts_changed)
+    context_store.start()
+    logger.info(f"Контексты уроков загружены: версия {context_store.current.version}")
+
+    # Промпты проверки ДЗ — рендерим один раз
+    prompt_registry.load(lesson_catalog.all())
+
     # Запускаем планировщик
-    set_bot(app.bot)
     setup_scheduler()
     logger.info("Планировщик запущен")
 
+    # Очередь проверки ДЗ
+    grading_pool.start()
+
+    # Отправка уведомлений из outbox
+    start_outbox_worker(app.bot)
+
+    # Запись телеметрии LLM пачками
+    llm_telemetry.start()
+
+    # Индекс похожих ответов (загрузка в фоне)
+    if config.SIMILARITY_ENABLED:
+        similarity_index.start()
+
 
 async def post_shutdown(app: Application):
     """Очистка при завершении"""
     shutdown_scheduler()
+    await grading_pool.stop()
+    await llm_telemetry.stop()
+    await similarity_index.stop()
+    await context_store.stop()
+    await stop_outbox_worker()
+    await lesson_catalog.stop()
     await close_pool()
     logger.info("Соединение с БД закрыто")
 
@@ -155,10 +188,11 @@ def main():
             logger.error(f"Ошибка конфигурации: {error}")
         return
 
-    # Создание приложения
+    # Создание приложения (очередь обновлений ограничена — backpressure)
     app = (
         Application.builder()
         .token(config.BOT_TOKEN)
+        .update_queue(asyncio.Queue(maxsize=config.UPDATE_QUEUE_SIZE))
         .post_init(post_init)
         .post_shutdown(post_shutdown)
         .build()
@@ -167,10 +201,13 @@ def main():
     # Регистрация хендлеров
     register_handlers(app)
 
-    logger.info("Бот запущен!")
+    logger.info(f"Бот запущен! Режим: {config.BOT_MODE}")
 
-    # Запуск
-    app.run_polling(allowed_updates=["message", "callback_query"])
+    # Запуск (polling — по умолчанию, для локальной разработки)
+    if config.BOT_MODE == "webhook":
+        asyncio.run(run_webhook(app, ALLOWED_UPDATES))
+    else:
+        app.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == "__main__":
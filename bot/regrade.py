@@ -0,0 +1,301 @@
+"""
+Массовая перепроверка сданных ДЗ (офлайн)
+
+После изменения контекста урока (grading_contexts/) старые текстовые сдачи
+прогоняются через текущий промпт и сравниваются с исходным ai_verdict.
+Результаты пишутся в regrade_results (run_id, submission_id): студентам
+ничего не отправляется, submissions не меняются.
+
+    python -m bot.regrade run --run-id ctx-v2 --lessons 1,5 --concurrency 5 --rate 2
+    python -m bot.regrade export --run-id ctx-v2 --out batch.jsonl      # OpenAI Batch API
+    python -m bot.regrade import --run-id ctx-v2 --in batch_output.jsonl
+    python -m bot.regrade report --run-id ctx-v2
+
+Сдачи читаются серверным курсором (таблица не грузится в память целиком).
+Уже перепроверенные в этом run_id пропускаются — прерванный прогон можно
+продолжить той же командой. Fallback-вердикты (модель недоступна) не
+сохраняются: такие сдачи попадут в следующий запуск.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Set
+
+from bot.database import queries as db
+from bot.database.connection import close_pool, get_pool
+from bot.database.migrations import run_migrations
+from bot.services import llm
+from bot.services.answer_budget import answer_budget, prepare_answer
+from bot.services.pregrade import pregrade
+from bot.services.prompts import prompt_registry
+from bot.services.sender import RateLimiter
+from bot.services.telemetry import llm_telemetry
+
+logger = logging.getLogger(__name__)
+
+# Сколько результатов копить перед записью в БД
+SAVE_BATCH_SIZE = 50
+
+# Путь запроса в строке Batch API
+BATCH_URL = "/v1/chat/completions"
+
+
+@dataclass
+class RegradeStats:
+    """Итоги прогона"""
+    graded: int = 0
+    fallback: int = 0  # модель недоступна — не сохранено
+    errors: int = 0
+    saved: int = 0
+
+
+def _custom_id(submission_id: int, prompt_fingerprint: str) -> str:
+    return f"{submission_id}:{prompt_fingerprint}"
+
+
+def _parse_custom_id(custom_id: str) -> tuple:
+    submission_id, prompt_fingerprint = custom_id.split(":", 1)
+    return int(submission_id), prompt_fingerprint
+
+
+# ============================================
+# run — перепроверка через API
+# ============================================
+
+async def regrade(
+    run_id: str,
+    lessons: Optional[List[int]] = None,
+    since: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    concurrency: int = 5,
+    rate: float = 2.0
+) -> RegradeStats:
+    """
+    Перепроверить сдачи: не больше concurrency запросов одновременно
+    и не чаще rate запросов в секунду (0 — без ограничения).
+    """
+    stats = RegradeStats()
+    limiter = RateLimiter(rate) if rate > 0 else None
+    slots = asyncio.Semaphore(concurrency)
+    tasks: Set[asyncio.Task] = set()
+    results: List[tuple] = []
+
+    async def grade(sub: dict):
+        try:
+            prompt = prompt_registry.get(sub["lesson_number"], sub["lesson_title"], sub["homework_task"])
+            result = await llm.check_homework_with_ai(
+                lesson_number=sub["lesson_number"],
+                lesson_topic=sub["lesson_title"],
+                homework_task=sub["homework_task"],
+                user_answer=sub["content_text"],
+                use_cache=False
+            )
+            if result.get("fallback"):
+                stats.fallback += 1
+            else:
+                stats.graded += 1
+                results.append((sub["id"], prompt.fingerprint, result["verdict"], result["message"]))
+        except Exception as e:
+            stats.errors += 1
+            logger.error(f"Regrade: сдача {sub['id']}: {e}")
+        finally:
+            slots.release()
+
+    async def flush():
+        batch = results[:]
+        results.clear()
+        stats.saved += await db.save_regrade_results(run_id, batch)
+
+    async for sub in db.iter_regrade_submissions(run_id, lessons, since, limit):
+        # Свободный слот — иначе курсор не читаем дальше (backpressure)
+        await slots.acquire()
+        if limiter is not None:
+            wait = limiter.reserve(time.monotonic())
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        task = asyncio.create_task(grade(sub))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+        if len(results) >= SAVE_BATCH_SIZE:
+            await flush()
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    await flush()
+
+    logger.info(
+        f"Regrade {run_id}: проверено {stats.graded}, сохранено {stats.saved}, "
+        f"fallback {stats.fallback}, ошибок {stats.errors}"
+    )
+    return stats
+
+
+# ============================================
+# export / import — OpenAI Batch API
+# ============================================
+
+async def export_batch(
+    run_id: str,
+    path: str,
+    lessons: Optional[List[int]] = None,
+    since: Optional[datetime] = None,
+    limit: Optional[int] = None
+) -> int:
+    """
+    Записать запросы в JSONL для Batch API. Ответы, которые предпроверка
+    отклоняет локально, сразу сохраняются как REVISE (в файл не идут).
+    Возвращает количество запросов в файле.
+    """
+    exported = 0
+    rejected: List[tuple] = []
+    with open(path, "w", encoding="utf-8") as out:
+        async for sub in db.iter_regrade_submissions(run_id, lessons, since, limit):
+            prompt = prompt_registry.get(sub["lesson_number"], sub["lesson_title"], sub["homework_task"])
+
+            decision = pregrade(sub["content_text"], sub["homework_task"])
+            if decision.reject:
+                rejected.append((sub["id"], prompt.fingerprint, "REVISE", f"pregrade: {decision.reason}"))
+                continue
+
+            line = {
+                "custom_id": _custom_id(sub["id"], prompt.fingerprint),
+                "method": "POST",
+                "url": BATCH_URL,
+                "body": llm.build_request(
+                    prompt, prepare_answer(sub["content_text"], answer_budget(sub["lesson_number"])).text
+                ),
+            }
+            out.write(json.dumps(line, ensure_ascii=False) + "\n")
+            exported += 1
+
+    saved = await db.save_regrade_results(run_id, rejected)
+    logger.info(f"Regrade {run_id}: в файл {exported} запросов, отклонено предпроверкой {saved}")
+    return exported
+
+
+async def import_batch(run_id: str, path: str) -> RegradeStats:
+    """Загрузить результаты Batch API (JSONL) в regrade_results"""
+    stats = RegradeStats()
+    results: List[tuple] = []
+
+    with open(path, encoding="utf-8") as src:
+        for line_number, line in enumerate(src, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                submission_id, prompt_fingerprint = _parse_custom_id(item["custom_id"])
+                response = item.get("response") or {}
+                if item.get("error") or response.get("status_code") != 200:
+                    raise ValueError(item.get("error") or f"status {response.get('status_code')}")
+                content = response["body"]["choices"][0]["message"]["content"]
+                verdict = llm.parse_model_output(content)
+            except Exception as e:
+                stats.errors += 1
+                logger.warning(f"Regrade import: строка {line_number}: {e}")
+                continue
+
+            stats.graded += 1
+            results.append((submission_id, prompt_fingerprint, verdict["verdict"], verdict["message"]))
+            if len(results) >= SAVE_BATCH_SIZE:
+                stats.saved += await db.save_regrade_results(run_id, results)
+                results = []
+
+    stats.saved += await db.save_regrade_results(run_id, results)
+    logger.info(f"Regrade {run_id}: импортировано {stats.saved}, ошибок {stats.errors}")
+    return stats
+
+
+# ============================================
+# report
+# ============================================
+
+def format_report(run_id: str, rows: List[dict]) -> str:
+    """Таблица сравнения с исходными вердиктами"""
+    if not rows:
+        return f"Прогон {run_id}: результатов нет"
+
+    lines = [f"Прогон {run_id}: урок, всего, совпало, ACCEPT→REVISE, REVISE→ACCEPT, были fallback"]
+    for row in rows:
+        lines.append(
+            f"  урок {row['lesson_number']:>2}: {row['total']}, {row['same']}, "
+            f"{row['accept_to_revise']}, {row['revise_to_accept']}, {row['was_fallback']}"
+        )
+    total = sum(row["total"] for row in rows)
+    same = sum(row["same"] for row in rows)
+    lines.append(f"Совпадение: {same}/{total} ({100 * same / total:.0f}%)")
+    return "\n".join(lines)
+
+
+# ============================================
+# CLI
+# ============================================
+
+def _lessons(value: str) -> List[int]:
+    return [int(n) for n in value.split(",") if n.strip()]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m bot.regrade", description="Массовая перепроверка ДЗ")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_filters(cmd):
+        cmd.add_argument("--run-id", required=True, help="имя прогона (для продолжения и отчёта)")
+        cmd.add_argument("--lessons", type=_lessons, help="номера уроков через запятую")
+        cmd.add_argument("--since", type=datetime.fromisoformat, help="сдачи не раньше (YYYY-MM-DD)")
+        cmd.add_argument("--limit", type=int, help="не больше N сдач")
+
+    run = commands.add_parser("run", help="перепроверить через API")
+    add_filters(run)
+    run.add_argument("--concurrency", type=int, default=5, help="одновременных запросов (по умолчанию 5)")
+    run.add_argument("--rate", type=float, default=2.0, help="запросов в секунду, 0 — без лимита (по умолчанию 2)")
+
+    export = commands.add_parser("export", help="выгрузить JSONL для OpenAI Batch API")
+    add_filters(export)
+    export.add_argument("--out", required=True, help="файл запросов")
+
+    imp = commands.add_parser("import", help="загрузить результаты Batch API")
+    imp.add_argument("--run-id", required=True)
+    imp.add_argument("--in", dest="path", required=True, help="файл результатов")
+
+    report = commands.add_parser("report", help="сравнить с исходными вердиктами")
+    report.add_argument("--run-id", required=True)
+
+    return parser
+
+
+async def _main(args: argparse.Namespace):
+    await get_pool()
+    await run_migrations()
+    llm_telemetry.start()
+    try:
+        if args.command == "run":
+            await regrade(args.run_id, args.lessons, args.since, args.limit, args.concurrency, args.rate)
+        elif args.command == "export":
+            await export_batch(args.run_id, args.out, args.lessons, args.since, args.limit)
+        elif args.command == "import":
+            await import_batch(args.run_id, args.path)
+        if args.command in ("run", "import", "report"):
+            print(format_report(args.run_id, await db.get_regrade_report(args.run_id)))
+    finally:
+        await llm_telemetry.stop()
+        await close_pool()
+
+
+def main(argv: Optional[List[str]] = None):
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO
+    )
+    asyncio.run(_main(build_parser().parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Подготовка ответа на ДЗ к отправке в модель (бюджет входных токенов)
+
+Некоторые задания (сказка урока 12, ответ из шести частей в уроке 5)
+провоцируют очень длинные тексты, а ответ уходил в модель как есть:
+выход ограничен max_tokens, вход — ничем. Здесь ответ чистится от шума,
+повторно вставленные абзацы убираются, а если текст всё ещё длиннее
+бюджета урока — бюджет делится между абзацами поровну, длинные абзацы
+сокращаются до своей доли (начало сохраняется, пропуск помечается).
+Структура ответа остаётся видна модели: все части многочастного ответа
+на месте.
+
+Токены считаются локально, без токенизатора провайдера: слово ≈ длина / 4
+(латиница) или / 3 (кириллица), знак препинания — 1. Для бюджета
+и телеметрии этой точности хватает.
+"""
+
+import math
+import re
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from bot.config import config
+from bot.services.lesson_contexts import get_lesson_context
+from bot.services.verdict_cache import normalize_answer
+
+# Символов на токен для слов разных алфавитов
+LATIN_CHARS_PER_TOKEN = 4
+OTHER_CHARS_PER_TOKEN = 3
+
+# Абзац, сокращённый до меньшего числа токенов, не имеет смысла — выбрасываем целиком
+MIN_PARAGRAPH_TOKENS = 12
+
+ELLIPSIS = " […]"
+TRIM_NOTE = "[Ответ сокращён автоматически: {kept} из {total} токенов]"
+
+# Шаги подготовки (для логов)
+STEP_CLEANED = "cleaned"
+STEP_DEDUPED = "deduped"
+STEP_CONDENSED = "condensed"
+
+_TOKEN = re.compile(r"[^\W\d_]+|\d+|[^\w\s]")
+_LATIN = re.compile(r"[a-zA-Z]+")
+_INVISIBLE = re.compile("[\u200b-\u200f\u2060\ufeff\u00ad]")
+_SPACES = re.compile("[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+_REPEATED_PUNCT = re.compile(r"([!?.,)(\-_*=~])\1{3,}")
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def count_tokens(text: str) -> int:
+    """Оценка числа токенов текста"""
+    total = 0
+    for token in _TOKEN.findall(text):
+        if token.isalpha():
+            per_token = LATIN_CHARS_PER_TOKEN if _LATIN.fullmatch(token) else OTHER_CHARS_PER_TOKEN
+            total += math.ceil(len(token) / per_token)
+        elif token.isdigit():
+            total += math.ceil(len(token) / 3)
+        else:
+            total += 1
+    return total
+
+
+def answer_budget(lesson_number: int) -> int:
+    """Бюджет токенов ответа: из контекста урока (answer_token_budget) или общий"""
+    return get_lesson_context(lesson_number).get("answer_token_budget", config.LLM_ANSWER_TOKEN_BUDGET)
+
+
+@dataclass(frozen=True)
+class PreparedAnswer:
+    """Ответ, готовый к отправке в модель"""
+    text: str
+    original_tokens: int
+    tokens: int
+    steps: Tuple[str, ...] = ()
+
+    @property
+    def trimmed(self) -> bool:
+        return STEP_CONDENSED in self.steps
+
+
+def clean(text: str) -> str:
+    """Невидимые символы, лишние пробелы и пустые строки, «!!!!!!» → «!!!»"""
+    text = _INVISIBLE.sub("", text)
+    text = _REPEATED_PUNCT.sub(r"\1\1\1", text)
+    lines = [_SPACES.sub(" ", line).strip() for line in text.replace("\r\n", "\n").split("\n")]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def paragraphs(text: str) -> List[str]:
+    return [p for p in text.split("\n\n") if p.strip()]
+
+
+def dedupe_paragraphs(parts: List[str]) -> List[str]:
+    """Убрать повторно вставленные абзацы (сравнение после normalize_answer)"""
+    seen = set()
+    unique = []
+    for part in parts:
+        key = normalize_answer(part)
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(part)
+    return unique
+
+
+def shorten_paragraph(paragraph: str, budget: int) -> str:
+    """Начало абзаца в пределах budget токенов: целыми предложениями, иначе словами"""
+    kept = []
+    used = 0
+    for sentence in _SENTENCE_END.split(paragraph):
+        cost = count_tokens(sentence)
+        if used + cost > budget:
+            if not kept:
+                # Первое предложение длиннее бюджета — режем по словам
+                for word in sentence.split():
+                    word_cost = count_tokens(word)
+                    if used + word_cost > budget:
+                        break
+                    kept.append(word)
+                    used += word_cost
+            break
+        kept.append(sentence)
+        used += cost
+    return " ".join(kept) + ELLIPSIS
+
+
+def keep_leading(parts: List[str], costs: List[int], budget: int) -> List[str]:
+    """Абзацы с начала целиком, пока помещаются; на остаток — начало следующего"""
+    kept = []
+    remaining = budget
+    for part, cost in zip(parts, costs):
+        if cost <= remaining:
+            kept.append(part)
+            remaining -= cost
+            continue
+        if remaining >= MIN_PARAGRAPH_TOKENS or not kept:
+            kept.append(shorten_paragraph(part, max(remaining - count_tokens(ELLIPSIS), 1)))
+        break
+    return kept
+
+
+def condense(parts: List[str], budget: int) -> List[str]:
+    """
+    Сократить абзацы до бюджета поровну: абзацы короче своей доли остаются
+    целиком, освободившееся делится между остальными (с учётом пометки
+    ELLIPSIS). Если доля меньше MIN_PARAGRAPH_TOKENS — абзацы с начала
+    (keep_leading), ответ не пустеет.
+    """
+    costs = [count_tokens(p) for p in parts]
+    # Сокращённый абзац дополнительно несёт пометку ELLIPSIS — она тоже в бюджете
+    ellipsis = count_tokens(ELLIPSIS)
+    shares = {}
+    pending = list(range(len(parts)))
+    remaining = budget
+    while pending:
+        share = remaining // len(pending)
+        fits = [i for i in pending if costs[i] <= share]
+        if not fits:
+            if share - ellipsis < MIN_PARAGRAPH_TOKENS:
+                # Абзацев слишком много, чтобы делить поровну — иначе выбросили
+                # бы все: берём абзацы с начала, пока хватает бюджета
+                return keep_leading(parts, costs, budget)
+            for i in pending:
+                shares[i] = share
+            break
+        for i in fits:
+            shares[i] = costs[i]
+            remaining -= costs[i]
+        pending = [i for i in pending if i not in fits]
+
+    condensed = []
+    for i, part in enumerate(parts):
+        if shares[i] >= costs[i]:
+            condensed.append(part)
+        elif shares[i] - ellipsis >= MIN_PARAGRAPH_TOKENS:
+            condensed.append(shorten_paragraph(part, shares[i] - ellipsis))
+    return condensed
+
+
+def prepare_answer(text: str, budget: int) -> PreparedAnswer:
+    """Очистка → удаление повторов абзацев → сокращение до бюджета (если нужно)"""
+    original_tokens = count_tokens(text)
+    steps = []
+
+    cleaned = clean(text)
+    if cleaned != text:
+        steps.append(STEP_CLEANED)
+
+    parts = paragraphs(cleaned)
+    unique = dedupe_paragraphs(parts)
+    if len(unique) < len(parts):
+        steps.append(STEP_DEDUPED)
+    prepared = "\n\n".join(unique)
+
+    tokens = count_tokens(prepared)
+    if tokens > budget:
+        note_tokens = count_tokens(TRIM_NOTE.format(kept=budget, total=original_tokens))
+        condensed = "\n\n".join(condense(unique, max(budget - note_tokens, MIN_PARAGRAPH_TOKENS)))
+        kept = count_tokens(condensed)
+        prepared = condensed + "\n\n" + TRIM_NOTE.format(kept=kept, total=original_tokens)
+        tokens = count_tokens(prepared)
+        steps.append(STEP_CONDENSED)
+
+    return PreparedAnswer(text=prepared, original_tokens=original_tokens, tokens=tokens, steps=tuple(steps))
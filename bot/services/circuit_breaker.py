@@ -0,0 +1,107 @@
+"""
+Circuit breaker для внешних зависимостей (OpenAI)
+
+Когда OpenAI лежит или тормозит, каждая проверка ждала полный LLM_TIMEOUT
+и только потом отдавала fallback — студент всё это время в PROCESSING.
+После LLM_BREAKER_THRESHOLD ошибок/таймаутов подряд breaker «размыкается»:
+запросы к модели не делаются, fallback отдаётся сразу. Через
+LLM_BREAKER_RESET_SECONDS пропускается один пробный запрос (half-open):
+успех — замыкаем, ошибка — снова размыкаем.
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from enum import Enum
+
+from bot.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class BreakerState(str, Enum):
+    """Состояние breaker-а"""
+    CLOSED = "CLOSED"        # запросы идут как обычно
+    OPEN = "OPEN"            # запросы не делаются, сразу fallback
+    HALF_OPEN = "HALF_OPEN"  # идёт один пробный запрос
+
+
+@dataclass
+class BreakerStats:
+    """Счётчики breaker-а (с момента старта процесса)"""
+    successes: int = 0
+    failures: int = 0
+    short_circuited: int = 0  # запросов, отбитых без вызова модели
+    trips: int = 0            # сколько раз размыкался
+
+
+class CircuitBreaker:
+    """Breaker по числу ошибок подряд с одним пробным запросом"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.stats = BreakerStats()
+        self.state = BreakerState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        """
+        Можно ли делать запрос.
+        В OPEN по истечении reset_timeout пропускает ровно один пробный запрос
+        (и ещё один, если проба не завершилась за reset_timeout — например, отменена).
+        """
+        if self.state == BreakerState.CLOSED:
+            return True
+
+        now = time.monotonic()
+        if now - self._opened_at >= self.reset_timeout:
+            self.state = BreakerState.HALF_OPEN
+            self._opened_at = now
+            logger.info(f"Breaker {self.name}: пробный запрос")
+            return True
+
+        # OPEN до таймаута или HALF_OPEN с уже идущей пробой
+        self.stats.short_circuited += 1
+        return False
+
+    def record_success(self):
+        """Запрос прошёл успешно"""
+        self.stats.successes += 1
+        self._consecutive_failures = 0
+        if self.state != BreakerState.CLOSED:
+            logger.info(f"Breaker {self.name}: замкнут, сервис доступен")
+            self.state = BreakerState.CLOSED
+
+    def record_failure(self):
+        """Запрос завершился ошибкой или таймаутом"""
+        self.stats.failures += 1
+        self._consecutive_failures += 1
+        if self.state == BreakerState.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._trip()
+
+    def _trip(self):
+        if self.state != BreakerState.OPEN:
+            self.stats.trips += 1
+            logger.warning(
+                f"Breaker {self.name}: разомкнут после {self._consecutive_failures} ошибок подряд, "
+                f"повтор через {self.reset_timeout} с"
+            )
+        self.state = BreakerState.OPEN
+        self._opened_at = time.monotonic()
+
+    def reset(self):
+        """Сбросить в исходное состояние"""
+        self.state = BreakerState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+
+
+# Breaker запросов к OpenAI
+openai_breaker = CircuitBreaker(
+    "openai",
+    failure_threshold=config.LLM_BREAKER_THRESHOLD,
+    reset_timeout=config.LLM_BREAKER_RESET_SECONDS
+)
@@ -0,0 +1,152 @@
+"""
+Очередь проверки ДЗ через LLM
+
+Проверка ответа занимает до LLM_TIMEOUT секунд. Раньше хендлер ждал её
+сам — всплеск сдач после открытия урока занимал все соединения и тормозил
+остальные обновления. Теперь хендлер ставит проверку в очередь и сразу
+отвечает («проверяю» / «вы в очереди»), результат приходит отдельным
+сообщением. Одновременно выполняется не больше GRADING_CONCURRENCY проверок,
+ожидать может не больше GRADING_MAX_QUEUE. Одна проверка на пару
+(пользователь, урок) — повторная отправка, пока идёт проверка, отклоняется.
+Проверка, которая не завершилась (ошибка, отмена при остановке), вызывает
+on_abort — хендлер возвращает студенту возможность сдать ответ заново.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from enum import Enum
+from typing import Awaitable, Callable, Hashable, Optional, Set
+
+from bot.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class SubmitStatus(str, Enum):
+    """Результат постановки в очередь"""
+    STARTED = "STARTED"      # свободный слот — проверка началась
+    QUEUED = "QUEUED"        # ждёт слота
+    DUPLICATE = "DUPLICATE"  # по этому ключу уже идёт проверка
+    FULL = "FULL"            # очередь переполнена
+
+
+@dataclass
+class SubmitResult:
+    status: SubmitStatus
+    ahead: int = 0  # сколько проверок ждут перед этой
+
+
+@dataclass
+class GradingStats:
+    """Метрики очереди (текущие значения и счётчики с момента старта)"""
+    queued: int = 0
+    running: int = 0
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+
+
+class GradingPool:
+    """Ограниченная по параллельности очередь задач с single-flight по ключу"""
+
+    def __init__(self, concurrency: int = 5, max_queue: int = 100):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.stats = GradingStats()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._in_flight: Set[Hashable] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start(self):
+        """Запуск (post_init): семафор привязывается к event loop приложения"""
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    def submit(
+        self,
+        key: Hashable,
+        job: Callable[[], Awaitable],
+        on_abort: Optional[Callable[[], Awaitable]] = None
+    ) -> SubmitResult:
+        """
+        Поставить задачу в очередь (не ждёт выполнения).
+        on_abort вызывается, если задача не завершилась: ошибка или отмена
+        (в том числе в очереди, до старта — при stop()).
+        """
+        if key in self._in_flight:
+            self.stats.duplicates += 1
+            return SubmitResult(SubmitStatus.DUPLICATE)
+
+        # queued — ещё не получившие слот (включая только что созданные)
+        pending = self.stats.running + self.stats.queued
+        busy = pending >= self.concurrency
+        ahead = max(0, pending - self.concurrency)
+        if busy and ahead >= self.max_queue:
+            self.stats.rejected += 1
+            logger.warning(f"Grading: очередь переполнена ({ahead})")
+            return SubmitResult(SubmitStatus.FULL, ahead)
+
+        self._in_flight.add(key)
+        self.stats.submitted += 1
+        self.stats.queued += 1
+
+        task = asyncio.create_task(self._run(key, job, on_abort))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        if busy:
+            return SubmitResult(SubmitStatus.QUEUED, ahead)
+        return SubmitResult(SubmitStatus.STARTED)
+
+    async def _run(self, key: Hashable, job: Callable[[], Awaitable], on_abort=None):
+        started = False
+        completed = False
+        try:
+            async with self._semaphore:
+                started = True
+                self.stats.queued -= 1
+                self.stats.running += 1
+                try:
+                    await job()
+                    completed = True
+                    self.stats.completed += 1
+                except Exception as e:
+                    self.stats.failed += 1
+                    logger.error(f"Grading: ошибка проверки {key}: {e}")
+                finally:
+                    self.stats.running -= 1
+        finally:
+            if not started:
+                # Отменена в очереди, до получения слота
+                self.stats.queued -= 1
+            self._in_flight.discard(key)
+            if not completed and on_abort is not None:
+                try:
+                    await on_abort()
+                except Exception as e:
+                    logger.error(f"Grading: ошибка обработки незавершённой проверки {key}: {e}")
+
+    async def drain(self):
+        """Дождаться выполнения всех поставленных задач"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def stop(self, timeout: float = 30):
+        """Остановка: даём доделать начатое, остальное отменяем"""
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(list(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"Grading: отменено проверок при остановке: {len(pending)}")
+
+
+# Общая очередь проверки
+grading_pool = GradingPool(
+    concurrency=config.GRADING_CONCURRENCY,
+    max_queue=config.GRADING_MAX_QUEUE
+)
@@ -1,213 +1,271 @@
 """
 Контексты уроков для персонализированной проверки ДЗ
-Заполняются постепенно — для уроков без контекста используется базовая проверка
+
+Профиль Ильдара и контексты уроков лежат в файлах (GRADING_CONTEXTS_DIR,
+по умолчанию grading_contexts/ в корне проекта):
+
+    profile.md     — профиль Ильдара (используется для ВСЕХ уроков)
+    lessons.json   — {"version": "...", "lessons": {"1": {...}, ...}}
+
+Контексты заполняются постепенно — для уроков без детального контекста
+(has_detailed_context: false) используется базовая проверка.
+
+Файлы проверяются по схеме и подменяются целиком во время работы — по
+команде /reload_contexts или при изменении файлов (опрос mtime раз в
+GRADING_CONTEXTS_POLL_SECONDS), без перезапуска бота. Проверки, которые уже
+идут, дорабатывают со старым промптом. Невалидные файлы не применяются:
+остаются действующие контексты.
 """
 
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bot.config import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXTS_DIR = Path(__file__).resolve().parent.parent.parent / "grading_contexts"
+PROFILE_FILE = "profile.md"
+LESSONS_FILE = "lessons.json"
+
+# Схема контекста урока: ключ → тип
+LESSON_FIELDS = {
+    "title": str,
+    "has_detailed_context": bool,
+    "no_homework": bool,
+    "answer_token_budget": int,
+    "key_concepts": list,
+    "check_for": list,
+    "red_flags": list,
+    "grading_scale": dict,
+}
+DETAILED_LISTS = ("key_concepts", "check_for", "red_flags")
+SCALE_LEVELS = ("reject", "partial", "accept", "excellent")
+SCALE_FIELDS = ("criteria", "feedback_template")
+
+
+class ContextValidationError(ValueError):
+    """Файлы контекстов не прошли проверку (errors — все найденные ошибки)"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+
+@dataclass(frozen=True)
+class GradingContexts:
+    """Набор контекстов одной версии (не меняется — при перезагрузке создаётся новый)"""
+    version: str
+    profile: str
+    lessons: Dict[int, dict] = field(default_factory=dict)
+
+    def lesson(self, lesson_number: int) -> dict:
+        return self.lessons.get(lesson_number, {})
+
+
 # ============================================
-# Профиль Ильдара (используется для ВСЕХ уроков)
+# Проверка и загрузка
 # ============================================
 
-ILDAR_PROFILE = """
-Ты — Ильдар Валиуллов, бизнес-тренер и автор курса "Дыхание Тренера".
-
-ТВОЙ СТИЛЬ ОБЩЕНИЯ:
-- Тёплый, внимательный, вдумчиво-требовательный
-- Поддерживаешь человека, но не снимаешь с него ответственности за глубину
-- Можешь быть мягким — и в следующем предложении задать вопрос, от которого нельзя уйти
-- Ключ: «Я с тобой, но халтура здесь не пройдёт»
-
-ОБРАЩЕНИЕ:
-- На "ты", по имени
-- Иногда: «смотри», «давай честно», «обрати внимание»
-- Без панибратства, но и без дистанции
-
-ЭМОДЗИ:
-- Редко и осознанно: 👍 🤍 🙂
-- Только для усиления тепла, не для развлечения
-
-ХАРАКТЕРНЫЕ ФРАЗЫ:
-- «Смотри, здесь важно не что, а зачем.»
-- «Это звучит правильно, но пока не прожито.»
-- «Попробуй сказать это из опыта, а не из головы.»
-- «Здесь есть мысль, давай её докрутим.»
-- «Это описание. А где твоя позиция?»
-- «Хорошо. А если ещё на уровень глубже?»
-- «Я вижу, что ты стараешься — теперь давай точнее.»
-
-МЕТАФОРЫ:
-- Тренер как проводник, а не источник знаний
-- Обучение как путь, а не передача информации
-- Навык как дыхание: если его контролировать — он живёт
-- Группа как живой организм
-
-НИКОГДА НЕ ГОВОРИШЬ:
-- «Неправильно», «Ты не понял», «Это ерунда», «Очевидно же»
-- Не обесцениваешь опыт человека
-
-ПРИОРИТЕТЫ ПРИ ПРОВЕРКЕ (от важного к менее важному):
-1. Личная рефлексия и примеры из жизни
-2. Практическое применение
-3. Глубина понимания теории
-4. Оригинальность мышления
-5. Формальное следование заданию
-
-КАК ХВАЛИШЬ:
-- «Здесь очень живо. Чувствуется твой опыт.»
-- «Это точное попадание, особенно вот в этом моменте.»
-- «Хороший тренерский взгляд — ты видишь процесс, а не только результат.»
-- «Видно, что ты не списывал, а думал.»
-
-КАК КОРРЕКТИРУЕШЬ:
-- «Давай замедлимся и посмотрим ещё раз.»
-- «Попробуй ответить не теорией, а ситуацией.»
-- «Сейчас это больше пересказ. Где ты здесь?»
-- «Здесь есть зачаток, но он не раскрыт.»
-
-ЕСЛИ ОТПИСКА:
-«Я вижу, что ты ответил формально. Пожалуйста, вернись к заданию и попробуй ответить из своего опыта — тогда в этом будет смысл.»
-
-ФИЛОСОФИЯ:
-- Тренинг начинается не с методик, а с состояния тренера
-- Ты не спасаешь студентов и не тащишь за руку
-- Работаешь с теми, кто готов думать и чувствовать
-
-СТРУКТУРА ТВОЕГО ФИДБЭКА:
-поддержка → уточнение → углубляющий вопрос (если уместно)
-"""
+def _validate_lesson(key: str, lesson, errors: List[str]):
+    where = f"урок {key}"
+    if not isinstance(lesson, dict):
+        errors.append(f"{where}: ожидается объект")
+        return
+
+    for name, value in lesson.items():
+        expected = LESSON_FIELDS.get(name)
+        if expected is None:
+            errors.append(f"{where}: неизвестное поле {name!r}")
+        elif not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+            errors.append(f"{where}: поле {name!r} должно быть {expected.__name__}")
+
+    if not isinstance(lesson.get("title"), str) or not lesson.get("title", "").strip():
+        errors.append(f"{where}: нет title")
+    budget = lesson.get("answer_token_budget")
+    if isinstance(budget, int) and budget <= 0:
+        errors.append(f"{where}: answer_token_budget должен быть > 0")
+
+    if not lesson.get("has_detailed_context"):
+        return
+
+    # Детальный контекст — всё, что подставляется в DETAILED_LESSON_TEMPLATE
+    for name in DETAILED_LISTS:
+        items = lesson.get(name)
+        if not isinstance(items, list) or not items or not all(isinstance(i, str) and i.strip() for i in items):
+            errors.append(f"{where}: {name} — непустой список строк")
+    scale = lesson.get("grading_scale")
+    if not isinstance(scale, dict):
+        errors.append(f"{where}: нет grading_scale")
+        return
+    for level in SCALE_LEVELS:
+        entry = scale.get(level)
+        if not isinstance(entry, dict) or not all(isinstance(entry.get(f), str) for f in SCALE_FIELDS):
+            errors.append(f"{where}: grading_scale.{level} — нужны {', '.join(SCALE_FIELDS)}")
+
+
+def parse_contexts(profile: str, lessons_data) -> GradingContexts:
+    """Проверить содержимое файлов и собрать GradingContexts (ContextValidationError при ошибках)"""
+    errors = []
+    if not profile.strip():
+        errors.append(f"{PROFILE_FILE}: пустой профиль")
+
+    if not isinstance(lessons_data, dict):
+        raise ContextValidationError(errors + [f"{LESSONS_FILE}: ожидается объект"])
+    version = lessons_data.get("version")
+    if not isinstance(version, (str, int)) or isinstance(version, bool) or not str(version).strip():
+        errors.append(f"{LESSONS_FILE}: нет version")
+    lessons_raw = lessons_data.get("lessons")
+    if not isinstance(lessons_raw, dict) or not lessons_raw:
+        errors.append(f"{LESSONS_FILE}: нет lessons")
+        lessons_raw = {}
+
+    lessons = {}
+    for key, lesson in lessons_raw.items():
+        if not key.isdigit() or int(key) < 1:
+            errors.append(f"{LESSONS_FILE}: ключ урока {key!r} — номер урока")
+            continue
+        _validate_lesson(key, lesson, errors)
+        lessons[int(key)] = lesson
+
+    if errors:
+        raise ContextValidationError(errors)
+
+    # Формат как у прежнего литерала (перевод строки в начале и в конце) —
+    # промпты и их отпечатки не меняются от переноса в файл
+    return GradingContexts(version=str(version), profile=f"\n{profile.strip()}\n", lessons=lessons)
+
+
+def load_contexts(directory: Path) -> GradingContexts:
+    """Прочитать и проверить файлы контекстов"""
+    try:
+        profile = (directory / PROFILE_FILE).read_text(encoding="utf-8")
+        lessons_data = json.loads((directory / LESSONS_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise ContextValidationError([f"{directory}: {e}"]) from e
+    return parse_contexts(profile, lessons_data)
 
 
 # ============================================
-# Контексты уроков (заполняются постепенно)
+# Хранилище с перезагрузкой
 # ============================================
 
-LESSON_CONTEXTS = {
-    1: {
-        "title": "Что есть тренинг?",
-        "has_detailed_context": True,
-        
-        "key_concepts": [
-            "Тренинг — это краткосрочная форма обучения (в отличие от школы/вуза/MBA)",
-            "Фокус тренинга направлен в будущее — на то, что человек будет делать ПОСЛЕ",
-            "Тренинг — это изменение поведения через навыки (наращивание нового или апдейт существующего)",
-            "Результат измеряется не знаниями, а применением"
-        ],
-        
-        "check_for": [
-            "Будущее как фокус внимания — тренинг влияет на дальнейшие действия, меняет поведение",
-            "Осознание краткосрочности формата — за короткий срок нельзя 'дать всё', но можно задать вектор",
-            "Связь тренинга с навыками — не абстрактное 'развитие', а конкретное умение"
-        ],
-        
-        "red_flags": [
-            "Педагогическое понимание: 'тренинг — это урок', 'передача знаний', 'когда объясняют тему'",
-            "Нет упоминания краткосрочности и ограниченности формата",
-            "Фокус на дне тренинга, а не на результате — описывается процесс без связи с тем, что будет после"
-        ],
-        
-        "grading_scale": {
-            "reject": {
-                "criteria": "Определение тренинга как урока/занятия. Нет будущего, нет навыка, нет времени.",
-                "feedback_template": "Пока это больше педагогическое описание. Попробуй пересобрать ответ с фокусом на краткосрочный формат и изменения, которые происходят после тренинга."
-            },
-            "partial": {
-                "criteria": "Есть 1-2 концепции, но нет целостного взгляда.",
-                "feedback_template": "Я вижу направление мысли, но пока не хватает целостности. Попробуй добавить, как ты понимаешь роль времени и будущего результата в тренинге."
-            },
-            "accept": {
-                "criteria": "Присутствуют все три ключевые идеи. Ответ может быть простым, но осмысленным.",
-                "feedback_template": "Это попадает в контекст урока. Видно, что ты смотришь на тренинг как на инструмент изменений, а не просто формат обучения."
-            },
-            "excellent": {
-                "criteria": "Есть личная позиция, связь с реальным опытом, чувствуется понимание ответственности тренера.",
-                "feedback_template": "Здесь уже чувствуется тренерская позиция. Ты смотришь на тренинг через результат и будущее человека — это очень точное понимание."
-            }
-        }
-    },
-    
-    # ============================================
-    # Уроки 2-18: будут добавляться по мере заполнения
-    # Пока используют базовую проверку через профиль Ильдара
-    # ============================================
-    
-    2: {
-        "title": "Способы передачи знаний",
-        "has_detailed_context": False,
-    },
-    3: {
-        "title": "Особенности обучения взрослых",
-        "has_detailed_context": False,
-    },
-    4: {
-        "title": "Цикл Колба на практике",
-        "has_detailed_context": False,
-    },
-    5: {
-        "title": "Методы работы с группой",
-        "has_detailed_context": False,
-    },
-    6: {
-        "title": "Сезонность: Весна",
-        "has_detailed_context": False,
-    },
-    7: {
-        "title": "Сезонность: Лето",
-        "has_detailed_context": False,
-    },
-    8: {
-        "title": "Сезонность: Осень",
-        "has_detailed_context": False,
-        "no_homework": True,
-    },
-    9: {
-        "title": "Сезонность: Зима",
-        "has_detailed_context": False,
-    },
-    10: {
-        "title": "Групповая динамика",
-        "has_detailed_context": False,
-    },
-    11: {
-        "title": "Цикл Колба: формирование навыка",
-        "has_detailed_context": False,
-    },
-    12: {
-        "title": "Петлеобразное развитие",
-        "has_detailed_context": False,
-    },
-    13: {
-        "title": "Пирамида обучения",
-        "has_detailed_context": False,
-    },
-    14: {
-        "title": "Матрица осознанности",
-        "has_detailed_context": False,
-    },
-    15: {
-        "title": "Зоны развития по Выготскому",
-        "has_detailed_context": False,
-    },
-    16: {
-        "title": "Цветовой профиль тренера",
-        "has_detailed_context": False,
-    },
-    17: {
-        "title": "Уникальный стиль через ценности",
-        "has_detailed_context": False,
-    },
-    18: {
-        "title": "Бонус: Синдром самозванца",
-        "has_detailed_context": False,
-        "no_homework": True,
-    },
-}
+class ContextStore:
+    """Действующие контексты + перезагрузка по команде или при изменении файлов"""
+
+    def __init__(self, directory: Path, poll_interval: float = 10):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.loaded_at = 0.0
+        self._current: Optional[GradingContexts] = None
+        self._mtimes: Tuple = ()
+        self._listeners: List[Callable[[GradingContexts, GradingContexts], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def current(self) -> GradingContexts:
+        """Действующие контексты (при первом обращении — загрузка с диска)"""
+        if self._current is None:
+            self._current = load_contexts(self.directory)
+            self._mtimes = self._file_mtimes()
+            self.loaded_at = time.time()
+        return self._current
+
+    def subscribe(self, listener: Callable[[GradingContexts, GradingContexts], None]):
+        """listener(старые, новые) вызывается после каждой подмены контекстов"""
+        self._listeners.append(listener)
+
+    def _file_mtimes(self) -> Tuple:
+        mtimes = []
+        for name in (PROFILE_FILE, LESSONS_FILE):
+            try:
+                mtimes.append((self.directory / name).stat().st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def reload(self) -> Tuple[GradingContexts, List[int]]:
+        """
+        Перечитать файлы и подменить контексты одним присваиванием.
+        Возвращает (новые контексты, номера уроков с изменённым контекстом;
+        при изменении профиля — все уроки). При ошибке проверки
+        (ContextValidationError) действующие контексты остаются.
+        """
+        mtimes = self._file_mtimes()
+        new = load_contexts(self.directory)
+        old = self.current
+        self._mtimes = mtimes
+
+        if new == old:
+            return old, []
+
+        numbers = set(old.lessons) | set(new.lessons)
+        if new.profile != old.profile:
+            changed = sorted(numbers)
+        else:
+            changed = sorted(n for n in numbers if old.lesson(n) != new.lesson(n))
+
+        self._current = new
+        self.loaded_at = time.time()
+        logger.info(f"Контексты уроков: версия {old.version} → {new.version}, изменены уроки: {changed}")
+        for listener in self._listeners:
+            try:
+                listener(old, new)
+            except Exception as e:
+                logger.error(f"Контексты уроков: ошибка обработчика перезагрузки: {e}")
+        return new, changed
+
+    async def _watch(self):
+        """Опрос mtime файлов; изменились — перезагрузка"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if self._file_mtimes() == self._mtimes:
+                continue
+            try:
+                self.reload()
+            except ContextValidationError as e:
+                # Повторно не пробуем, пока файлы снова не изменятся
+                self._mtimes = self._file_mtimes()
+                logger.error(f"Контексты уроков: файлы изменены, но не прошли проверку: {e}")
+
+    def start(self):
+        """Загрузить контексты и следить за файлами (poll_interval <= 0 — только по команде)"""
+        self.current
+        if self._task is None and self.poll_interval > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Синглтон хранилища
+context_store = ContextStore(
+    Path(config.GRADING_CONTEXTS_DIR) if config.GRADING_CONTEXTS_DIR else DEFAULT_CONTEXTS_DIR,
+    poll_interval=config.GRADING_CONTEXTS_POLL_SECONDS
+)
+
+
+def get_profile() -> str:
+    """Профиль Ильдара (действующая версия)"""
+    return context_store.current.profile
 
 
 def get_lesson_context(lesson_number: int) -> dict:
     """Получить контекст урока"""
-    return LESSON_CONTEXTS.get(lesson_number, {})
+    return context_store.current.lesson(lesson_number)
 
 
 def has_detailed_context(lesson_number: int) -> bool:
     """Проверить, есть ли детальный контекст для урока"""
-    context = LESSON_CONTEXTS.get(lesson_number, {})
-    return context.get("has_detailed_context", False)
\ No newline at end of file
+    return get_lesson_context(lesson_number).get("has_detailed_context", False)
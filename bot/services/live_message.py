@@ -0,0 +1,75 @@
+"""
+Постепенно дописываемое сообщение (потоковый ответ модели)
+
+Текст отзыва приходит от модели кусками; студент видит его сразу, а не
+после полного ответа. Telegram ограничивает частоту правок одного
+сообщения (~1 в секунду на чат), поэтому правки прореживаются: промежуточные
+тексты, пришедшие раньше STREAM_EDIT_INTERVAL, пропускаются — следующая
+правка всё равно покажет более полный текст. Итоговая правка — всегда.
+"""
+
+import logging
+import time
+from typing import Optional
+
+from telegram import InlineKeyboardMarkup, Message
+from telegram.error import BadRequest, RetryAfter
+
+from bot.config import config
+from bot.services.sender import _retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+# Признак «текст ещё пишется»
+TYPING_SUFFIX = " …"
+
+
+class LiveMessage:
+    """Обёртка над сообщением-заглушкой с ограничением частоты правок"""
+
+    def __init__(self, message: Message, min_interval: Optional[float] = None):
+        self.message = message
+        self.min_interval = config.STREAM_EDIT_INTERVAL if min_interval is None else min_interval
+        self.shown = False   # хотя бы одна промежуточная правка прошла
+        self.edits = 0
+        self._next_edit_at = 0.0
+        self._last_text = ""
+        self._broken = False  # правки не проходят — больше не пытаемся до finish()
+
+    async def update(self, text: str):
+        """Показать промежуточный текст (если позволяет лимит частоты)"""
+        if self._broken or not text or text == self._last_text:
+            return
+        now = time.monotonic()
+        if now < self._next_edit_at:
+            return
+
+        self._next_edit_at = now + self.min_interval
+        if await self._edit(text + TYPING_SUFFIX):
+            self._last_text = text
+            self.shown = True
+
+    async def finish(self, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+        """Итоговый текст (без прореживания). False — правка не удалась."""
+        return await self._edit(text, reply_markup)
+
+    async def _edit(self, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+        try:
+            await self.message.edit_text(text, reply_markup=reply_markup)
+        except RetryAfter as e:
+            # Flood control: пропускаем правки до конца паузы
+            self._next_edit_at = time.monotonic() + _retry_after_seconds(e)
+            return False
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return True
+            logger.warning(f"LiveMessage: правка не удалась: {e}")
+            self._broken = True
+            return False
+        except Exception as e:
+            logger.warning(f"LiveMessage: правка не удалась: {e}")
+            self._broken = True
+            return False
+
+        self.edits += 1
+        return True
@@ -3,133 +3,34 @@
 Версия 2.0: с контекстами уроков и профилем Ильдара
 """
 
+import asyncio
 import json
+import logging
 import random
-from openai import AsyncOpenAI
+import re
+import time
+from typing import Awaitable, Callable, Optional, Tuple
+
+from openai import APITimeoutError, AsyncOpenAI
 
 from bot.config import config
-from bot.services.lesson_contexts import (
-    ILDAR_PROFILE,
-    LESSON_CONTEXTS,
-    get_lesson_context,
-    has_detailed_context
+from bot.services.answer_budget import answer_budget, prepare_answer
+from bot.services.circuit_breaker import BreakerState, openai_breaker
+from bot.services.pregrade import pregrade
+from bot.services.prompts import prompt_registry
+from bot.services.retry import hedged, llm_latency, llm_retry_policy
+from bot.services.telemetry import (
+    llm_telemetry, usage_tokens, LLMCall,
+    OUTCOME_OK, OUTCOME_ERROR, OUTCOME_TIMEOUT, OUTCOME_BAD_RESPONSE, OUTCOME_CIRCUIT_OPEN
 )
+from bot.services.verdict_cache import verdict_cache
 
+logger = logging.getLogger(__name__)
 
-# Клиент OpenAI
-client = AsyncOpenAI(api_key=config.OPENAI_API_KEY)
-
-
-# ============================================
-# Системные промпты
-# ============================================
-
-# Промпт для уроков С детальным контекстом
-DETAILED_SYSTEM_PROMPT = """
-{ildar_profile}
-
----
-
-КОНТЕКСТ УРОКА {lesson_number}: {lesson_title}
-
-ЗАДАНИЕ:
-{homework_task}
-
-КЛЮЧЕВЫЕ КОНЦЕПЦИИ, которые студент должен понять:
-{key_concepts}
-
-НА ЧТО ОБРАЩАТЬ ВНИМАНИЕ (признаки хорошего ответа):
-{check_for}
 
-КРАСНЫЕ ФЛАГИ (типичные ошибки):
-{red_flags}
-
----
-
-ШКАЛА ОЦЕНКИ:
-
-❌ НЕ ПРИНЯТО (verdict: REVISE):
-{reject_criteria}
-
-⚠️ ЧАСТИЧНО (verdict: REVISE, но мягче):
-{partial_criteria}
-
-✅ ПРИНЯТО (verdict: ACCEPT):
-{accept_criteria}
-
-⭐ ОТЛИЧНО (verdict: ACCEPT с особой похвалой):
-{excellent_criteria}
-
----
-
-АЛГОРИТМ:
-
-1. ПРОВЕРКА НА АДЕКВАТНОСТЬ:
-   - Спам, набор букв, отписка («ок», «сделал», «.») → REVISE
-   - Слишком короткий ответ (< 50 символов осмысленного текста) → REVISE
-
-2. ПРОВЕРКА ПО ШКАЛЕ:
-   - Определи, к какому уровню относится ответ
-   - Используй соответствующий шаблон фидбэка как основу
-   - Персонализируй: упомяни конкретную деталь из ответа студента
-
-3. ГЕНЕРАЦИЯ ОТВЕТА:
-   - Говори от первого лица как Ильдар
-   - Структура: поддержка → уточнение → вопрос (если уместно)
-   - 2-4 предложения
-   - Не используй слова из списка "НИКОГДА НЕ ГОВОРИШЬ"
-
-ФОРМАТ ВЫВОДА (строго JSON):
-{{
-  "verdict": "ACCEPT" или "REVISE",
-  "level": "reject" / "partial" / "accept" / "excellent",
-  "message": "Твой персонализированный фидбэк"
-}}
-"""
-
-
-# Промпт для уроков БЕЗ детального контекста (базовая проверка)
-BASIC_SYSTEM_PROMPT = """
-{ildar_profile}
-
----
-
-КОНТЕКСТ УРОКА {lesson_number}: {lesson_title}
-
-ЗАДАНИЕ:
-{homework_task}
-
----
-
-У тебя пока нет детального контекста для этого урока.
-Проверяй ответ по ОБЩИМ критериям:
-
-1. ПРОВЕРКА НА АДЕКВАТНОСТЬ:
-   - Спам, набор букв, отписка → REVISE
-   - Слишком короткий ответ (< 50 символов) → REVISE
-   - Ответ не по теме задания → REVISE
-
-2. ПРОВЕРКА НА ГЛУБИНУ:
-   - Есть ли личная рефлексия или примеры из опыта?
-   - Есть ли попытка осмыслить, а не просто пересказать?
-   - Чувствуется ли позиция автора?
-
-3. ПРИНЯТИЕ РЕШЕНИЯ:
-   - Если есть хоть какая-то осмысленная мысль по теме → ACCEPT
-   - Если формальная отписка без глубины → REVISE (мягко попроси доработать)
-
-ГЕНЕРАЦИЯ ОТВЕТА:
-- Говори от первого лица как Ильдар
-- Похвали за конкретную деталь из ответа
-- Если REVISE — мягко направь, не критикуй
-- 2-3 предложения
-
-ФОРМАТ ВЫВОДА (строго JSON):
-{{
-  "verdict": "ACCEPT" или "REVISE",
-  "message": "Твой персонализированный фидбэк"
-}}
-"""
+# Клиент OpenAI (OPENAI_BASE_URL — другой адрес API, например локальный фейк).
+# Встроенные повторы клиента выключены — повторами управляет llm_retry_policy
+client = AsyncOpenAI(api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL or None, max_retries=0)
 
 
 # ============================================
@@ -155,6 +56,130 @@ FILE_VIDEO_RESPONSES = [
 ]
 
 
+def fallback_verdict(user_answer: str) -> dict:
+    """Вердикт без модели (по длине ответа), помечен fallback=True"""
+    if len(user_answer) >= config.MIN_ANSWER_LENGTH:
+        return {
+            "verdict": "ACCEPT",
+            "message": random.choice(FALLBACK_ACCEPT),
+            "fallback": True
+        }
+    return {
+        "verdict": "REVISE",
+        "message": random.choice(FALLBACK_REVISE),
+        "fallback": True
+    }
+
+
+# ============================================
+# Потоковый ответ
+# ============================================
+
+# Тело JSON-строки до закрывающей кавычки (или до конца буфера)
+_JSON_STRING_BODY = re.compile(r'(?:[^"\\]|\\.)*', re.DOTALL)
+
+
+def partial_json_field(buffer: str, key: str) -> Optional[str]:
+    """
+    Значение строкового поля из недописанного JSON.
+    Обрезанная в конце escape-последовательность отбрасывается.
+    """
+    match = re.search(rf'"{key}"\s*:\s*"', buffer)
+    if not match:
+        return None
+    body = _JSON_STRING_BODY.match(buffer, match.end()).group()
+    # Хвост вида \u04 ещё не дописан — укорачиваем, пока не декодируется
+    for cut in range(min(len(body), 12) + 1):
+        try:
+            return json.loads(f'"{body[:len(body) - cut]}"', strict=False)
+        except ValueError:
+            continue
+    return None
+
+
+async def _stream_completion(
+    request: dict,
+    on_progress: Callable[[str], Awaitable]
+) -> Tuple[str, object]:
+    """
+    Запрос с stream=True; по мере прихода текста отзыва вызывает on_progress.
+    Возвращает (полный текст, usage из последнего чанка).
+    """
+    stream = await client.chat.completions.create(
+        **request, stream=True, stream_options={"include_usage": True}
+    )
+    parts = []
+    usage = None
+    async for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        parts.append(delta)
+        message = partial_json_field("".join(parts), "message")
+        if message:
+            await on_progress(message)
+    return "".join(parts), usage
+
+
+async def _request_once(
+    request: dict,
+    on_progress: Optional[Callable[[str], Awaitable]],
+    timeout: float
+) -> Tuple[str, object, bool]:
+    """
+    Одна попытка запроса в пределах timeout.
+    Возвращает (текст ответа, usage, ответил ли страхующий запрос).
+    """
+    if on_progress is not None:
+        # timeout клиента — на чтение куска, общий лимит — timeout попытки
+        content, usage = await asyncio.wait_for(
+            _stream_completion({**request, "timeout": timeout}, on_progress), timeout=timeout
+        )
+        return content, usage, False
+
+    async def create():
+        return await client.chat.completions.create(**request, timeout=timeout)
+
+    hedge_after = None
+    if config.LLM_HEDGE_ENABLED:
+        p95 = llm_latency.p95()
+        if p95 is not None:
+            hedge_after = max(p95, config.LLM_HEDGE_MIN_SECONDS)
+
+    response, hedge_won = await asyncio.wait_for(
+        hedged(create, hedge_after, llm_retry_policy.stats), timeout=timeout
+    )
+    return response.choices[0].message.content, getattr(response, "usage", None), hedge_won
+
+
+# ============================================
+# Запрос и разбор ответа
+# ============================================
+
+def build_request(prompt, user_answer: str) -> dict:
+    """Параметры chat.completions для проверки ответа (без timeout/stream)"""
+    return dict(
+        model=config.LLM_MODEL,
+        messages=prompt.messages(user_answer),
+        temperature=0.7,
+        max_tokens=400,
+        response_format={"type": "json_object"}
+    )
+
+
+def parse_model_output(content: str) -> dict:
+    """JSON ответа модели → {"verdict", "message"} (ValueError, если не JSON)"""
+    result = json.loads(content)
+    return {
+        "verdict": result.get("verdict", "ACCEPT"),
+        "message": result.get("message", random.choice(FALLBACK_ACCEPT))
+    }
+
+
 # ============================================
 # Основная функция проверки
 # ============================================
@@ -163,76 +188,144 @@ async def check_homework_with_ai(
     lesson_number: int,
     lesson_topic: str,
     homework_task: str,
-    user_answer: str
+    user_answer: str,
+    use_cache: bool = True,
+    on_progress: Optional[Callable[[str], Awaitable]] = None
 ) -> dict:
     """
     Проверка текстового ДЗ через OpenAI.
-    Использует детальный контекст если есть, иначе базовую проверку.
+    Использует детальный контекст если есть, иначе базовую проверку
+    (промпты рендерятся заранее — см. bot/services/prompts.py).
+    Очевидный мусор отсекается локально, без запроса к модели (см. pregrade);
+    длинный ответ сокращается до бюджета токенов урока (см. answer_budget).
+    Повторные ответы берутся из кэша вердиктов; use_cache=False — спросить
+    модель заново (результат обновит кэш).
+    Временные ошибки API повторяются с паузой в пределах дедлайна (см. retry);
+    пока OpenAI недоступен (breaker разомкнут), fallback отдаётся сразу.
+    on_progress — получать текст отзыва по мере генерации (при LLM_STREAMING);
+    итоговый вердикт всё равно разбирается из полного ответа.
     
     Returns:
-        {"verdict": "ACCEPT" | "REVISE", "message": "..."}
+        {"verdict": "ACCEPT" | "REVISE", "message": "...", "fallback": bool}
+        fallback=True — вердикт выставлен без модели, сдачу стоит перепроверить
     """
     
-    context = get_lesson_context(lesson_number)
-    use_detailed = has_detailed_context(lesson_number)
+    # Локальная предпроверка — решение логируем всегда (для подбора порогов)
+    decision = pregrade(user_answer, homework_task)
+    logger.info(
+        f"Pregrade: урок {lesson_number}, {'REVISE' if decision.reject else 'пропущен к LLM'}, "
+        f"причина: {decision.reason}, {decision.metrics}"
+    )
+    if decision.reject:
+        return {
+            "verdict": "REVISE",
+            "message": random.choice(FALLBACK_REVISE),
+            "fallback": False
+        }
+
+    # Готовый промпт из реестра (детальный, если есть контекст урока)
+    prompt = prompt_registry.get(lesson_number, lesson_topic, homework_task)
+
+    # В модель (и в ключ кэша) идёт подготовленный ответ
+    prepared = prepare_answer(user_answer, answer_budget(lesson_number))
+    if prepared.trimmed:
+        logger.info(
+            f"LLM: урок {lesson_number}, ответ сокращён до бюджета: "
+            f"{prepared.original_tokens} → {prepared.tokens} токенов"
+        )
+
+    if config.LLM_CACHE_ENABLED:
+        cached = await verdict_cache.get(prompt.fingerprint, prepared.text, bypass=not use_cache)
+        if cached:
+            logger.debug(f"LLM: урок {lesson_number}, вердикт из кэша")
+            return {**cached, "fallback": False}
+
+    if not openai_breaker.allow():
+        logger.info(f"LLM: урок {lesson_number}, OpenAI недоступен — fallback без запроса")
+        llm_telemetry.record(LLMCall(
+            model=config.LLM_MODEL,
+            lesson_number=lesson_number,
+            outcome=OUTCOME_CIRCUIT_OPEN,
+            prompt_fingerprint=prompt.fingerprint,
+            fallback_reason="circuit open",
+            answer_tokens=prepared.original_tokens,
+            answer_tokens_sent=prepared.tokens
+        ))
+        return fallback_verdict(user_answer)
     
-    try:
-        if use_detailed:
-            # Формируем детальный промпт
-            system_prompt = DETAILED_SYSTEM_PROMPT.format(
-                ildar_profile=ILDAR_PROFILE,
-                lesson_number=lesson_number,
-                lesson_title=context.get("title", lesson_topic),
-                homework_task=homework_task,
-                key_concepts="\n".join(f"• {c}" for c in context.get("key_concepts", [])),
-                check_for="\n".join(f"• {c}" for c in context.get("check_for", [])),
-                red_flags="\n".join(f"• {c}" for c in context.get("red_flags", [])),
-                reject_criteria=context.get("grading_scale", {}).get("reject", {}).get("criteria", ""),
-                partial_criteria=context.get("grading_scale", {}).get("partial", {}).get("criteria", ""),
-                accept_criteria=context.get("grading_scale", {}).get("accept", {}).get("criteria", ""),
-                excellent_criteria=context.get("grading_scale", {}).get("excellent", {}).get("criteria", ""),
-            )
-        else:
-            # Базовый промпт
-            system_prompt = BASIC_SYSTEM_PROMPT.format(
-                ildar_profile=ILDAR_PROFILE,
-                lesson_number=lesson_number,
-                lesson_title=context.get("title", lesson_topic),
-                homework_task=homework_task,
+    request = build_request(prompt, prepared.text)
+    streamed = on_progress is not None and config.LLM_STREAMING
+    deadline = time.monotonic() + llm_retry_policy.deadline
+    attempt = 0
+
+    # Временные ошибки повторяются в пределах дедлайна; каждая попытка — своя запись телеметрии
+    while True:
+        attempt += 1
+        llm_retry_policy.stats.attempts += 1
+        call = LLMCall(
+            model=config.LLM_MODEL,
+            lesson_number=lesson_number,
+            outcome=OUTCOME_OK,
+            prompt_fingerprint=prompt.fingerprint,
+            streamed=streamed,
+            answer_tokens=prepared.original_tokens,
+            answer_tokens_sent=prepared.tokens,
+            attempt=attempt
+        )
+        started = time.monotonic()
+        timeout = min(llm_retry_policy.attempt_timeout, deadline - started)
+
+        try:
+            content, usage, call.hedged = await _request_once(request, on_progress if streamed else None, timeout)
+            break
+        except Exception as e:
+            # Ошибка или таймаут API — считаем в breaker
+            openai_breaker.record_failure()
+            call.latency_ms = int((time.monotonic() - started) * 1000)
+            call.outcome = OUTCOME_TIMEOUT if isinstance(e, (asyncio.TimeoutError, APITimeoutError)) else OUTCOME_ERROR
+            call.fallback_reason = f"{type(e).__name__}: {e}"
+            llm_telemetry.record(call)
+
+            delay = llm_retry_policy.next_delay(attempt, e, deadline - time.monotonic())
+            # Breaker разомкнулся — повторять бессмысленно
+            if delay is None or openai_breaker.state != BreakerState.CLOSED:
+                logger.warning(f"LLM: урок {lesson_number}, ошибка OpenAI (попытка {attempt}): {e}")
+                return fallback_verdict(user_answer)
+
+            logger.info(
+                f"LLM: урок {lesson_number}, ошибка OpenAI (попытка {attempt}): {e}, "
+                f"повтор через {delay:.1f} с"
             )
-        
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Ответ студента:\n\n{user_answer}"}
-            ],
-            temperature=0.7,
-            max_tokens=400,
-            timeout=config.LLM_TIMEOUT,
-            response_format={"type": "json_object"}
+            llm_retry_policy.stats.retries += 1
+            await asyncio.sleep(delay)
+
+    openai_breaker.record_success()
+    call.latency_ms = int((time.monotonic() - started) * 1000)
+    if not streamed:
+        llm_latency.record(call.latency_ms / 1000)
+    call.prompt_tokens, call.completion_tokens, call.cached_tokens = usage_tokens(usage)
+
+    try:
+        verdict = parse_model_output(content)
+        logger.debug(
+            f"LLM: урок {lesson_number}, промпт {prompt.fingerprint}, вердикт {verdict['verdict']}, "
+            f"токены {call.prompt_tokens} (из кэша {call.cached_tokens}) + {call.completion_tokens}"
         )
-        
-        result = json.loads(response.choices[0].message.content)
-        
-        # Нормализуем ответ
-        return {
-            "verdict": result.get("verdict", "ACCEPT"),
-            "message": result.get("message", random.choice(FALLBACK_ACCEPT))
-        }
+
+        # Кэшируем только ответы модели (не fallback)
+        if config.LLM_CACHE_ENABLED:
+            await verdict_cache.put(prompt.fingerprint, prepared.text, verdict["verdict"], verdict["message"])
+
+        llm_telemetry.record(call)
+        return {**verdict, "fallback": False}
         
     except Exception as e:
-        # Fallback при ошибке
-        if len(user_answer) >= config.MIN_ANSWER_LENGTH:
-            return {
-                "verdict": "ACCEPT",
-                "message": random.choice(FALLBACK_ACCEPT)
-            }
-        else:
-            return {
-                "verdict": "REVISE",
-                "message": random.choice(FALLBACK_REVISE)
-            }
+        # Сервис ответил, но ответ не разобрать — fallback без размыкания breaker-а
+        logger.warning(f"LLM: урок {lesson_number}, некорректный ответ модели: {e}")
+        call.outcome = OUTCOME_BAD_RESPONSE
+        call.fallback_reason = f"{type(e).__name__}: {e}"
+        llm_telemetry.record(call)
+        return fallback_verdict(user_answer)
 
 
 def get_file_video_response() -> dict:
@@ -0,0 +1,119 @@
+"""
+Фоновая отправка сообщений из outbox
+
+Задачи планировщика только ставят сообщения в таблицу outbox. Обработчик
+забирает пачки (FOR UPDATE SKIP LOCKED), отправляет через общий отправитель
+и отмечает результат: DELIVERED или повтор с паузой / FAILED.
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+from bot.config import config
+from bot.database import queries as db
+from bot.services.sender import sender
+
+logger = logging.getLogger(__name__)
+
+# Типы сообщений
+KIND_LESSON_UNLOCK = "lesson_unlock"
+KIND_REMINDER_SOFT = "reminder_soft"
+KIND_REMINDER_STRONG = "reminder_strong"
+KIND_DUPLICATE_ALERT = "duplicate_alert"
+KIND_GRADING_ABORTED = "grading_aborted"
+
+# Доставленное напоминание записывается в reminders (антиспам)
+REMINDER_KINDS = {
+    KIND_REMINDER_SOFT: "soft",
+    KIND_REMINDER_STRONG: "strong",
+}
+
+# Фоновый обработчик
+_bot = None
+_task: Optional[asyncio.Task] = None
+_wakeup: Optional[asyncio.Event] = None
+
+
+async def drain_once(bot, batch_size: int = None) -> int:
+    """Обработать одну пачку. Возвращает количество забранных сообщений."""
+    batch = await db.claim_outbox_batch(batch_size or config.OUTBOX_BATCH_SIZE)
+    if not batch:
+        return 0
+
+    report = await sender.send_many(bot, [(msg.chat_id, msg.text) for msg in batch])
+
+    delivered = []
+    failures = []
+    reminders = {}
+    for msg, result in zip(batch, report.results):
+        if result.ok:
+            delivered.append(msg.id)
+            if msg.kind in REMINDER_KINDS:
+                reminders.setdefault(REMINDER_KINDS[msg.kind], []).append(msg.chat_id)
+        else:
+            failures.append((msg.id, result.error or "unknown error"))
+            logger.warning(f"Outbox: не доставлено {msg.kind} → {msg.chat_id}: {result.error}")
+
+    await db.mark_outbox_delivered(delivered)
+    await db.mark_outbox_failed(failures, config.OUTBOX_MAX_ATTEMPTS, config.OUTBOX_RETRY_SECONDS)
+    for reminder_type, user_ids in reminders.items():
+        await db.log_reminders(user_ids, reminder_type)
+
+    return len(batch)
+
+
+async def drain_outbox(bot, batch_size: int = None) -> int:
+    """Отправить всё, что готово к отправке. Возвращает количество обработанных."""
+    total = 0
+    while True:
+        claimed = await drain_once(bot, batch_size)
+        if not claimed:
+            return total
+        total += claimed
+
+
+def wake_outbox():
+    """Разбудить обработчик (после постановки сообщений в очередь)"""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def _run():
+    """Цикл обработчика: отправка → ожидание сигнала или интервала опроса"""
+    while True:
+        try:
+            processed = await drain_outbox(_bot)
+            if processed:
+                logger.info(f"Outbox: обработано сообщений: {processed}")
+        except Exception as e:
+            logger.error(f"Outbox error: {e}")
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=config.OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+
+def start_outbox_worker(bot):
+    """Запустить фоновый обработчик outbox"""
+    global _bot, _task, _wakeup
+    _bot = bot
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_run())
+    logger.info("Outbox: обработчик запущен")
+
+
+async def stop_outbox_worker():
+    """Остановить фоновый обработчик outbox"""
+    global _task, _wakeup
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = None
+    _wakeup = None
+    logger.info("Outbox: обработчик остановлен")
@@ -0,0 +1,126 @@
+"""
+Локальная предпроверка ответа на ДЗ (до вызова LLM)
+
+Очевидный мусор — отписки («ок», «сделал»), набор букв, повторы, слишком
+короткие ответы — модель всё равно отправит на доработку, но за полный
+запрос к API. Здесь такие ответы отсекаются детерминированными правилами.
+Решение и метрики логируются — по логам подбираем пороги на реальных ответах.
+Сомнительные случаи пропускаем к модели: ложный REVISE хуже лишнего запроса.
+Мало русских слов (ответ на другом языке) и нет общих корней с заданием
+(синонимы) — такие признаки только помечаются (reason), решает модель.
+"""
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from bot.services.verdict_cache import normalize_answer
+
+# ============================================
+# Пороги
+# ============================================
+
+# Осмысленных символов (букв и цифр) — как в промпте: «< 50 символов → REVISE»
+MIN_MEANINGFUL_CHARS = 50
+
+# Минимум слов на кириллице (2+ буквы) — меньше: пометка few_words, решает модель
+MIN_CYRILLIC_WORDS = 5
+
+# Энтропия букв (бит): русский текст ~4.3, «ааааа»/«ывывыв» — < 2.5
+MIN_LETTER_ENTROPY = 3.0
+
+# Доля уникальных слов (при 10+ словах): «да да да да ...» — ниже порога
+MIN_UNIQUE_WORD_RATIO = 0.3
+REPETITION_MIN_WORDS = 10
+
+# Доля слов 4+ букв без гласных: «ккккк», «фвфвфв», «hjkl»
+MAX_VOWELLESS_RATIO = 0.5
+
+# Короткий ответ без единого общего корня с заданием — пометка off_topic
+# (если задание достаточно длинное, чтобы пересечение что-то значило)
+OFF_TOPIC_MAX_WORDS = 15
+OFF_TOPIC_MIN_LESSON_STEMS = 5
+STEM_LENGTH = 5
+
+# Типичные отписки (после normalize_answer)
+BRUSH_OFFS = {
+    "ок", "ok", "окей", "ага", "да", "нет", "+", "++", "-",
+    "сделал", "сделала", "сделано", "готово", "готов", "выполнил", "выполнила",
+    "понятно", "понял", "поняла", "ясно", "спасибо", "норм", "хорошо",
+    "не знаю", "незнаю", "тест", "test", "asdf", "qwerty", "йцукен", "фыва",
+}
+
+_CYRILLIC_WORD = re.compile(r"[а-яё]{2,}")
+_WORD = re.compile(r"[^\W\d_]{2,}")
+_VOWELS = set("аеёиоуыэюяaeiouy")
+
+
+@dataclass
+class PregradeDecision:
+    """Результат предпроверки"""
+    reject: bool
+    # Отклонён: brush_off / too_short / low_entropy / repetitive / keyboard_mash;
+    # пропущен к модели: ok или пометка few_words / off_topic
+    reason: str
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+
+def _entropy(letters: str) -> float:
+    counts = Counter(letters)
+    total = len(letters)
+    return -sum(c / total * math.log2(c / total) for c in counts.values())
+
+
+def _stems(text: str) -> set:
+    return {word[:STEM_LENGTH] for word in _CYRILLIC_WORD.findall(text) if len(word) >= 4}
+
+
+def pregrade(answer: str, lesson_text: Optional[str] = None) -> PregradeDecision:
+    """
+    Проверить ответ локально.
+    reject=True — ответ заведомо на доработку, модель не вызываем.
+    """
+    normalized = normalize_answer(answer)
+
+    if normalized in BRUSH_OFFS:
+        return PregradeDecision(True, "brush_off", {"length": len(normalized)})
+
+    letters = [ch for ch in normalized if ch.isalpha()]
+    meaningful = sum(1 for ch in normalized if ch.isalnum())
+    words = _WORD.findall(normalized)
+    cyrillic_words = _CYRILLIC_WORD.findall(normalized)
+    long_words = [w for w in words if len(w) >= 4]
+
+    metrics: Dict[str, float] = {
+        "meaningful": meaningful,
+        "words": len(words),
+        "cyrillic_words": len(cyrillic_words),
+        "entropy": round(_entropy("".join(letters)), 2) if letters else 0.0,
+        "unique_ratio": round(len(set(words)) / len(words), 2) if words else 0.0,
+        "vowelless_ratio": round(
+            sum(1 for w in long_words if not _VOWELS & set(w)) / len(long_words), 2
+        ) if long_words else 0.0,
+    }
+
+    lesson_stems = _stems(normalize_answer(lesson_text)) if lesson_text else set()
+    if len(lesson_stems) >= OFF_TOPIC_MIN_LESSON_STEMS:
+        metrics["overlap"] = len(_stems(normalized) & lesson_stems)
+
+    if meaningful < MIN_MEANINGFUL_CHARS:
+        return PregradeDecision(True, "too_short", metrics)
+    if metrics["entropy"] < MIN_LETTER_ENTROPY:
+        return PregradeDecision(True, "low_entropy", metrics)
+    if len(words) >= REPETITION_MIN_WORDS and metrics["unique_ratio"] < MIN_UNIQUE_WORD_RATIO:
+        return PregradeDecision(True, "repetitive", metrics)
+    if metrics["vowelless_ratio"] > MAX_VOWELLESS_RATIO:
+        return PregradeDecision(True, "keyboard_mash", metrics)
+
+    # Сомнительно, но не мусор — решает модель (пометка — в логе)
+    if len(cyrillic_words) < MIN_CYRILLIC_WORDS:
+        return PregradeDecision(False, "few_words", metrics)
+    if metrics.get("overlap") == 0 and len(words) <= OFF_TOPIC_MAX_WORDS:
+        return PregradeDecision(False, "off_topic", metrics)
+
+    return PregradeDecision(False, "ok", metrics)
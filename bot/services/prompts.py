@@ -0,0 +1,264 @@
+"""
+Реестр системных промптов для проверки ДЗ
+
+Промпты всех уроков рендерятся один раз (при старте) и отдаются по номеру
+урока за O(1). Запрос к модели собирается так, чтобы длинная неизменная
+часть шла первой: системное сообщение с профилем Ильдара и инструкциями
+(одинаковое для всех уроков), затем урочный контекст со шкалой, затем ответ
+студента. Провайдер кэширует общий префикс запроса — cached_tokens в
+ответе (см. /llmstat). У каждого промпта есть отпечаток (fingerprint) — по
+нему видно, какой именно промпт ушёл в модель. Если название или задание
+урока в БД или контексты уроков (см. lesson_contexts) изменились, промпт
+перерисовывается при следующем обращении.
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from bot.services.lesson_contexts import GradingContexts, context_store
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# Шаблоны
+# ============================================
+
+# Инструкции проверки — одинаковые для всех уроков
+GRADING_INSTRUCTIONS = """\
+КАК ТЫ ПРОВЕРЯЕШЬ ДОМАШНИЕ ЗАДАНИЯ
+
+Дальше — контекст урока с заданием, затем ответ студента.
+
+АЛГОРИТМ:
+
+1. ПРОВЕРКА НА АДЕКВАТНОСТЬ:
+   - Спам, набор букв, отписка («ок», «сделал», «.») → REVISE
+   - Слишком короткий ответ (< 50 символов осмысленного текста) → REVISE
+   - Ответ не по теме задания → REVISE
+
+2. ПРОВЕРКА ПО ШКАЛЕ:
+   - Если в контексте урока есть ШКАЛА ОЦЕНКИ — определи, к какому уровню
+     относится ответ, и используй соответствующий шаблон фидбэка как основу
+   - Если шкалы нет — проверяй по ОБЩИМ критериям:
+     • Есть ли личная рефлексия или примеры из опыта?
+     • Есть ли попытка осмыслить, а не просто пересказать?
+     • Чувствуется ли позиция автора?
+     Есть хоть какая-то осмысленная мысль по теме → ACCEPT;
+     формальная отписка без глубины → REVISE (мягко попроси доработать)
+   - Персонализируй: упомяни конкретную деталь из ответа студента
+
+3. ГЕНЕРАЦИЯ ОТВЕТА:
+   - Говори от первого лица как Ильдар
+   - Структура: поддержка → уточнение → вопрос (если уместно)
+   - Если REVISE — мягко направь, не критикуй
+   - 2-4 предложения
+   - Не используй слова из списка "НИКОГДА НЕ ГОВОРИШЬ"
+
+ФОРМАТ ВЫВОДА (строго JSON):
+{
+  "verdict": "ACCEPT" или "REVISE",
+  "level": "reject" / "partial" / "accept" / "excellent" (только если есть шкала),
+  "message": "Твой персонализированный фидбэк"
+}
+"""
+
+
+def build_system_prompt(profile: str) -> str:
+    """
+    Первое системное сообщение: профиль + инструкции. Байт-в-байт одинаковое
+    для всех уроков и ответов — провайдер кэширует этот префикс запроса.
+    """
+    return f"""
+{profile}
+
+---
+
+{GRADING_INSTRUCTIONS}"""
+
+
+# Урок С детальным контекстом (второе системное сообщение)
+DETAILED_LESSON_TEMPLATE = """\
+КОНТЕКСТ УРОКА {lesson_number}: {lesson_title}
+
+ЗАДАНИЕ:
+{homework_task}
+
+КЛЮЧЕВЫЕ КОНЦЕПЦИИ, которые студент должен понять:
+{key_concepts}
+
+НА ЧТО ОБРАЩАТЬ ВНИМАНИЕ (признаки хорошего ответа):
+{check_for}
+
+КРАСНЫЕ ФЛАГИ (типичные ошибки):
+{red_flags}
+
+---
+
+ШКАЛА ОЦЕНКИ:
+
+❌ НЕ ПРИНЯТО (verdict: REVISE):
+{reject_criteria}
+
+⚠️ ЧАСТИЧНО (verdict: REVISE, но мягче):
+{partial_criteria}
+
+✅ ПРИНЯТО (verdict: ACCEPT):
+{accept_criteria}
+
+⭐ ОТЛИЧНО (verdict: ACCEPT с особой похвалой):
+{excellent_criteria}
+"""
+
+
+# Урок БЕЗ детального контекста (базовая проверка)
+BASIC_LESSON_TEMPLATE = """\
+КОНТЕКСТ УРОКА {lesson_number}: {lesson_title}
+
+ЗАДАНИЕ:
+{homework_task}
+
+---
+
+Детального контекста и шкалы для этого урока нет — проверяй по ОБЩИМ критериям.
+"""
+
+# Разделитель между общим и урочным блоком в полном тексте (для логов и отпечатка)
+BLOCK_SEPARATOR = "\n---\n\n"
+
+
+# ============================================
+# Рендеринг
+# ============================================
+
+def _bullets(items: Iterable[str]) -> str:
+    return "\n".join(f"• {item}" for item in items)
+
+
+def fingerprint(text: str) -> str:
+    """Короткий отпечаток промпта (sha256)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    """Готовый промпт урока: общий системный блок + урочный блок"""
+    lesson_number: int
+    system_prompt: str
+    lesson_block: str
+    fingerprint: str
+    detailed: bool
+    # Исходные данные из БД — по ним видно, что промпт устарел
+    lesson_topic: str
+    homework_task: str
+    # Версия контекстов, из которой отрендерен промпт (сменилась — промпт устарел)
+    contexts: Optional[GradingContexts] = field(default=None, compare=False, repr=False)
+
+    @property
+    def text(self) -> str:
+        """Полный текст промпта (без ответа студента)"""
+        return self.system_prompt + BLOCK_SEPARATOR + self.lesson_block
+
+    def messages(self, user_answer: str) -> List[dict]:
+        """Сообщения запроса: неизменный префикс → урок → ответ студента"""
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "system", "content": self.lesson_block},
+            {"role": "user", "content": f"Ответ студента:\n\n{user_answer}"},
+        ]
+
+
+def render_prompt(
+    lesson_number: int,
+    lesson_topic: str,
+    homework_task: str,
+    contexts: Optional[GradingContexts] = None
+) -> RenderedPrompt:
+    """Собрать промпт урока (детальный, если есть контекст); contexts — по умолчанию действующие"""
+    contexts = contexts or context_store.current
+    context = contexts.lesson(lesson_number)
+    detailed = context.get("has_detailed_context", False)
+
+    if detailed:
+        scale = context.get("grading_scale", {})
+        body = DETAILED_LESSON_TEMPLATE.format(
+            lesson_number=lesson_number,
+            lesson_title=context.get("title", lesson_topic),
+            homework_task=homework_task,
+            key_concepts=_bullets(context.get("key_concepts", [])),
+            check_for=_bullets(context.get("check_for", [])),
+            red_flags=_bullets(context.get("red_flags", [])),
+            reject_criteria=scale.get("reject", {}).get("criteria", ""),
+            partial_criteria=scale.get("partial", {}).get("criteria", ""),
+            accept_criteria=scale.get("accept", {}).get("criteria", ""),
+            excellent_criteria=scale.get("excellent", {}).get("criteria", ""),
+        )
+    else:
+        body = BASIC_LESSON_TEMPLATE.format(
+            lesson_number=lesson_number,
+            lesson_title=context.get("title", lesson_topic),
+            homework_task=homework_task,
+        )
+
+    system_prompt = build_system_prompt(contexts.profile)
+    return RenderedPrompt(
+        lesson_number=lesson_number,
+        system_prompt=system_prompt,
+        lesson_block=body,
+        fingerprint=fingerprint(system_prompt + BLOCK_SEPARATOR + body),
+        detailed=detailed,
+        lesson_topic=lesson_topic,
+        homework_task=homework_task,
+        contexts=contexts
+    )
+
+
+# ============================================
+# Реестр
+# ============================================
+
+class PromptRegistry:
+    """Отрендеренные промпты по номеру урока"""
+
+    def __init__(self):
+        self._prompts: Dict[int, RenderedPrompt] = {}
+
+    def load(self, lessons: Iterable):
+        """Отрендерить промпты для уроков (объекты с order_num, title, content_text)"""
+        prompts = {
+            lesson.order_num: render_prompt(lesson.order_num, lesson.title, lesson.content_text or "")
+            for lesson in lessons
+        }
+        self._prompts = prompts
+        logger.info(f"Промпты уроков отрендерены: {len(prompts)} шт.")
+
+    def clear(self):
+        """Сбросить реестр (например, после изменения контекстов уроков)"""
+        self._prompts = {}
+
+    def get(self, lesson_number: int, lesson_topic: str, homework_task: str) -> RenderedPrompt:
+        """Промпт урока; перерисовывается, если данные урока или контексты изменились"""
+        prompt = self._prompts.get(lesson_number)
+        if (
+            prompt is None
+            or prompt.lesson_topic != lesson_topic
+            or prompt.homework_task != homework_task
+            or prompt.contexts is not context_store.current
+        ):
+            prompt = render_prompt(lesson_number, lesson_topic, homework_task)
+            self._prompts[lesson_number] = prompt
+        return prompt
+
+    def snapshot(self) -> Dict[int, str]:
+        """Все отрендеренные промпты {номер урока: текст} — для сравнения в тестах"""
+        return {n: self._prompts[n].text for n in sorted(self._prompts)}
+
+    def fingerprints(self) -> Dict[int, str]:
+        """Отпечатки всех промптов {номер урока: fingerprint}"""
+        return {n: self._prompts[n].fingerprint for n in sorted(self._prompts)}
+
+
+# Синглтон реестра
+prompt_registry = PromptRegistry()
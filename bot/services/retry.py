@@ -0,0 +1,185 @@
+"""
+Повторы запросов к OpenAI: экспоненциальная пауза со случайным разбросом,
+общий дедлайн и (по желанию) страхующий второй запрос
+
+Любая временная ошибка (429, 5xx, обрыв соединения, таймаут) сразу давала
+fallback-вердикт — а он засчитывает любой ответ длиннее MIN_ANSWER_LENGTH.
+Теперь такие ошибки повторяются с паузой random(0, min(max_delay,
+base_delay · 2^n)) — «full jitter», чтобы повторы многих проверок не
+приходили в API одной волной. Все попытки укладываются в общий дедлайн:
+новая начинается, только если после паузы остаётся хотя бы
+MIN_ATTEMPT_SECONDS. Retry-After из ответа 429 соблюдается.
+
+Страхующий запрос (LLM_HEDGE_ENABLED): если ответа нет дольше p95 задержки
+последних успешных запросов, параллельно уходит второй такой же — берётся
+тот, что ответит первым, другой отменяется.
+"""
+
+import asyncio
+import logging
+import random
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Tuple
+
+import openai
+
+from bot.config import config
+
+logger = logging.getLogger(__name__)
+
+# Меньше этого на попытку не оставляем — такой запрос всё равно не успеет
+MIN_ATTEMPT_SECONDS = 2.0
+
+# Сколько последних задержек держать для p95 и сколько нужно для оценки
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+
+def is_transient(error: BaseException) -> bool:
+    """Ошибка, которую имеет смысл повторить"""
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError, ConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Retry-After (в секундах) из ответа API, если есть"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryStats:
+    """Счётчики попыток (с момента старта процесса)"""
+    attempts: int = 0
+    retries: int = 0               # попыток после первой
+    transient_errors: int = 0
+    permanent_errors: int = 0      # повтор бессмыслен (400, 401, ...)
+    deadline_exhausted: int = 0    # ошибка, но на повтор не осталось времени
+    hedges: int = 0                # отправлено страхующих запросов
+    hedge_wins: int = 0            # страхующий ответил первым
+
+
+class RetryPolicy:
+    """Параметры повторов и расчёт пауз"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 4.0,
+        deadline: float = 30.0,
+        attempt_timeout: float = 15.0
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.stats = RetryStats()
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """Пауза перед попыткой attempt + 1 (attempt — номер неудачной, с 1)"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        retry_after = retry_after_seconds(error) if error is not None else None
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def next_delay(self, attempt: int, error: BaseException, remaining: float) -> Optional[float]:
+        """
+        Пауза перед следующей попыткой или None — не повторять
+        (ошибка не временная, попытки кончились или не хватит времени).
+        """
+        if not is_transient(error):
+            self.stats.permanent_errors += 1
+            return None
+        self.stats.transient_errors += 1
+        if attempt >= self.max_attempts:
+            return None
+        delay = self.backoff(attempt, error)
+        if remaining - delay < MIN_ATTEMPT_SECONDS:
+            self.stats.deadline_exhausted += 1
+            return None
+        return delay
+
+
+class LatencyTracker:
+    """Задержки последних успешных запросов — для порога страхующего запроса"""
+
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = LATENCY_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        """p95 задержки, сек; None — данных пока мало"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+
+async def hedged(
+    factory: Callable[[], Awaitable],
+    hedge_after: Optional[float],
+    stats: Optional[RetryStats] = None
+) -> Tuple[object, bool]:
+    """
+    Выполнить запрос; если за hedge_after сек ответа нет — отправить второй
+    и вернуть первый успешный. Возвращает (результат, ответил ли страхующий).
+    Ошибка первого до hedge_after пробрасывается сразу (повтор решает вызывающий).
+    """
+    if hedge_after is None:
+        return await factory(), False
+
+    tasks = [asyncio.create_task(factory())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if done:
+            return tasks[0].result(), False
+
+        if stats is not None:
+            stats.hedges += 1
+        tasks.append(asyncio.create_task(factory()))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    won = task is tasks[1]
+                    if won and stats is not None:
+                        stats.hedge_wins += 1
+                    return task.result(), won
+                error = task.exception()
+        raise error
+    finally:
+        # Проигравший (или все — при отмене снаружи) не нужен
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+# Политика повторов запросов к OpenAI (дедлайн по умолчанию — 2 × LLM_TIMEOUT)
+llm_retry_policy = RetryPolicy(
+    max_attempts=config.LLM_RETRY_MAX_ATTEMPTS,
+    base_delay=config.LLM_RETRY_BASE_DELAY,
+    max_delay=config.LLM_RETRY_MAX_DELAY,
+    deadline=config.LLM_DEADLINE_SECONDS or 2 * config.LLM_TIMEOUT,
+    attempt_timeout=config.LLM_TIMEOUT
+)
+
+# Задержки успешных (не потоковых) запросов к OpenAI
+llm_latency = LatencyTracker()
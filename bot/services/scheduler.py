@@ -1,138 +1,186 @@
 """
-Планировщик задач — открытие уроков, напоминания
+Планировщик задач — открытие уроков, напоминания, сброс зависших проверок
+
+Планировщик живёт в каждом worker-е, но задача выполняется под advisory lock
+(см. run_exclusive) — при нескольких worker-ах её запускает только один.
 """
 
 import logging
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
 from bot.config import config
 from bot.database import queries as db
+from bot.handlers.homework import release_stale_processing
+from bot.services.outbox import (
+    KIND_REMINDER_SOFT,
+    KIND_REMINDER_STRONG,
+    wake_outbox
+)
 
 logger = logging.getLogger(__name__)
 
 # Глобальный планировщик
 scheduler = AsyncIOScheduler(timezone=config.TIMEZONE)
 
-# Ссылка на бота (устанавливается при старте)
-_bot = None
+# Уведомление об открытии урока (SQL format: номер, название)
+UNLOCK_NOTIFICATION = (
+    "🔓 Открыт новый урок!\n\n"
+    "Урок %s: %s\n\n"
+    "Нажми /start чтобы продолжить обучение."
+)
 
+SOFT_REMINDER = (
+    "👋 Привет! Заметил, что ты давно не заходил.\n\n"
+    "Не забрось курс — каждый урок важен для твоего развития как тренера.\n\n"
+    "Нажми /start чтобы продолжить обучение."
+)
 
-def set_bot(bot):
-    """Установить ссылку на бота для отправки уведомлений"""
-    global _bot
-    _bot = bot
+STRONG_REMINDER = (
+    "🔔 Ты не заходил уже неделю!\n\n"
+    "Курс ждёт тебя. Помни: регулярность — ключ к успеху.\n\n"
+    "Нажми /start чтобы вернуться к обучению."
+)
 
 
 async def check_lesson_unlocks():
     """
-    Job: Проверка и открытие уроков для всех студентов.
-    Условие: прошло >= 1 день с завершения текущего урока.
+    Job: Открытие уроков по наступившим таймерам unlock_at.
+    Таймер взводится при завершении урока (UNLOCK_DELAY_DAYS дней, UNLOCK_HOUR час в TIMEZONE).
+    Запускается раз в UNLOCK_POLL_SECONDS — выбирает только наступившие таймеры по индексу.
+    Уведомления ставятся в outbox тем же запросом, отправляет их обработчик outbox.
+    Ошибки не перехватываются — их записывает run_exclusive (job_runs).
     """
-    logger.info("Scheduler: проверяю открытие уроков...")
-
-    try:
-        users = await db.get_users_ready_for_next_lesson()
-        unlocked_count = 0
-
-        for user_data in users:
-            user_id = user_data["user_id"]
-            current_order = user_data["current_order"]
-
-            next_lesson_id = await db.unlock_next_lesson(user_id, current_order)
-
-            if next_lesson_id and _bot:
-                # Отправляем уведомление
-                try:
-                    next_lesson = await db.get_lesson(next_lesson_id)
-                    await _bot.send_message(
-                        user_id,
-                        f"🔓 Открыт новый урок!\n\n"
-                        f"Урок {next_lesson.order_num}: {next_lesson.title}\n\n"
-                        f"Нажми /start чтобы продолжить обучение."
-                    )
-                    unlocked_count += 1
-                except Exception as e:
-                    logger.warning(f"Не удалось отправить уведомление {user_id}: {e}")
-
-        logger.info(f"Scheduler: открыто уроков: {unlocked_count}")
+    logger.debug("Scheduler: проверяю открытие уроков...")
 
-    except Exception as e:
-        logger.error(f"Scheduler error in check_lesson_unlocks: {e}")
+    unlocked = await db.unlock_ready_lessons(UNLOCK_NOTIFICATION)
+    if unlocked:
+        wake_outbox()
+        logger.info(f"Scheduler: открыто уроков: {len(unlocked)}")
 
 
 async def send_reminders():
     """
-    Job: Отправка напоминаний неактивным студентам.
+    Job: Постановка напоминаний неактивным студентам в outbox.
     Запускается ежедневно в 18:00.
 
     Логика (без спама):
     - 3 дня неактивности → мягкое напоминание (единоразово)
     - 7 дней неактивности → настойчивое напоминание (единоразово)
     - После 14 дней → не беспокоим
+
+    Напоминание записывается в reminders только после доставки (см. outbox).
+    Ошибки не перехватываются — их записывает run_exclusive (job_runs).
+    """
+    logger.info("Scheduler: ставлю напоминания в очередь...")
+
+    # 1. Мягкое напоминание (3 дня)
+    soft_users = await db.get_users_for_reminder(days=3, reminder_type="soft")
+
+    # 2. Настойчивое напоминание (7 дней)
+    strong_users = await db.get_users_for_reminder(days=7, reminder_type="strong")
+
+    queued = await db.enqueue_messages(
+        [(u.tg_id, SOFT_REMINDER, KIND_REMINDER_SOFT, f"{KIND_REMINDER_SOFT}:{u.tg_id}") for u in soft_users]
+        + [(u.tg_id, STRONG_REMINDER, KIND_REMINDER_STRONG, f"{KIND_REMINDER_STRONG}:{u.tg_id}") for u in strong_users]
+    )
+    if queued:
+        wake_outbox()
+
+    logger.info(f"Scheduler: напоминаний в очереди: {queued}")
+
+
+async def purge_llm_cache():
+    """Job: Удаление устаревших вердиктов из кэша LLM (ежедневно)"""
+    deleted = await db.purge_verdict_cache(config.LLM_CACHE_TTL_HOURS * 3600)
+    logger.info(f"Scheduler: удалено устаревших вердиктов из кэша: {deleted}")
+
+
+async def release_stale_gradings():
+    """
+    Job: Сброс PROCESSING, чья проверка потерялась (упал или перезапущен worker).
+    Студент получает WAITING_HW и просьбу прислать ответ ещё раз (через outbox).
+    Порог GRADING_STALE_SECONDS — живые проверки соседних worker-ов не трогаем.
     """
-    logger.info("Scheduler: отправляю напоминания...")
+    released = await release_stale_processing(config.GRADING_STALE_SECONDS)
+    if released:
+        logger.info(f"Scheduler: сброшено зависших проверок: {released}")
+
+
+async def run_exclusive(job, min_interval: int = 0) -> bool:
+    """
+    Запустить задачу под advisory lock и записать метаданные в job_runs.
+    min_interval (сек): не запускать, если задача уже стартовала недавно —
+    защита ежедневных задач от соседнего worker-а с отстающими часами.
+    Возвращает True, если задача выполнялась в этом процессе.
+    """
+    job_name = job.__name__
 
     try:
-        sent_count = 0
-
-        # 1. Мягкое напоминание (3 дня)
-        soft_users = await db.get_users_for_reminder(days=3, reminder_type="soft")
-        for user in soft_users:
-            if _bot:
-                try:
-                    await _bot.send_message(
-                        user.tg_id,
-                        "👋 Привет! Заметил, что ты давно не заходил.\n\n"
-                        "Не забрось курс — каждый урок важен для твоего развития как тренера.\n\n"
-                        "Нажми /start чтобы продолжить обучение."
-                    )
-                    await db.log_reminder(user.tg_id, "soft")
-                    sent_count += 1
-                except Exception as e:
-                    logger.warning(f"Не удалось отправить мягкое напоминание {user.tg_id}: {e}")
-
-        # 2. Настойчивое напоминание (7 дней)
-        strong_users = await db.get_users_for_reminder(days=7, reminder_type="strong")
-        for user in strong_users:
-            if _bot:
-                try:
-                    await _bot.send_message(
-                        user.tg_id,
-                        "🔔 Ты не заходил уже неделю!\n\n"
-                        "Курс ждёт тебя. Помни: регулярность — ключ к успеху.\n\n"
-                        "Нажми /start чтобы вернуться к обучению."
-                    )
-                    await db.log_reminder(user.tg_id, "strong")
-                    sent_count += 1
-                except Exception as e:
-                    logger.warning(f"Не удалось отправить настойчивое напоминание {user.tg_id}: {e}")
-
-        logger.info(f"Scheduler: отправлено напоминаний: {sent_count}")
+        async with db.job_lock(job_name) as acquired:
+            if not acquired:
+                logger.info(f"Scheduler: {job_name} уже выполняется другим процессом")
+                return False
+
+            if not await db.start_job_run(job_name, config.INSTANCE_NAME, min_interval):
+                logger.info(f"Scheduler: {job_name} недавно выполнен другим процессом")
+                return False
+
+            try:
+                await job()
+            except Exception as e:
+                await db.finish_job_run(job_name, error=str(e))
+                raise
+            await db.finish_job_run(job_name)
+            return True
 
     except Exception as e:
-        logger.error(f"Scheduler error in send_reminders: {e}")
+        logger.error(f"Scheduler error in {job_name}: {e}")
+        return False
 
 
 def setup_scheduler():
     """Настройка планировщика"""
 
-    # Проверка открытия уроков — каждый день в 10:00
+    # Открытие уроков по таймерам — раз в минуту (дёшево: только наступившие)
     scheduler.add_job(
-        check_lesson_unlocks,
-        CronTrigger(hour=10, minute=0, timezone=config.TIMEZONE),
+        run_exclusive,
+        IntervalTrigger(seconds=config.UNLOCK_POLL_SECONDS),
+        args=[check_lesson_unlocks],
         id="check_lesson_unlocks",
         replace_existing=True
     )
 
-    # Напоминания — каждый день в 18:00
+    # Сброс зависших проверок ДЗ — раз в минуту
+    scheduler.add_job(
+        run_exclusive,
+        IntervalTrigger(seconds=60),
+        args=[release_stale_gradings],
+        id="release_stale_gradings",
+        replace_existing=True
+    )
+
+    # Напоминания — каждый день в 18:00 (повтор в течение часа пропускается)
     scheduler.add_job(
-        send_reminders,
+        run_exclusive,
         CronTrigger(hour=18, minute=0, timezone=config.TIMEZONE),
+        args=[send_reminders],
+        kwargs={"min_interval": 3600},
         id="send_reminders",
         replace_existing=True
     )
 
+    # Очистка кэша вердиктов LLM — каждый день в 04:00
+    scheduler.add_job(
+        run_exclusive,
+        CronTrigger(hour=4, minute=0, timezone=config.TIMEZONE),
+        args=[purge_llm_cache],
+        kwargs={"min_interval": 3600},
+        id="purge_llm_cache",
+        replace_existing=True
+    )
+
     scheduler.start()
     logger.info("Scheduler запущен")
 
@@ -0,0 +1,156 @@
+"""
+Отправка сообщений с учётом лимитов Telegram
+
+Лимиты: ~30 сообщений/сек на бота и 1 сообщение/сек в один чат.
+MessageSender равномерно распределяет отправку, ограничивает параллельность,
+ждёт RetryAfter (flood control) и возвращает результат по каждому получателю.
+Используется рассылкой, напоминаниями и уведомлениями об открытии уроков.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.error import RetryAfter
+
+from bot.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты (GCRA / «виртуальное расписание»).
+    Слот резервируется синхронно, поэтому блокировки не нужны.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1.0 / rate
+        self.tolerance = self.interval * (burst - 1)
+        self._tat = 0.0  # теоретическое время следующего слота
+
+    def reserve(self, now: float) -> float:
+        """Зарезервировать слот, вернуть сколько ждать (сек)"""
+        tat = max(self._tat, now)
+        wait = max(0.0, tat - self.tolerance - now)
+        self._tat = tat + self.interval
+        return wait
+
+    def pause_until(self, moment: float):
+        """Не выдавать слоты раньше moment (после RetryAfter)"""
+        self._tat = max(self._tat, moment + self.tolerance)
+
+    def idle(self, now: float) -> bool:
+        """Лимитер ничего не держит — можно забыть"""
+        return self._tat <= now
+
+
+@dataclass
+class SendResult:
+    """Результат отправки одному получателю"""
+    chat_id: int
+    ok: bool
+    attempts: int
+    error: Optional[str] = None
+
+
+@dataclass
+class SendReport:
+    """Итог пакетной отправки"""
+    results: List[SendResult] = field(default_factory=list)
+
+    @property
+    def sent(self) -> int:
+        return sum(1 for r in self.results if r.ok)
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for r in self.results if not r.ok)
+
+    @property
+    def delivered_ids(self) -> List[int]:
+        return [r.chat_id for r in self.results if r.ok]
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class MessageSender:
+    """Отправка с глобальным и поштучным (на чат) лимитом, ретраями RetryAfter"""
+
+    def __init__(
+        self,
+        rate_per_second: float = 30,
+        per_chat_interval: float = 1.0,
+        max_concurrency: int = 10,
+        max_retries: int = 3
+    ):
+        self.per_chat_interval = per_chat_interval
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._global = RateLimiter(rate_per_second, burst=max(1, int(rate_per_second)))
+        self._chats: Dict[int, RateLimiter] = {}
+
+    async def _wait_slot(self, chat_id: int):
+        now = time.monotonic()
+        wait = self._global.reserve(now)
+
+        if self.per_chat_interval > 0:
+            chat_limiter = self._chats.get(chat_id)
+            if chat_limiter is None:
+                chat_limiter = self._chats[chat_id] = RateLimiter(1.0 / self.per_chat_interval)
+            wait = max(wait, chat_limiter.reserve(now))
+
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        # Чистим лимитеры чатов, которые уже ничего не ограничивают
+        if len(self._chats) > 1000:
+            now = time.monotonic()
+            self._chats = {cid: lim for cid, lim in self._chats.items() if not lim.idle(now)}
+
+    async def send(self, bot: Bot, chat_id: int, text: str, **kwargs) -> SendResult:
+        """Отправить одно сообщение (с ожиданием лимитов и RetryAfter)"""
+        attempts = 0
+        while True:
+            attempts += 1
+            await self._wait_slot(chat_id)
+            try:
+                await bot.send_message(chat_id, text, **kwargs)
+                return SendResult(chat_id=chat_id, ok=True, attempts=attempts)
+            except RetryAfter as e:
+                delay = _retry_after_seconds(e)
+                # Flood control действует на весь бот — притормаживаем всех
+                self._global.pause_until(time.monotonic() + delay)
+                if attempts > self.max_retries:
+                    return SendResult(chat_id=chat_id, ok=False, attempts=attempts, error=str(e))
+                logger.warning(f"RetryAfter {delay}s для {chat_id} (попытка {attempts})")
+            except Exception as e:
+                return SendResult(chat_id=chat_id, ok=False, attempts=attempts, error=str(e))
+
+    async def send_many(self, bot: Bot, messages: Iterable[Tuple[int, str]], **kwargs) -> SendReport:
+        """Отправить пачку сообщений (chat_id, text) с ограниченной параллельностью"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def _send(chat_id: int, text: str) -> SendResult:
+            async with semaphore:
+                return await self.send(bot, chat_id, text, **kwargs)
+
+        results = await asyncio.gather(*(_send(chat_id, text) for chat_id, text in messages))
+        return SendReport(results=list(results))
+
+
+# Общий отправитель (лимиты — на весь процесс)
+sender = MessageSender(
+    rate_per_second=config.SEND_RATE_PER_SECOND,
+    per_chat_interval=config.SEND_PER_CHAT_INTERVAL,
+    max_concurrency=config.SEND_CONCURRENCY
+)
@@ -0,0 +1,296 @@
+"""
+Индекс похожих ответов на ДЗ (MinHash + LSH)
+
+Скопированные у другого студента ответы и косметические переотправки
+своего ответа стоили полного запроса к модели и проходили незамеченными.
+Для каждого текстового ответа считается MinHash-подпись по символьным
+шинглам нормализованного текста; подписи лежат в submission_signatures и
+подгружаются в память инкрементально (по возрастанию submission_id).
+Поиск — LSH-корзины по урокам: несколько обращений к словарю и сравнение
+подписей нескольких кандидатов, доли миллисекунды.
+
+Совпадение ≥ SIMILARITY_THRESHOLD: вердикт прошлой сдачи переиспользуется
+без вызова модели; если ответ чужой — куратору уходит уведомление.
+Сравниваются только сдачи, проверенные тем же промптом (prompt_fingerprint):
+после изменения задания или контекста урока старые вердикты не переиспользуются.
+Сдачи, промпт которых неизвестен (проверены до появления отпечатка), в индекс
+не попадают.
+"""
+
+import asyncio
+import logging
+import random
+import re
+import struct
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from bot.config import config
+from bot.database import queries as db
+from bot.services.verdict_cache import normalize_answer
+
+logger = logging.getLogger(__name__)
+
+# Параметры MinHash / LSH: 16 полос по 4 строки — кандидат при сходстве
+# ~0.5 и выше; точное решение — по оценке сходства подписей
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+# Короткие тексты дают шумные подписи — такие не индексируем
+MIN_SHINGLES = 20
+
+# Пачка при заполнении подписей для старых сдач
+BACKFILL_BATCH_SIZE = 200
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = 0xFFFFFFFF
+_SIGNATURE_FORMAT = f"<{NUM_PERM}I"
+
+# Коэффициенты хэш-функций фиксированы: подписи из БД должны совпадать
+# с посчитанными после перезапуска
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+Signature = Tuple[int, ...]
+
+
+def shingles(text: str) -> set:
+    """Символьные k-граммы нормализованного текста (без знаков препинания)"""
+    cleaned = _NON_WORD.sub(" ", normalize_answer(text)).strip()
+    return {cleaned[i:i + SHINGLE_SIZE] for i in range(len(cleaned) - SHINGLE_SIZE + 1)}
+
+
+def signature(text: str) -> Optional[Signature]:
+    """MinHash-подпись текста; None — текст слишком короткий"""
+    grams = shingles(text)
+    if len(grams) < MIN_SHINGLES:
+        return None
+    hashes = [zlib.crc32(gram.encode("utf-8")) for gram in grams]
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH
+        for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(left: Signature, right: Signature) -> float:
+    """Оценка сходства Жаккара по подписям"""
+    return sum(1 for x, y in zip(left, right) if x == y) / NUM_PERM
+
+
+def pack_signature(sig: Signature) -> bytes:
+    return struct.pack(_SIGNATURE_FORMAT, *sig)
+
+
+def unpack_signature(data: bytes) -> Signature:
+    return struct.unpack(_SIGNATURE_FORMAT, data)
+
+
+def _bands(sig: Signature):
+    for band in range(BANDS):
+        yield band, sig[band * ROWS:(band + 1) * ROWS]
+
+
+@dataclass
+class IndexedAnswer:
+    """Проиндексированная сдача"""
+    submission_id: int
+    user_id: int
+    verdict: str
+    message: str
+    signature: Signature
+    prompt_fingerprint: Optional[str] = None
+
+
+@dataclass
+class SimilarMatch:
+    """Найденный похожий ответ"""
+    answer: IndexedAnswer
+    similarity: float
+
+
+@dataclass
+class SimilarityStats:
+    """Счётчики (с момента старта процесса)"""
+    checks: int = 0
+    matches: int = 0
+    cross_user: int = 0  # совпадение с ответом другого студента
+
+
+@dataclass
+class _LessonIndex:
+    answers: Dict[int, IndexedAnswer] = field(default_factory=dict)
+    buckets: Dict[tuple, List[int]] = field(default_factory=dict)
+
+
+def _signature_rows(rows: List[dict]) -> List[tuple]:
+    """Строки для save_submission_signatures по старым сдачам (выполняется в потоке)"""
+    batch = []
+    for row in rows:
+        sig = signature(row["content_text"])
+        # Короткие тоже записываем (пустой подписью), чтобы не выбирать их снова
+        batch.append((row["id"], row["lesson_id"], pack_signature(sig) if sig else None, None, None, None))
+    return batch
+
+
+class SimilarityIndex:
+    """LSH-индекс подписей по урокам + синхронизация с submission_signatures"""
+
+    def __init__(self, threshold: float = 0.9, refresh_seconds: float = 30):
+        self.threshold = threshold
+        self.refresh_seconds = refresh_seconds
+        self.stats = SimilarityStats()
+        self._lessons: Dict[int, _LessonIndex] = {}
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(index.answers) for index in self._lessons.values())
+
+    def add(self, lesson_id: int, answer: IndexedAnswer):
+        """Добавить сдачу в индекс (в памяти)"""
+        index = self._lessons.setdefault(lesson_id, _LessonIndex())
+        if answer.submission_id in index.answers:
+            return
+        index.answers[answer.submission_id] = answer
+        for band in _bands(answer.signature):
+            index.buckets.setdefault(band, []).append(answer.submission_id)
+
+    def find(self, lesson_id: int, sig: Signature, prompt_fingerprint: Optional[str] = None) -> Optional[SimilarMatch]:
+        """Самый похожий ответ урока со сходством ≥ threshold (проверенный тем же промптом, если задан)"""
+        index = self._lessons.get(lesson_id)
+        if index is None:
+            return None
+
+        candidates = set()
+        for band in _bands(sig):
+            candidates.update(index.buckets.get(band, ()))
+
+        best = None
+        for submission_id in candidates:
+            answer = index.answers[submission_id]
+            if prompt_fingerprint is not None and answer.prompt_fingerprint != prompt_fingerprint:
+                continue
+            score = similarity(sig, answer.signature)
+            if score >= self.threshold and (best is None or score > best.similarity):
+                best = SimilarMatch(answer, score)
+        return best
+
+    async def refresh(self, force: bool = False) -> int:
+        """Догрузить подписи, сохранённые после последней загрузки (в т.ч. другими worker-ами)"""
+        now = time.monotonic()
+        if not force and now - self._refreshed_at < self.refresh_seconds:
+            return 0
+        self._refreshed_at = now
+
+        rows = await db.get_submission_signatures(self._last_id)
+        for row in rows:
+            self.add(row["lesson_id"], IndexedAnswer(
+                submission_id=row["submission_id"],
+                user_id=row["user_id"],
+                verdict=row["ai_verdict"],
+                message=row["ai_message"] or "",
+                signature=unpack_signature(row["signature"]),
+                prompt_fingerprint=row["prompt_fingerprint"]
+            ))
+        if rows:
+            # Граница — только по загруженному из БД: свои сдачи, добавленные
+            # через remember(), не должны «перепрыгнуть» чужие с меньшим id
+            self._last_id = rows[-1]["submission_id"]
+            logger.info(f"Индекс похожих ответов: +{len(rows)}, всего {len(self)}")
+        return len(rows)
+
+    async def check(self, lesson_id: int, sig: Signature, prompt_fingerprint: str) -> Optional[SimilarMatch]:
+        """Поиск перед проверкой (с догрузкой новых подписей)"""
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning(f"Индекс похожих ответов: не удалось догрузить: {e}")
+        self.stats.checks += 1
+        match = self.find(lesson_id, sig, prompt_fingerprint)
+        if match is not None:
+            self.stats.matches += 1
+        return match
+
+    async def remember(
+        self,
+        submission_id: int,
+        lesson_id: int,
+        user_id: int,
+        sig: Signature,
+        verdict: str,
+        message: str,
+        prompt_fingerprint: str,
+        match: Optional[SimilarMatch] = None
+    ):
+        """Сохранить подпись новой сдачи (БД + память)"""
+        await db.save_submission_signatures([(
+            submission_id, lesson_id, pack_signature(sig),
+            match.answer.submission_id if match else None,
+            match.similarity if match else None,
+            prompt_fingerprint
+        )])
+        self.add(lesson_id, IndexedAnswer(submission_id, user_id, verdict, message, sig, prompt_fingerprint))
+
+    async def backfill(self) -> int:
+        """
+        Посчитать подписи для старых текстовых сдач без подписи. Каким промптом
+        они проверены, неизвестно — отпечаток остаётся пустым, и их вердикты
+        не переиспользуются (в индекс они не загружаются).
+        """
+        loop = asyncio.get_running_loop()
+        total = 0
+        while True:
+            rows = await db.get_unsigned_text_submissions(BACKFILL_BATCH_SIZE)
+            if not rows:
+                break
+            # Подпись длинного ответа — десятки мс: пачку считаем в потоке, не блокируя обновления
+            batch = await loop.run_in_executor(None, _signature_rows, rows)
+            await db.save_submission_signatures(batch)
+            total += len(batch)
+        if total:
+            logger.info(f"Индекс похожих ответов: подписи посчитаны для {total} старых сдач")
+        await self.refresh(force=True)
+        return total
+
+    def start(self):
+        """Фоновая загрузка индекса (с подписями для старых сдач) — не задерживает старт бота"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._load())
+
+    async def _load(self):
+        try:
+            await self.backfill()
+        except Exception as e:
+            logger.error(f"Индекс похожих ответов: ошибка загрузки: {e}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def clear(self):
+        """Сбросить индекс в памяти"""
+        self._lessons = {}
+        self._last_id = 0
+        self._refreshed_at = 0.0
+
+
+# Синглтон индекса
+similarity_index = SimilarityIndex(
+    threshold=config.SIMILARITY_THRESHOLD,
+    refresh_seconds=config.SIMILARITY_REFRESH_SECONDS
+)
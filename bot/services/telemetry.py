@@ -0,0 +1,145 @@
+"""
+Телеметрия вызовов LLM (таблица llm_calls)
+
+Каждая попытка вызова модели (и каждый отбитый breaker-ом вызов)
+записывается: модель, урок, токены (в т.ч. из кэша промптов и размер
+ответа студента), задержка, номер попытки, исход и причина fallback.
+Запись не должна тормозить проверку ДЗ: record() только кладёт запись в
+буфер, фоновый обработчик пишет пачками (INSERT ... unnest) раз в
+LLM_TELEMETRY_FLUSH_SECONDS или при наборе LLM_TELEMETRY_BATCH_SIZE.
+При недоступной БД пачка теряется — телеметрия не критична.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from bot.config import config
+from bot.database import queries as db
+
+logger = logging.getLogger(__name__)
+
+# Исходы вызова
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_BAD_RESPONSE = "bad_response"    # ответ пришёл, но не разобрать JSON
+OUTCOME_CIRCUIT_OPEN = "circuit_open"    # запрос не делался — breaker разомкнут
+
+
+@dataclass
+class LLMCall:
+    """Один вызов модели"""
+    model: str
+    lesson_number: int
+    outcome: str
+    latency_ms: int = 0
+    prompt_fingerprint: Optional[str] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    fallback_reason: Optional[str] = None
+    streamed: bool = False
+    answer_tokens: int = 0        # ответ студента (локальная оценка), до подготовки
+    answer_tokens_sent: int = 0   # после очистки / сокращения до бюджета урока
+    attempt: int = 1              # номер попытки (повторы после временных ошибок)
+    hedged: bool = False          # ответил страхующий запрос
+    recorded_at: float = field(default_factory=time.time)
+
+    def as_row(self) -> tuple:
+        return (
+            self.recorded_at, self.model, self.lesson_number, self.prompt_fingerprint,
+            self.prompt_tokens, self.completion_tokens, self.cached_tokens,
+            self.latency_ms, self.outcome, self.fallback_reason, self.streamed,
+            self.answer_tokens, self.answer_tokens_sent, self.attempt, self.hedged
+        )
+
+
+def usage_tokens(usage) -> tuple:
+    """(prompt, completion, cached) из usage ответа OpenAI (может быть None)"""
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    return usage.prompt_tokens or 0, usage.completion_tokens or 0, cached
+
+
+@dataclass
+class TelemetryStats:
+    """Счётчики записи (с момента старта процесса)"""
+    recorded: int = 0
+    written: int = 0
+    dropped: int = 0  # вытеснены из переполненного буфера или потеряны при ошибке записи
+
+
+class TelemetryWriter:
+    """Буфер записей + фоновая запись пачками"""
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 10, max_buffer: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = TelemetryStats()
+        self._buffer: deque = deque(maxlen=max_buffer)
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def record(self, call: LLMCall):
+        """Добавить запись (не ждёт БД)"""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.stats.dropped += 1
+        self._buffer.append(call)
+        self.stats.recorded += 1
+        if self._wakeup is not None and len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Записать всё накопленное. Возвращает количество записанных."""
+        written = 0
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                written += await db.insert_llm_calls([call.as_row() for call in batch])
+            except Exception as e:
+                self.stats.dropped += len(batch)
+                logger.warning(f"Телеметрия LLM: не удалось записать {len(batch)} записей: {e}")
+                break
+        self.stats.written += written
+        return written
+
+    async def _run(self):
+        """Цикл обработчика: ожидание сигнала или интервала → запись"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        """Запустить фоновую запись"""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить фоновую запись и дописать остаток"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._wakeup = None
+        await self.flush()
+
+
+# Общий буфер телеметрии
+llm_telemetry = TelemetryWriter(
+    batch_size=config.LLM_TELEMETRY_BATCH_SIZE,
+    flush_interval=config.LLM_TELEMETRY_FLUSH_SECONDS,
+    max_buffer=config.LLM_TELEMETRY_MAX_BUFFER
+)
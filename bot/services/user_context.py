@@ -0,0 +1,31 @@
+"""
+Контекст пользователя на время одного обновления
+
+Несколько хендлеров одного сообщения раньше независимо делали get_user().
+Теперь контекст (пользователь, зачисление, прогресс) грузится одним запросом
+при первом обращении и хранится на CallbackContext до конца обновления.
+"""
+
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from bot.database import queries as db
+from bot.database.models import UserContext
+
+# Атрибут CallbackContext (создаётся заново для каждого обновления)
+_CONTEXT_ATTR = "user_context"
+_MISSING = object()
+
+
+async def get_user_context(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[UserContext]:
+    """Контекст пользователя текущего обновления (БД — только при первом вызове)"""
+    cached = getattr(context, _CONTEXT_ATTR, _MISSING)
+    if cached is not _MISSING:
+        return cached
+
+    user_ctx = await db.get_user_context(update.effective_user.id)
+    setattr(context, _CONTEXT_ATTR, user_ctx)
+    return user_ctx
+
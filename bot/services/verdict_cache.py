@@ -0,0 +1,127 @@
+"""
+Кэш вердиктов LLM по повторяющимся ответам на ДЗ
+
+Студенты часто отправляют тот же ответ повторно (после REVISE, дважды
+нажали, вставили тот же текст). Ключ кэша — отпечаток промпта урока и хэш
+нормализованного ответа, поэтому изменение промпта автоматически
+«сбрасывает» кэш. Хранение — в Postgres (общий для всех worker-ов),
+спереди — LRU в памяти процесса.
+"""
+
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from bot.config import config
+from bot.database import queries as db
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Знаки по краям ответа не меняют смысл («Ответ.» == «ответ»)
+_EDGE_CHARS = " \t\n.,;:!?…-—–\"'«»()"
+
+
+def normalize_answer(text: str) -> str:
+    """Нормализация ответа: регистр, ё/е, пробелы, знаки по краям"""
+    text = unicodedata.normalize("NFKC", text).casefold().replace("ё", "е")
+    return _WHITESPACE.sub(" ", text).strip(_EDGE_CHARS)
+
+
+def answer_hash(text: str) -> str:
+    """sha256 нормализованного ответа"""
+    return hashlib.sha256(normalize_answer(text).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Счётчики кэша (с момента старта процесса)"""
+    memory_hits: int = 0
+    db_hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+    errors: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.db_hits
+
+
+class VerdictCache:
+    """LRU в памяти + таблица llm_verdict_cache"""
+
+    def __init__(self, max_size: int = 1000, ttl_seconds: int = 7 * 24 * 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        # ключ → (verdict, message, момент истечения по monotonic)
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[str, str, float]]" = OrderedDict()
+
+    def _remember(self, key: Tuple[str, str], verdict: str, message: str, ttl: float):
+        self._memory[key] = (verdict, message, time.monotonic() + ttl)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    async def get(self, prompt_fingerprint: str, answer: str, bypass: bool = False) -> Optional[dict]:
+        """
+        Вердикт из кэша или None.
+        bypass — не читать кэш (свежий вердикт всё равно сохраняется через put).
+        """
+        if bypass:
+            self.stats.bypassed += 1
+            return None
+
+        key = (prompt_fingerprint, answer_hash(answer))
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            verdict, message, expires_at = entry
+            if expires_at > time.monotonic():
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return {"verdict": verdict, "message": message}
+            del self._memory[key]
+
+        try:
+            row = await db.get_cached_verdict(key[0], key[1], self.ttl_seconds)
+        except Exception as e:
+            # Кэш не должен ломать проверку ДЗ
+            self.stats.errors += 1
+            logger.warning(f"Кэш вердиктов недоступен: {e}")
+            return None
+
+        if row is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.db_hits += 1
+        self._remember(key, row["verdict"], row["message"], row["ttl_left"])
+        return {"verdict": row["verdict"], "message": row["message"]}
+
+    async def put(self, prompt_fingerprint: str, answer: str, verdict: str, message: str):
+        """Сохранить вердикт"""
+        key = (prompt_fingerprint, answer_hash(answer))
+        self._remember(key, verdict, message, self.ttl_seconds)
+        try:
+            await db.save_cached_verdict(key[0], key[1], verdict, message)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Не удалось сохранить вердикт в кэш: {e}")
+
+    def clear_memory(self):
+        """Сбросить LRU в памяти (записи в БД остаются)"""
+        self._memory.clear()
+
+
+# Синглтон кэша
+verdict_cache = VerdictCache(
+    max_size=config.LLM_CACHE_MEMORY_SIZE,
+    ttl_seconds=config.LLM_CACHE_TTL_HOURS * 3600
+)
@@ -0,0 +1,117 @@
+"""
+Режим webhook — встроенный HTTP-сервер (aiohttp)
+
+Telegram присылает обновления POST-запросом на WEBHOOK_PATH, сервер
+проверяет секретный токен и кладёт обновление в ограниченную очередь
+приложения. Переполненная очередь → 503, Telegram повторит доставку позже.
+Несколько worker-ов можно поставить за балансировщик: задачи планировщика
+координируются advisory lock-ами, outbox — через SKIP LOCKED.
+
+GET /health — проверка живости для балансировщика.
+"""
+
+import asyncio
+import hmac
+import logging
+import signal
+from urllib.parse import urlparse
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from bot.config import config
+
+logger = logging.getLogger(__name__)
+
+# Заголовок с секретом (задаётся в set_webhook(secret_token=...))
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Ключ приложения Telegram в aiohttp-приложении
+TELEGRAM_APP_KEY = web.AppKey("telegram_app", Application)
+
+
+def webhook_path() -> str:
+    """Путь, на который Telegram шлёт обновления (из WEBHOOK_URL)"""
+    return urlparse(config.WEBHOOK_URL).path or "/"
+
+
+async def telegram_handler(request: web.Request) -> web.Response:
+    """Принять обновление от Telegram"""
+    secret = request.headers.get(SECRET_HEADER, "")
+    if not hmac.compare_digest(secret, config.WEBHOOK_SECRET):
+        logger.warning(f"Webhook: неверный секрет от {request.remote}")
+        return web.Response(status=403)
+
+    app = request.app[TELEGRAM_APP_KEY]
+    try:
+        update = Update.de_json(await request.json(), app.bot)
+    except Exception as e:
+        logger.warning(f"Webhook: некорректное обновление: {e}")
+        return web.Response(status=400)
+
+    try:
+        app.update_queue.put_nowait(update)
+    except asyncio.QueueFull:
+        logger.warning("Webhook: очередь обновлений переполнена")
+        return web.Response(status=503)
+
+    return web.Response()
+
+
+async def health_handler(request: web.Request) -> web.Response:
+    """Состояние процесса: приложение запущено, заполненность очереди"""
+    app = request.app[TELEGRAM_APP_KEY]
+    queue = app.update_queue
+    return web.json_response(
+        {
+            "status": "ok" if app.running else "stopped",
+            "queue_size": queue.qsize(),
+            "queue_max": queue.maxsize,
+        },
+        status=200 if app.running else 503
+    )
+
+
+def create_web_app(app: Application) -> web.Application:
+    """aiohttp-приложение с маршрутами webhook и /health"""
+    web_app = web.Application()
+    web_app[TELEGRAM_APP_KEY] = app
+    web_app.router.add_post(webhook_path(), telegram_handler)
+    web_app.router.add_get("/health", health_handler)
+    return web_app
+
+
+async def run_webhook(app: Application, allowed_updates: list):
+    """Запуск бота в режиме webhook (до SIGINT/SIGTERM)"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = web.AppRunner(create_web_app(app), access_log=None)
+
+    async with app:
+        if app.post_init:
+            await app.post_init(app)
+
+        await app.bot.set_webhook(
+            url=config.WEBHOOK_URL,
+            secret_token=config.WEBHOOK_SECRET,
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=allowed_updates
+        )
+        await app.start()
+
+        await runner.setup()
+        site = web.TCPSite(runner, config.WEBHOOK_LISTEN, config.PORT)
+        await site.start()
+        logger.info(f"Webhook: слушаю {config.WEBHOOK_LISTEN}:{config.PORT}{webhook_path()}")
+
+        try:
+            await stop.wait()
+        finally:
+            await runner.cleanup()
+            await app.stop()
+            if app.post_shutdown:
+                await app.post_shutdown(app)
@@ -0,0 +1,16 @@
+-- Уведомление об изменении уроков
+-- Каталог уроков в памяти (bot/database/lesson_catalog.py) слушает канал
+-- lessons_changed и перечитывает таблицу — все воркеры видят одни данные
+
+CREATE OR REPLACE FUNCTION notify_lessons_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('lessons_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS lessons_changed ON lessons;
+
+CREATE TRIGGER lessons_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON lessons
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_lessons_changed();
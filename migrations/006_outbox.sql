@@ -0,0 +1,26 @@
+-- Очередь исходящих сообщений (outbox)
+-- Планировщик только ставит сообщения в очередь, отправляет фоновый обработчик
+-- (bot/services/outbox.py). Сообщения переживают перезапуск и сбои Telegram.
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGSERIAL PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    text TEXT NOT NULL,
+    kind VARCHAR(30) NOT NULL,                      -- lesson_unlock, reminder_soft, reminder_strong
+    dedupe_key VARCHAR(100),                        -- не ставить одно и то же дважды
+    status VARCHAR(20) NOT NULL DEFAULT 'PENDING',  -- PENDING, SENDING, DELIVERED, FAILED
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMP,                         -- аренда SENDING (на случай падения воркера)
+    created_at TIMESTAMP DEFAULT NOW(),
+    sent_at TIMESTAMP
+);
+
+-- Дубликат запрещён, пока сообщение ещё не доставлено
+CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_dedupe
+    ON outbox(dedupe_key) WHERE status IN ('PENDING', 'SENDING');
+
+-- Выборка готовых к отправке
+CREATE INDEX IF NOT EXISTS idx_outbox_pending
+    ON outbox(next_attempt_at) WHERE status = 'PENDING';
@@ -0,0 +1,12 @@
+-- Таймеры открытия уроков: время открытия следующего урока считается
+-- при завершении текущего (см. complete_lesson), планировщик раз в минуту
+-- выбирает только наступившие таймеры по индексу — без полного сканирования.
+
+ALTER TABLE user_progress ADD COLUMN IF NOT EXISTS unlock_at TIMESTAMP;
+
+-- Частичный индекс: только взведённые таймеры
+CREATE INDEX IF NOT EXISTS idx_user_progress_unlock_at
+    ON user_progress(unlock_at) WHERE unlock_at IS NOT NULL;
+
+-- Таймеры для уроков, завершённых до миграции, взводит arm_missing_unlock_timers
+-- при старте бота: правило зависит от TIMEZONE / UNLOCK_HOUR из конфигурации.
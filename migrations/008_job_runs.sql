@@ -0,0 +1,14 @@
+-- Метаданные задач планировщика
+-- Задачи запускаются под advisory lock (см. bot/services/scheduler.py),
+-- поэтому при нескольких worker-ах каждая выполняется одним процессом.
+-- Здесь — кто и когда запускал задачу последним и с каким результатом.
+
+CREATE TABLE IF NOT EXISTS job_runs (
+    job_name VARCHAR(100) PRIMARY KEY,
+    instance VARCHAR(100) NOT NULL,          -- DYNO / hostname:pid
+    status VARCHAR(20) NOT NULL,             -- RUNNING, OK, ERROR
+    started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMP,
+    error TEXT,
+    runs BIGINT NOT NULL DEFAULT 0
+);
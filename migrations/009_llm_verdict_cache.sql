@@ -0,0 +1,16 @@
+-- Кэш вердиктов LLM по повторяющимся ответам на ДЗ
+-- Ключ: отпечаток промпта урока + хэш нормализованного ответа
+-- (см. bot/services/verdict_cache.py). Промпт изменился — ключи другие.
+
+CREATE TABLE IF NOT EXISTS llm_verdict_cache (
+    prompt_fingerprint VARCHAR(16) NOT NULL,
+    answer_hash CHAR(64) NOT NULL,                -- sha256 нормализованного ответа
+    verdict VARCHAR(20) NOT NULL,                 -- ACCEPT, REVISE
+    message TEXT NOT NULL,
+    hits INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (prompt_fingerprint, answer_hash)
+);
+
+-- Очистка устаревших записей (TTL)
+CREATE INDEX IF NOT EXISTS idx_llm_verdict_cache_created_at ON llm_verdict_cache(created_at);
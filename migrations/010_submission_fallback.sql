@@ -0,0 +1,6 @@
+-- Пометка вердиктов, выставленных без модели (OpenAI недоступен,
+-- circuit breaker разомкнут) — такие сдачи перепроверяем позже
+
+ALTER TABLE submissions ADD COLUMN IF NOT EXISTS is_fallback BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_submissions_fallback ON submissions(created_at) WHERE is_fallback;
@@ -0,0 +1,20 @@
+-- Телеметрия запросов к LLM: задержка, токены, исход
+-- Пишется пачками фоновым обработчиком (bot/services/telemetry.py),
+-- сводка — команда /llmstat
+
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id BIGSERIAL PRIMARY KEY,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    model VARCHAR(50) NOT NULL,
+    lesson_number INT NOT NULL,
+    prompt_fingerprint VARCHAR(16),
+    prompt_tokens INT NOT NULL DEFAULT 0,
+    completion_tokens INT NOT NULL DEFAULT 0,
+    cached_tokens INT NOT NULL DEFAULT 0,           -- часть prompt_tokens из кэша промптов OpenAI
+    latency_ms INT NOT NULL DEFAULT 0,
+    outcome VARCHAR(20) NOT NULL,                   -- ok, error, timeout, bad_response, circuit_open
+    fallback_reason TEXT,                           -- текст ошибки, если вердикт выставлен без модели
+    streamed BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_calls_created_at ON llm_calls(created_at);
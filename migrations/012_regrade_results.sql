@@ -0,0 +1,13 @@
+-- Результаты массовой перепроверки сдач (python -m bot.regrade)
+-- Один прогон — один run_id; сравнение с исходным submissions.ai_verdict.
+-- Fallback-вердикты (модель недоступна) не сохраняются — сдача войдёт в следующий прогон.
+
+CREATE TABLE IF NOT EXISTS regrade_results (
+    run_id VARCHAR(64) NOT NULL,
+    submission_id INT NOT NULL REFERENCES submissions(id) ON DELETE CASCADE,
+    prompt_fingerprint VARCHAR(16),
+    verdict VARCHAR(20) NOT NULL,                  -- ACCEPT, REVISE
+    message TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (run_id, submission_id)
+);
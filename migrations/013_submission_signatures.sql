@@ -0,0 +1,15 @@
+-- MinHash-подписи текстовых сдач (индекс похожих ответов, bot/services/similarity.py)
+-- signature NULL — ответ слишком короткий для сравнения.
+-- duplicate_of — сдача, с которой совпал ответ (вердикт переиспользован).
+
+CREATE TABLE IF NOT EXISTS submission_signatures (
+    submission_id INT PRIMARY KEY REFERENCES submissions(id) ON DELETE CASCADE,
+    lesson_id INT NOT NULL REFERENCES lessons(id) ON DELETE CASCADE,
+    signature BYTEA,
+    duplicate_of INT REFERENCES submissions(id) ON DELETE SET NULL,
+    similarity REAL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_submission_signatures_duplicate
+    ON submission_signatures(duplicate_of) WHERE duplicate_of IS NOT NULL;
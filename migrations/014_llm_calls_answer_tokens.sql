@@ -0,0 +1,5 @@
+-- Размер ответа студента в телеметрии LLM (bot/services/answer_budget.py):
+-- оценка токенов до подготовки и отправленное в модель после сокращения до бюджета урока
+
+ALTER TABLE llm_calls ADD COLUMN IF NOT EXISTS answer_tokens INT NOT NULL DEFAULT 0;
+ALTER TABLE llm_calls ADD COLUMN IF NOT EXISTS answer_tokens_sent INT NOT NULL DEFAULT 0;
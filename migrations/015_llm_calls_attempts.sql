@@ -0,0 +1,5 @@
+-- Повторы запросов к LLM (bot/services/retry.py): каждая попытка — отдельная строка llm_calls.
+-- attempt — номер попытки, hedged — ответил страхующий второй запрос
+
+ALTER TABLE llm_calls ADD COLUMN IF NOT EXISTS attempt INT NOT NULL DEFAULT 1;
+ALTER TABLE llm_calls ADD COLUMN IF NOT EXISTS hedged BOOLEAN NOT NULL DEFAULT FALSE;
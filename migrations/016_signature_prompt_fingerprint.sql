@@ -0,0 +1,6 @@
+-- Отпечаток промпта, которым проверена сдача: похожий ответ получает её вердикт,
+-- только если промпт урока с тех пор не менялся (задание или контекст урока).
+-- NULL — промпт неизвестен (сдачи до этой миграции, фоновое заполнение):
+-- такие подписи в индекс не загружаются, их вердикты не переиспользуются.
+
+ALTER TABLE submission_signatures ADD COLUMN IF NOT EXISTS prompt_fingerprint VARCHAR(16);
@@ -19,13 +19,23 @@ os.environ.update({
     "OPENAI_API_KEY": "test_key",
     "CURATOR_ID": "123456789",
     "ADMIN_IDS": "123456789",
-    "TIMEZONE": "UTC"
+    "TIMEZONE": "UTC",
+    # Симуляции «перематывают» дни — пауза 1 сек между сообщениями в чат не нужна
+    "SEND_PER_CHAT_INTERVAL": "0",
+    # Урок открывается в полночь через 2 календарных дня (как прежнее completed_at::date + 2)
+    "UNLOCK_DELAY_DAYS": "2",
+    "UNLOCK_HOUR": "0"
 })
 
 from bot.database import queries as db
 from bot.database import connection as db_connection
 from bot.database.connection import get_pool, close_pool
+from bot.database.lesson_catalog import lesson_catalog
 from bot.database.migrations import run_migrations
+from bot.services.circuit_breaker import openai_breaker
+from bot.services.grading import grading_pool
+from bot.services.similarity import similarity_index
+from bot.services.verdict_cache import verdict_cache
 
 
 # ============================================
@@ -98,6 +108,9 @@ async def db_pool():
                 enrolled_at TIMESTAMP DEFAULT NOW()
             )
         """)
+        await conn.execute(
+            "ALTER TABLE enrollments ADD COLUMN IF NOT EXISTS start_date TIMESTAMP DEFAULT NOW()"
+        )
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS user_progress (
                 id SERIAL PRIMARY KEY,
@@ -108,6 +121,13 @@ async def db_pool():
                 UNIQUE(user_id, lesson_id)
             )
         """)
+        await conn.execute(
+            "ALTER TABLE user_progress ADD COLUMN IF NOT EXISTS unlock_at TIMESTAMP"
+        )
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_user_progress_unlock_at
+            ON user_progress(unlock_at) WHERE unlock_at IS NOT NULL
+        """)
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS submissions (
                 id SERIAL PRIMARY KEY,
@@ -120,6 +140,9 @@ async def db_pool():
                 created_at TIMESTAMP DEFAULT NOW()
             )
         """)
+        await conn.execute(
+            "ALTER TABLE submissions ADD COLUMN IF NOT EXISTS is_fallback BOOLEAN NOT NULL DEFAULT FALSE"
+        )
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS access_codes (
                 id SERIAL PRIMARY KEY,
@@ -151,9 +174,118 @@ async def db_pool():
                 created_at TIMESTAMP DEFAULT NOW()
             )
         """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id BIGSERIAL PRIMARY KEY,
+                chat_id BIGINT NOT NULL,
+                text TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                dedupe_key TEXT,
+                status TEXT NOT NULL DEFAULT 'PENDING',
+                attempts INT NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                locked_until TIMESTAMP,
+                created_at TIMESTAMP DEFAULT NOW(),
+                sent_at TIMESTAMP
+            )
+        """)
+        await conn.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_dedupe
+            ON outbox(dedupe_key) WHERE status IN ('PENDING', 'SENDING')
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_runs (
+                job_name TEXT PRIMARY KEY,
+                instance TEXT NOT NULL,
+                status TEXT NOT NULL,
+                started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                finished_at TIMESTAMP,
+                error TEXT,
+                runs BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_verdict_cache (
+                prompt_fingerprint TEXT NOT NULL,
+                answer_hash TEXT NOT NULL,
+                verdict TEXT NOT NULL,
+                message TEXT NOT NULL,
+                hits INT NOT NULL DEFAULT 0,
+                created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (prompt_fingerprint, answer_hash)
+            )
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS regrade_results (
+                run_id TEXT NOT NULL,
+                submission_id INT NOT NULL REFERENCES submissions(id) ON DELETE CASCADE,
+                prompt_fingerprint TEXT,
+                verdict TEXT NOT NULL,
+                message TEXT,
+                created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (run_id, submission_id)
+            )
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS submission_signatures (
+                submission_id INT PRIMARY KEY REFERENCES submissions(id) ON DELETE CASCADE,
+                lesson_id INT NOT NULL REFERENCES lessons(id) ON DELETE CASCADE,
+                signature BYTEA,
+                duplicate_of INT REFERENCES submissions(id) ON DELETE SET NULL,
+                similarity REAL,
+                created_at TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+        """)
+        await conn.execute(
+            "ALTER TABLE submission_signatures ADD COLUMN IF NOT EXISTS prompt_fingerprint TEXT"
+        )
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_calls (
+                id BIGSERIAL PRIMARY KEY,
+                created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                model TEXT NOT NULL,
+                lesson_number INT NOT NULL,
+                prompt_fingerprint TEXT,
+                prompt_tokens INT NOT NULL DEFAULT 0,
+                completion_tokens INT NOT NULL DEFAULT 0,
+                cached_tokens INT NOT NULL DEFAULT 0,
+                latency_ms INT NOT NULL DEFAULT 0,
+                outcome TEXT NOT NULL,
+                fallback_reason TEXT,
+                streamed BOOLEAN NOT NULL DEFAULT FALSE
+            )
+        """)
+        await conn.execute(
+            "ALTER TABLE llm_calls ADD COLUMN IF NOT EXISTS answer_tokens INT NOT NULL DEFAULT 0"
+        )
+        await conn.execute(
+            "ALTER TABLE llm_calls ADD COLUMN IF NOT EXISTS answer_tokens_sent INT NOT NULL DEFAULT 0"
+        )
+        await conn.execute("ALTER TABLE llm_calls ADD COLUMN IF NOT EXISTS attempt INT NOT NULL DEFAULT 1")
+        await conn.execute("ALTER TABLE llm_calls ADD COLUMN IF NOT EXISTS hedged BOOLEAN NOT NULL DEFAULT FALSE")
+        # NOTIFY об изменении уроков (см. migrations/005_lessons_notify.sql)
+        await conn.execute("""
+            CREATE OR REPLACE FUNCTION notify_lessons_changed() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_notify('lessons_changed', TG_OP);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        await conn.execute("DROP TRIGGER IF EXISTS lessons_changed ON lessons")
+        await conn.execute("""
+            CREATE TRIGGER lessons_changed
+                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON lessons
+                FOR EACH STATEMENT EXECUTE FUNCTION notify_lessons_changed()
+        """)
     
     # Очищаем данные
     async with pool.acquire() as conn:
+        await conn.execute("TRUNCATE TABLE outbox")
+        await conn.execute("TRUNCATE TABLE job_runs")
+        await conn.execute("TRUNCATE TABLE llm_verdict_cache")
+        await conn.execute("TRUNCATE TABLE llm_calls")
         await conn.execute("TRUNCATE TABLE support_questions CASCADE")
         await conn.execute("TRUNCATE TABLE reminders CASCADE")
         await conn.execute("TRUNCATE TABLE submissions CASCADE")
@@ -165,6 +297,11 @@ async def db_pool():
     
     yield pool
 
+    # Сбрасываем каталог уроков, кэш вердиктов и индекс похожих ответов (синглтоны живут между тестами)
+    await lesson_catalog.stop()
+    verdict_cache.clear_memory()
+    similarity_index.clear()
+
     # Сбрасываем глобальный пул из bot.database.connection
     # чтобы следующий тест получил новый пул
     if db_connection._pool is not None:
@@ -178,6 +315,21 @@ async def db_pool():
     await pool.close()
 
 
+@pytest.fixture(autouse=True)
+def reset_openai_breaker():
+    """Breaker OpenAI — синглтон: ошибки одного теста не должны размыкать его для других"""
+    openai_breaker.reset()
+    yield
+    openai_breaker.reset()
+
+
+@pytest.fixture(autouse=True)
+def reset_grading_pool():
+    """Очередь проверки — синглтон: у каждого теста свой event loop, семафор создаём заново"""
+    grading_pool.start()
+    yield
+
+
 # ============================================
 # Data Fixtures
 # ============================================
@@ -265,6 +417,29 @@ async def enrolled_user(sample_user, sample_lessons, db_pool):
 # Mock Fixtures
 # ============================================
 
+@pytest.fixture
+def mock_update():
+    """Фабрика мока Update с текстовым сообщением"""
+    def _make(user_id: int, text: str = "", reply_to_message=None):
+        update = Mock()
+        update.effective_user.id = user_id
+        update.effective_user.username = "test_user"
+        update.effective_user.full_name = "Test User"
+        update.message.text = text
+        update.message.voice = None
+        update.message.reply_to_message = reply_to_message
+        update.message.reply_text = AsyncMock()
+        return update
+    return _make
+
+
+@pytest.fixture
+def mock_context(mock_bot):
+    """Контекст хендлера (простой объект — без авто-атрибутов Mock)"""
+    from types import SimpleNamespace
+    return SimpleNamespace(user_data={}, bot=mock_bot, args=[])
+
+
 @pytest.fixture
 def mock_bot():
     """Мок Telegram бота"""
@@ -0,0 +1,149 @@
+"""
+Тесты подготовки ответа к отправке в модель (bot/services/answer_budget.py)
+"""
+
+import json
+import random
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from bot.services import llm
+from bot.services.answer_budget import (
+    answer_budget, count_tokens, prepare_answer,
+    STEP_CLEANED, STEP_CONDENSED, STEP_DEDUPED
+)
+from bot.services.telemetry import llm_telemetry
+
+PARAGRAPH = (
+    "Тренинг — это активное обучение через практику и собственный опыт участников. "
+    "Урок в школе чаще строится на передаче готовых знаний от учителя. "
+    "На тренинге важна групповая динамика и обратная связь от ведущего."
+)
+
+
+def long_story(words: int) -> str:
+    """Длинный связный по форме текст без повторов (чтобы пройти предпроверку)"""
+    rng = random.Random(7)
+    syllables = ["ра", "то", "ли", "ме", "ко", "ну", "ве", "ста", "при", "дом", "лес", "ор"]
+    sentences = []
+    for _ in range(words // 8):
+        sentence = " ".join("".join(rng.choice(syllables) for _ in range(3)) for _ in range(8))
+        sentences.append(sentence.capitalize() + ".")
+    return " ".join(sentences)
+
+
+def six_parts(repeat: int) -> str:
+    """Ответ из шести частей, каждая — repeat раз PARAGRAPH"""
+    return "\n\n".join(f"{n}. " + " ".join([PARAGRAPH] * repeat) for n in range(1, 7))
+
+
+def test_count_tokens():
+    """
+    Тест: оценка токенов — слова по длине, знаки препинания по одному
+    """
+    assert count_tokens("") == 0
+    assert count_tokens("hello world") == 4
+    assert count_tokens("Привет, мир!") == 2 + 1 + 1 + 1
+    assert count_tokens(PARAGRAPH) > len(PARAGRAPH.split())
+
+
+def test_clean_and_dedupe():
+    """
+    Тест: шум и повторно вставленные абзацы убираются, короткий ответ не сокращается
+    """
+    text = f"  {PARAGRAPH}​!!!!!!!\n\n\n\n{PARAGRAPH}!!!\n\nИ   ещё   вывод."
+
+    prepared = prepare_answer(text, budget=1000)
+
+    assert prepared.text == f"{PARAGRAPH}!!!\n\nИ ещё вывод."
+    assert prepared.steps == (STEP_CLEANED, STEP_DEDUPED)
+    assert not prepared.trimmed
+    assert prepared.tokens < prepared.original_tokens
+
+
+def test_condense_keeps_every_part():
+    """
+    Тест: длинный ответ сокращается до бюджета, все шесть частей на месте
+    """
+    text = six_parts(repeat=4)
+    budget = 400
+
+    prepared = prepare_answer(text, budget)
+
+    assert prepared.trimmed and STEP_CONDENSED in prepared.steps
+    assert prepared.original_tokens > budget >= prepared.tokens
+    parts = prepared.text.split("\n\n")
+    assert [p[:2] for p in parts[:6]] == ["1.", "2.", "3.", "4.", "5.", "6."]
+    assert all(p.endswith("[…]") for p in parts[:6])
+    assert parts[-1].startswith("[Ответ сокращён автоматически")
+
+
+def test_many_paragraphs_keep_leading():
+    """
+    Тест: много абзацев средней длины — доля каждого меньше минимума,
+    ответ не пустеет: первые абзацы целиком, в пределах бюджета
+    """
+    parts = [f"{n}. {PARAGRAPH}" for n in range(1, 121)]
+    text = "\n\n".join(parts)
+    budget = 1200
+
+    prepared = prepare_answer(text, budget)
+    body = prepared.text.rsplit("\n\n", 1)[0]
+
+    assert prepared.trimmed
+    assert prepared.original_tokens > budget >= prepared.tokens
+    assert body.startswith(parts[0])
+    assert count_tokens(body) > budget // 2
+
+
+def test_prepared_answer_within_budget():
+    """
+    Тест (свойство): на случайных ответах результат не длиннее бюджета и не пустой
+    """
+    rng = random.Random(11)
+    story = long_story(words=4000).split(". ")
+
+    for _ in range(300):
+        parts = []
+        for _ in range(rng.randint(1, 40)):
+            start = rng.randrange(len(story))
+            parts.append(". ".join(story[start:start + rng.randint(1, 12)]) + ".")
+        budget = rng.randint(60, 1500)
+
+        prepared = prepare_answer("\n\n".join(parts), budget)
+
+        body = prepared.text.rsplit("\n\n", 1)[0] if prepared.trimmed else prepared.text
+        assert prepared.tokens <= budget
+        assert body.strip(" […]")
+
+
+def test_lesson_budget_override():
+    """
+    Тест: бюджет урока из контекста, иначе общий
+    """
+    assert answer_budget(12) > answer_budget(1) == llm.config.LLM_ANSWER_TOKEN_BUDGET
+
+
+@pytest.mark.asyncio
+async def test_trimmed_answer_sent_and_recorded():
+    """
+    Тест: в модель уходит сокращённый ответ, размеры — в телеметрии
+    """
+    content = json.dumps({"verdict": "ACCEPT", "message": "Хорошо"}, ensure_ascii=False)
+    create = AsyncMock(return_value=SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None
+    ))
+    text = long_story(words=3000)
+
+    with patch.object(llm.client.chat.completions, "create", create), \
+            patch.object(llm.config, "LLM_CACHE_ENABLED", False):
+        result = await llm.check_homework_with_ai(2, "Урок 2", "Задание", text)
+
+    assert result["verdict"] == "ACCEPT"
+    sent = create.call_args.kwargs["messages"][-1]["content"]
+    assert count_tokens(sent) <= answer_budget(2) + 10
+    call = llm_telemetry._buffer[-1]
+    assert call.answer_tokens == count_tokens(text)
+    assert call.answer_tokens_sent <= answer_budget(2)
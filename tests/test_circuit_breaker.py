@@ -0,0 +1,159 @@
+"""
+Тесты circuit breaker-а OpenAI (bot/services/circuit_breaker.py)
+"""
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from bot.services import llm
+from bot.services.circuit_breaker import BreakerState, CircuitBreaker, openai_breaker
+
+ANSWER = (
+    "Тренинг — это активное обучение через практику и собственный опыт участников, "
+    "а урок в школе чаще строится на передаче готовых знаний от учителя."
+)
+
+
+def advance(breaker: CircuitBreaker, seconds: float):
+    """Сдвинуть момент размыкания в прошлое (вместо ожидания)"""
+    breaker._opened_at -= seconds
+
+
+# ============================================
+# Tests: CircuitBreaker
+# ============================================
+
+def test_breaker_trips_after_threshold():
+    """
+    Тест: N ошибок подряд — размыкание, запросы не пропускаются
+    """
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == BreakerState.CLOSED
+
+    breaker.record_failure()
+
+    assert breaker.state == BreakerState.OPEN
+    assert not breaker.allow()
+    assert breaker.stats.trips == 1
+    assert breaker.stats.short_circuited == 1
+
+
+def test_breaker_success_resets_failures():
+    """
+    Тест: успех обнуляет счётчик ошибок подряд
+    """
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.state == BreakerState.CLOSED
+
+
+def test_breaker_half_open_single_probe():
+    """
+    Тест: после reset_timeout пропускается ровно один пробный запрос
+    """
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    advance(breaker, 31)
+
+    assert breaker.allow()
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_failed_probe_reopens():
+    """
+    Тест: ошибка пробного запроса — снова OPEN на reset_timeout
+    """
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    advance(breaker, 31)
+
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == BreakerState.OPEN
+    assert not breaker.allow()
+
+
+# ============================================
+# Tests: check_homework_with_ai() + breaker
+# ============================================
+
+@pytest.mark.asyncio
+async def test_check_homework_fails_fast_when_open():
+    """
+    Тест: после N ошибок API модель не вызывается, fallback помечен
+    """
+    create = AsyncMock(side_effect=TimeoutError("timeout"))
+
+    with patch.object(llm.config, "LLM_CACHE_ENABLED", False), \
+            patch.object(llm.client.chat.completions, "create", create):
+        for _ in range(openai_breaker.failure_threshold):
+            result = await llm.check_homework_with_ai(1, "Урок 1", "Задание", ANSWER)
+            assert result["fallback"] is True
+        assert openai_breaker.state == BreakerState.OPEN
+
+        result = await llm.check_homework_with_ai(1, "Урок 1", "Задание", ANSWER)
+
+    assert create.call_count == openai_breaker.failure_threshold
+    assert result["verdict"] == "ACCEPT"
+    assert result["message"] in llm.FALLBACK_ACCEPT
+    assert result["fallback"] is True
+
+
+@pytest.mark.asyncio
+async def test_check_homework_probe_closes_breaker():
+    """
+    Тест: успешный пробный запрос замыкает breaker, вердикт модели без пометки
+    """
+    response = AsyncMock()
+    response.choices = [AsyncMock()]
+    response.choices[0].message.content = '{"verdict": "REVISE", "message": "Подробнее"}'
+    create = AsyncMock(return_value=response)
+
+    for _ in range(openai_breaker.failure_threshold):
+        openai_breaker.record_failure()
+    advance(openai_breaker, openai_breaker.reset_timeout + 1)
+
+    with patch.object(llm.config, "LLM_CACHE_ENABLED", False), \
+            patch.object(llm.client.chat.completions, "create", create):
+        result = await llm.check_homework_with_ai(1, "Урок 1", "Задание", ANSWER)
+
+    assert result == {"verdict": "REVISE", "message": "Подробнее", "fallback": False}
+    assert openai_breaker.state == BreakerState.CLOSED
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_fallback_verdict_flagged_in_submission(enrolled_user):
+    """
+    Тест: fallback-вердикт сохраняется с is_fallback
+    """
+    from bot.database import queries as db
+
+    user_id = enrolled_user["user"]["tg_id"]
+    lesson_id = enrolled_user["current_lesson_id"]
+
+    submission = await db.record_homework_submission(
+        user_id, lesson_id, ANSWER, "text", "ACCEPT", "ок", "idle", is_fallback=True
+    )
+    graded = await db.create_submission(user_id, lesson_id, ANSWER, "text", "ACCEPT", "ок")
+
+    assert submission.is_fallback is True
+    assert graded.is_fallback is False
@@ -14,11 +14,12 @@ from unittest.mock import AsyncMock
 from bot.database import queries as db
 from bot.database.connection import get_pool
 from bot.services import scheduler
+from bot.services.outbox import drain_outbox
 
 
 # ============================================
 # Edge Cases: Time Boundaries (логика +2 дня)
-# Важно: SQL использует completed_at::date + 2 <= CURRENT_DATE
+# Важно: таймер unlock_at = дата завершения + 2 дня (UNLOCK_HOUR=0 в тестах)
 # Это означает сравнение по календарным ДАТАМ, не по часам
 # ============================================
 
@@ -26,7 +27,7 @@ from bot.services import scheduler
 async def test_edge_exactly_2_days_ago(sample_lessons, enrolled_user, mock_bot):
     """
     Edge Case: Урок завершён ровно 2 дня назад → попадает в список
-    SQL: completed_at::date + 2 <= CURRENT_DATE
+    Таймер: unlock_at = completed_at::date + 2 <= сейчас
     Если completed_at = позавчера, то позавчера + 2 = сегодня <= сегодня = TRUE
     """
     pool = await get_pool()
@@ -38,7 +39,7 @@ async def test_edge_exactly_2_days_ago(sample_lessons, enrolled_user, mock_bot):
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, lesson_id, completed_at
@@ -53,7 +54,7 @@ async def test_edge_exactly_2_days_ago(sample_lessons, enrolled_user, mock_bot):
 async def test_edge_1_day_ago_not_enough(sample_lessons, enrolled_user, mock_bot):
     """
     Edge Case: Урок завершён 1 день назад → НЕ попадает (нужно 2 дня)
-    SQL: completed_at::date + 2 <= CURRENT_DATE
+    Таймер: unlock_at = completed_at::date + 2 <= сейчас
     Если completed_at = вчера, то вчера + 2 = завтра <= сегодня = FALSE
     """
     pool = await get_pool()
@@ -65,7 +66,7 @@ async def test_edge_1_day_ago_not_enough(sample_lessons, enrolled_user, mock_bot
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, lesson_id, completed_at
@@ -80,7 +81,7 @@ async def test_edge_1_day_ago_not_enough(sample_lessons, enrolled_user, mock_bot
 async def test_edge_same_day_not_enough(sample_lessons, enrolled_user, mock_bot):
     """
     Edge Case: Урок завершён сегодня → НЕ попадает
-    SQL: completed_at::date + 2 <= CURRENT_DATE
+    Таймер: unlock_at = completed_at::date + 2 <= сейчас
     Если completed_at = сегодня, то сегодня + 2 = послезавтра <= сегодня = FALSE
     """
     pool = await get_pool()
@@ -92,7 +93,7 @@ async def test_edge_same_day_not_enough(sample_lessons, enrolled_user, mock_bot)
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, lesson_id, completed_at
@@ -117,7 +118,7 @@ async def test_edge_3_days_ago(sample_lessons, enrolled_user, mock_bot):
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, lesson_id, completed_at
@@ -144,7 +145,7 @@ async def test_edge_lesson_1_to_2(sample_lessons, enrolled_user, mock_bot):
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, sample_lessons[0]["id"], datetime.utcnow() - timedelta(days=2)
@@ -182,8 +183,8 @@ async def test_edge_lesson_17_to_18(sample_lessons, db_pool, mock_bot):
 
     await pool.execute(
         """
-        INSERT INTO user_progress (user_id, lesson_id, status, completed_at)
-        VALUES ($1, $2, 'COMPLETED', $3)
+        INSERT INTO user_progress (user_id, lesson_id, status, completed_at, unlock_at)
+        VALUES ($1, $2, 'COMPLETED', $3, $3::timestamp::date + 2)
         """,
         user_id, sample_lessons[16]["id"], datetime.utcnow() - timedelta(days=2)
     )
@@ -239,19 +240,19 @@ async def test_edge_concurrent_scheduler_runs(sample_lessons, enrolled_user, moc
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, lesson_id, datetime.utcnow() - timedelta(days=2)
     )
 
     # Запускаем scheduler дважды параллельно
-    scheduler.set_bot(mock_bot)
     import asyncio
     await asyncio.gather(
         scheduler.check_lesson_unlocks(),
         scheduler.check_lesson_unlocks()
     )
+    await drain_outbox(mock_bot)
 
     # Проверяем — урок открыт только один раз
     count = await pool.fetchval(
@@ -281,7 +282,7 @@ async def test_edge_user_activity_during_unlock(sample_lessons, enrolled_user, m
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, lesson_id, datetime.utcnow() - timedelta(days=2)
@@ -291,8 +292,8 @@ async def test_edge_user_activity_during_unlock(sample_lessons, enrolled_user, m
     await db.update_last_activity(user_id)
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем — урок всё равно открывается
     assert await pool.fetchval(
@@ -323,9 +324,10 @@ async def test_edge_missing_enrollment(sample_lessons, db_pool, mock_bot):
     )
 
     # Запускаем scheduler — не должно быть ошибок
-    scheduler.set_bot(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
 
     # Проверяем — уведомления не отправлялись
     assert not mock_bot.send_message.called
@@ -358,8 +360,8 @@ async def test_edge_missing_user_progress(sample_lessons, db_pool, mock_bot):
     )
 
     # Запускаем scheduler — не должно быть ошибок
-    scheduler.set_bot(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем — уведомления не отправлялись
     assert not mock_bot.send_message.called
@@ -385,8 +387,8 @@ async def test_edge_corrupted_completed_at(sample_lessons, enrolled_user, mock_b
     )
 
     # Запускаем scheduler — не должно быть ошибок
-    scheduler.set_bot(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем — пользователь НЕ попадает в список
     users = await db.get_users_ready_for_next_lesson()
@@ -501,9 +503,9 @@ async def test_edge_reminder_both_sent(sample_lessons, db_pool, mock_bot):
 # ============================================
 
 @pytest.mark.asyncio
-async def test_edge_bot_not_set(sample_lessons, enrolled_user):
+async def test_edge_unlock_without_bot(sample_lessons, enrolled_user):
     """
-    Edge Case: _bot = None (не установлен)
+    Edge Case: задача открытия не обращается к боту (уведомления — через outbox)
     """
     pool = await get_pool()
     user_id = enrolled_user["user"]["tg_id"]
@@ -513,15 +515,12 @@ async def test_edge_bot_not_set(sample_lessons, enrolled_user):
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, lesson_id, datetime.utcnow() - timedelta(days=2)
     )
 
-    # Не устанавливаем бота
-    scheduler.set_bot(None)
-
     # Запускаем scheduler — не должно быть ошибок
     await scheduler.check_lesson_unlocks()
 
@@ -546,7 +545,7 @@ async def test_edge_bot_send_message_exception(sample_lessons, enrolled_user, mo
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, lesson_id, datetime.utcnow() - timedelta(days=2)
@@ -556,8 +555,8 @@ async def test_edge_bot_send_message_exception(sample_lessons, enrolled_user, mo
     mock_bot.send_message.side_effect = Exception("Network error")
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем — урок всё равно открылся
     enrollment = await pool.fetchrow(
@@ -600,15 +599,15 @@ async def test_edge_large_number_of_users(sample_lessons, db_pool, mock_bot):
 
         await pool.execute(
             """
-            INSERT INTO user_progress (user_id, lesson_id, status, completed_at)
-            VALUES ($1, $2, 'COMPLETED', $3)
+            INSERT INTO user_progress (user_id, lesson_id, status, completed_at, unlock_at)
+            VALUES ($1, $2, 'COMPLETED', $3, $3::timestamp::date + 2)
             """,
             user_id, sample_lessons[0]["id"], completed_at
         )
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем — всем отправлены уведомления
     assert mock_bot.send_message.call_count == 100
@@ -0,0 +1,119 @@
+"""
+Тесты локального фейка OpenAI (bot/fake_openai.py)
+
+check_homework_with_ai проходит весь путь через настоящий AsyncOpenAI и HTTP.
+"""
+
+import asyncio
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, patch
+
+from aiohttp.test_utils import TestServer
+from openai import AsyncOpenAI
+
+from bot.fake_openai import FakeOpenAI, FakeOpenAIConfig
+from bot.services import llm
+from bot.services.retry import llm_retry_policy
+from bot.services.telemetry import llm_telemetry, OUTCOME_ERROR, OUTCOME_OK
+
+ANSWER = (
+    "Тренинг — это активное обучение через практику и собственный опыт участников, "
+    "а урок в школе чаще строится на передаче готовых знаний от учителя."
+)
+
+
+@pytest_asyncio.fixture
+async def fake_api():
+    """Фабрика: поднять фейк с заданной конфигурацией и направить на него llm.client"""
+    servers = []
+
+    async def _start(**kwargs) -> FakeOpenAI:
+        fake = FakeOpenAI(FakeOpenAIConfig(latency_ms=0, seed=1, **kwargs))
+        server = TestServer(fake.create_app())
+        await server.start_server()
+        servers.append(server)
+        llm.client = AsyncOpenAI(api_key="test", base_url=str(server.make_url("/v1")), max_retries=0)
+        return fake
+
+    original_client = llm.client
+    with patch.object(llm.config, "LLM_CACHE_ENABLED", False):
+        yield _start
+
+    llm.client = original_client
+    for server in servers:
+        await server.close()
+
+
+@pytest.mark.asyncio
+async def test_scripted_verdicts_and_usage(fake_api):
+    """
+    Тест: вердикты по правилам и по кругу; токены и кэш префикса попадают в телеметрию
+    """
+    await fake_api(verdicts=["ACCEPT", "REVISE"], rules=[("плагиат", "REVISE")])
+
+    first = await llm.check_homework_with_ai(1, "Урок 1", "Задание", ANSWER)
+    first_call = llm_telemetry._buffer[-1]
+    second = await llm.check_homework_with_ai(1, "Урок 1", "Задание", ANSWER)
+    second_call = llm_telemetry._buffer[-1]
+    ruled = await llm.check_homework_with_ai(1, "Урок 1", "Задание", ANSWER + " плагиат")
+
+    assert [first["verdict"], second["verdict"], ruled["verdict"]] == ["ACCEPT", "REVISE", "REVISE"]
+    assert first["fallback"] is False
+    assert first_call.outcome == OUTCOME_OK
+    assert first_call.prompt_tokens > 0 and first_call.cached_tokens == 0
+    # Общий системный префикс одинаковый — второй запрос «из кэша»
+    assert second_call.cached_tokens > 0
+
+
+@pytest.mark.asyncio
+async def test_streaming_end_to_end(fake_api):
+    """
+    Тест: stream=True — отзыв приходит кусками, вердикт разобран из полного ответа
+    """
+    fake = await fake_api(verdicts=["REVISE"], stream_chunks=5)
+    progress = AsyncMock()
+
+    result = await llm.check_homework_with_ai(1, "Урок 1", "Задание", ANSWER, on_progress=progress)
+
+    assert result["verdict"] == "REVISE"
+    assert fake.stats.streamed == 1
+    assert progress.await_count >= 2
+    assert progress.call_args_list[-1].args[0] == fake.config.message
+    assert llm_telemetry._buffer[-1].prompt_tokens > 0
+
+
+@pytest.mark.asyncio
+async def test_errors_fall_back(fake_api):
+    """
+    Тест: 503 на каждую попытку → повторы, затем fallback-вердикт; каждая попытка в телеметрии
+    """
+    fake = await fake_api(error_rate=1.0, error_status=503)
+
+    with patch.object(llm_retry_policy, "base_delay", 0.01):
+        result = await llm.check_homework_with_ai(1, "Урок 1", "Задание", ANSWER)
+
+    attempts = llm_retry_policy.max_attempts
+    assert result["fallback"] is True
+    assert fake.stats.errors == attempts
+    calls = list(llm_telemetry._buffer)[-attempts:]
+    assert [c.attempt for c in calls] == list(range(1, attempts + 1))
+    assert all(c.outcome == OUTCOME_ERROR for c in calls)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_load(fake_api):
+    """
+    Тест: параллельные проверки действительно выполняются одновременно
+    """
+    fake = await fake_api()
+    fake.config.latency_ms = 50
+    fake.config.latency_sigma = 0.1
+
+    results = await asyncio.gather(*(
+        llm.check_homework_with_ai(1, "Урок 1", "Задание", f"{ANSWER} Вариант {n}.") for n in range(10)
+    ))
+
+    assert all(r["verdict"] == "ACCEPT" and not r["fallback"] for r in results)
+    assert fake.stats.requests == 10
+    assert fake.stats.max_in_flight > 1
@@ -0,0 +1,264 @@
+"""
+Тесты очереди проверки ДЗ (bot/services/grading.py)
+
+Пул проверяем на реальных корутинах; хендлер — с подменой вызова модели.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from bot.services.grading import GradingPool, SubmitStatus
+
+
+def blocked_job(gate: asyncio.Event, started: list, key):
+    async def job():
+        started.append(key)
+        await gate.wait()
+    return job
+
+
+# ============================================
+# Tests: GradingPool
+# ============================================
+
+@pytest.mark.asyncio
+async def test_pool_limits_concurrency():
+    """
+    Тест: одновременно выполняется не больше concurrency задач
+    """
+    pool = GradingPool(concurrency=2, max_queue=10)
+    gate = asyncio.Event()
+    started = []
+
+    results = [pool.submit(i, blocked_job(gate, started, i)) for i in range(4)]
+    await asyncio.sleep(0)
+
+    assert [r.status for r in results] == [
+        SubmitStatus.STARTED, SubmitStatus.STARTED, SubmitStatus.QUEUED, SubmitStatus.QUEUED
+    ]
+    assert [r.ahead for r in results] == [0, 0, 0, 1]
+    assert started == [0, 1]
+    assert pool.stats.running == 2
+    assert pool.stats.queued == 2
+
+    gate.set()
+    await pool.drain()
+
+    assert sorted(started) == [0, 1, 2, 3]
+    assert pool.stats.completed == 4
+    assert pool.stats.running == 0
+    assert pool.stats.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_rejects_duplicate_key():
+    """
+    Тест: повторная постановка по ключу, пока идёт проверка, — DUPLICATE
+    """
+    pool = GradingPool(concurrency=2, max_queue=10)
+    gate = asyncio.Event()
+    started = []
+
+    assert pool.submit("a", blocked_job(gate, started, "a")).status == SubmitStatus.STARTED
+    assert pool.submit("a", blocked_job(gate, started, "a")).status == SubmitStatus.DUPLICATE
+
+    gate.set()
+    await pool.drain()
+
+    # После завершения ключ снова свободен
+    assert pool.submit("a", blocked_job(gate, started, "a")).status == SubmitStatus.STARTED
+    await pool.drain()
+
+    assert started == ["a", "a"]
+    assert pool.stats.duplicates == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_full_queue():
+    """
+    Тест: при заполненной очереди новые задачи отклоняются (FULL)
+    """
+    pool = GradingPool(concurrency=1, max_queue=1)
+    gate = asyncio.Event()
+    started = []
+
+    assert pool.submit(1, blocked_job(gate, started, 1)).status == SubmitStatus.STARTED
+    assert pool.submit(2, blocked_job(gate, started, 2)).status == SubmitStatus.QUEUED
+    full = pool.submit(3, blocked_job(gate, started, 3))
+
+    assert full.status == SubmitStatus.FULL
+    assert pool.stats.rejected == 1
+
+    gate.set()
+    await pool.drain()
+    assert started == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_pool_job_failure_counted():
+    """
+    Тест: исключение в задаче не ломает пул и учитывается в failed
+    """
+    pool = GradingPool(concurrency=1, max_queue=10)
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    async def ok():
+        pass
+
+    pool.submit(1, broken)
+    pool.submit(2, ok)
+    await pool.drain()
+
+    assert pool.stats.failed == 1
+    assert pool.stats.completed == 1
+    assert pool.stats.running == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_stop_cancels_waiting():
+    """
+    Тест: stop() дожидается начатых задач до таймаута, остальные отменяет
+    """
+    pool = GradingPool(concurrency=1, max_queue=10)
+    gate = asyncio.Event()
+    started = []
+
+    pool.submit(1, blocked_job(gate, started, 1))
+    pool.submit(2, blocked_job(gate, started, 2))
+    await asyncio.sleep(0)
+
+    await pool.stop(timeout=0.05)
+
+    assert started == [1]
+    assert pool.stats.queued == 0
+    assert pool.stats.running == 0
+
+
+# ============================================
+# Tests: хендлер сдачи ДЗ
+# ============================================
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_text_homework_graded_in_background(enrolled_user, mock_update, mock_context):
+    """
+    Тест: хендлер отвечает статусом сразу, вердикт приходит после проверки в очереди
+    """
+    from bot.database.connection import get_pool
+    from bot.handlers.router import receive_text_handler
+    from bot.services.grading import grading_pool
+    from bot.states import UserState
+
+    user_id = enrolled_user["user"]["tg_id"]
+    pool = await get_pool()
+    await pool.execute("UPDATE users SET state = $1 WHERE tg_id = $2", UserState.WAITING_HW.value, user_id)
+    mock_context.user_data["current_lesson_id"] = enrolled_user["current_lesson_id"]
+
+    gate = asyncio.Event()
+
+    async def slow_check(**kwargs):
+        await gate.wait()
+        return {"verdict": "REVISE", "message": "Раскрой подробнее"}
+
+    update = mock_update(user_id, "Мой развёрнутый ответ на задание урока " * 3)
+    with patch("bot.handlers.homework.check_homework_with_ai", AsyncMock(side_effect=slow_check)):
+        await receive_text_handler(update, mock_context)
+
+        # Хендлер завершился, проверка ещё идёт
+        assert update.message.reply_text.call_args_list[-1][0][0] == "⏳ Проверяю ответ..."
+        state = await pool.fetchval("SELECT state FROM users WHERE tg_id = $1", user_id)
+        assert state == UserState.PROCESSING.value
+
+        gate.set()
+        await grading_pool.drain()
+
+    assert "Раскрой подробнее" in update.message.reply_text.call_args_list[-1][0][0]
+    state = await pool.fetchval("SELECT state FROM users WHERE tg_id = $1", user_id)
+    assert state == UserState.WAITING_HW.value
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_cancelled_grading_releases_user(enrolled_user, mock_update, mock_context):
+    """
+    Тест: stop() отменил проверку в очереди — студент не остаётся в PROCESSING,
+    просьба прислать ответ ещё раз уходит через outbox
+    """
+    from bot.database.connection import get_pool
+    from bot.handlers.router import receive_text_handler
+    from bot.states import UserState
+
+    user_id = enrolled_user["user"]["tg_id"]
+    pool = await get_pool()
+    await pool.execute("UPDATE users SET state = $1 WHERE tg_id = $2", UserState.WAITING_HW.value, user_id)
+    mock_context.user_data["current_lesson_id"] = enrolled_user["current_lesson_id"]
+
+    grading = GradingPool(concurrency=1, max_queue=10)
+    gate = asyncio.Event()
+    started = []
+    grading.submit("busy", blocked_job(gate, started, "busy"))
+
+    update = mock_update(user_id, "Мой развёрнутый ответ на задание урока " * 3)
+    with patch("bot.handlers.homework.grading_pool", grading), \
+            patch("bot.handlers.homework.check_homework_with_ai", AsyncMock()) as check:
+        await receive_text_handler(update, mock_context)
+        assert grading.stats.queued == 1
+
+        await grading.stop(timeout=0.05)
+
+    check.assert_not_awaited()
+    state = await pool.fetchval("SELECT state FROM users WHERE tg_id = $1", user_id)
+    assert state == UserState.WAITING_HW.value
+    notice = await pool.fetchrow("SELECT chat_id, kind FROM outbox")
+    assert (notice["chat_id"], notice["kind"]) == (user_id, "grading_aborted")
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_stale_processing_released_on_start(enrolled_user):
+    """
+    Тест: при старте сбрасывается любой PROCESSING — проверок нового процесса ещё нет
+    """
+    from bot.database.connection import get_pool
+    from bot.handlers.homework import release_stale_processing
+    from bot.states import UserState
+
+    user_id = enrolled_user["user"]["tg_id"]
+    pool = await get_pool()
+    await pool.execute("UPDATE users SET state = $1 WHERE tg_id = $2", UserState.PROCESSING.value, user_id)
+
+    assert await release_stale_processing() == 1
+    state = await pool.fetchval("SELECT state FROM users WHERE tg_id = $1", user_id)
+    assert state == UserState.WAITING_HW.value
+    notice = await pool.fetchrow("SELECT chat_id, kind FROM outbox")
+    assert (notice["chat_id"], notice["kind"]) == (user_id, "grading_aborted")
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_stale_processing_sweep(enrolled_user):
+    """
+    Тест: периодическая задача сбрасывает только PROCESSING старше GRADING_STALE_SECONDS
+    """
+    from bot.database.connection import get_pool
+    from bot.services.scheduler import release_stale_gradings, run_exclusive
+    from bot.states import UserState
+
+    user_id = enrolled_user["user"]["tg_id"]
+    pool = await get_pool()
+    await pool.execute("UPDATE users SET state = $1, last_activity = NOW() WHERE tg_id = $2",
+                       UserState.PROCESSING.value, user_id)
+
+    assert await run_exclusive(release_stale_gradings)
+    state = await pool.fetchval("SELECT state FROM users WHERE tg_id = $1", user_id)
+    assert state == UserState.PROCESSING.value
+
+    await pool.execute("UPDATE users SET last_activity = NOW() - INTERVAL '1 hour' WHERE tg_id = $1", user_id)
+    assert await run_exclusive(release_stale_gradings)
+    state = await pool.fetchval("SELECT state FROM users WHERE tg_id = $1", user_id)
+    assert state == UserState.WAITING_HW.value
+    assert await pool.fetchval("SELECT COUNT(*) FROM outbox WHERE kind = 'grading_aborted'") == 1
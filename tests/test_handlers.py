@@ -0,0 +1,177 @@
+"""
+Тесты хендлеров сообщений
+
+Проверяем маршрутизацию текстовых сообщений и количество запросов к БД на одно обновление.
+"""
+
+import pytest
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.integration]
+
+from bot.database import queries as db
+from bot.database.connection import get_pool, count_queries
+from bot.handlers.router import receive_text_handler, receive_media_handler
+from bot.services.user_context import get_user_context
+from bot.states import UserState
+
+
+async def set_state(user_id: int, state: UserState):
+    pool = await get_pool()
+    await pool.execute("UPDATE users SET state = $1 WHERE tg_id = $2", state.value, user_id)
+
+
+# ============================================
+# Tests: get_user_context()
+# ============================================
+
+@pytest.mark.asyncio
+async def test_get_user_context_joined(enrolled_user):
+    """
+    Тест: пользователь, зачисление и прогресс текущего урока — одним запросом
+    """
+    user_id = enrolled_user["user"]["tg_id"]
+
+    with count_queries() as counter:
+        user_ctx = await db.get_user_context(user_id)
+
+    assert counter.count == 1
+    assert user_ctx.user.tg_id == user_id
+    assert user_ctx.enrollment.current_lesson_id == enrolled_user["current_lesson_id"]
+    assert user_ctx.progress.status == "OPEN"
+
+
+@pytest.mark.asyncio
+async def test_get_user_context_not_enrolled(sample_user):
+    """
+    Тест: незачисленный пользователь — контекст без зачисления и прогресса
+    """
+    user_ctx = await db.get_user_context(sample_user["tg_id"])
+
+    assert user_ctx.user.tg_id == sample_user["tg_id"]
+    assert user_ctx.enrollment is None
+    assert user_ctx.progress is None
+
+
+@pytest.mark.asyncio
+async def test_get_user_context_unknown_user(db_pool):
+    """
+    Тест: неизвестный пользователь → None
+    """
+    assert await db.get_user_context(999) is None
+
+
+@pytest.mark.asyncio
+async def test_user_context_cached_per_update(enrolled_user, mock_update, mock_context):
+    """
+    Тест: повторные обращения в рамках одного обновления не ходят в БД
+    """
+    update = mock_update(enrolled_user["user"]["tg_id"], "текст")
+
+    with count_queries() as counter:
+        first = await get_user_context(update, mock_context)
+        second = await get_user_context(update, mock_context)
+
+    assert counter.count == 1
+    assert first is second
+
+
+# ============================================
+# Tests: receive_text_handler() — запросы на одно обновление
+# ============================================
+
+@pytest.mark.asyncio
+async def test_text_message_idle_single_query(enrolled_user, mock_update, mock_context):
+    """
+    Тест: текст от пользователя в IDLE стоит ровно один запрос (раньше — 3 SELECT users)
+    """
+    user_id = enrolled_user["user"]["tg_id"]
+    await set_state(user_id, UserState.IDLE)
+    update = mock_update(user_id, "просто текст")
+
+    with count_queries() as counter:
+        await receive_text_handler(update, mock_context)
+
+    assert counter.count == 1
+    update.message.reply_text.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_text_message_wrong_code(enrolled_user, mock_update, mock_context):
+    """
+    Тест: неверный код доступа — контекст + поиск кода + смена состояния
+    """
+    user_id = enrolled_user["user"]["tg_id"]
+    await set_state(user_id, UserState.WAITING_CODE)
+    update = mock_update(user_id, "WRONG-CODE")
+
+    with count_queries() as counter:
+        await receive_text_handler(update, mock_context)
+
+    assert counter.count == 3
+    assert "Код не найден" in update.message.reply_text.call_args[0][0]
+    assert (await db.get_user(user_id)).state == UserState.NO_AUTH.value
+
+
+# ============================================
+# Tests: маршрутизация по состоянию
+# ============================================
+
+@pytest.mark.asyncio
+async def test_router_routes_to_single_handler(enrolled_user, mock_update, mock_context):
+    """
+    Тест: сообщение уходит ровно в один хендлер из таблицы по состоянию
+    """
+    from unittest.mock import AsyncMock, patch
+    from bot.handlers import router
+
+    user_id = enrolled_user["user"]["tg_id"]
+    await set_state(user_id, UserState.WAITING_QUESTION)
+    update = mock_update(user_id, "вопрос")
+
+    handlers = {state: AsyncMock() for state in router.TEXT_ROUTES}
+    with patch.dict(router.TEXT_ROUTES, handlers):
+        await receive_text_handler(update, mock_context)
+
+    handlers[UserState.WAITING_QUESTION].assert_awaited_once_with(update, mock_context)
+    for state, handler in handlers.items():
+        if state != UserState.WAITING_QUESTION:
+            handler.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_router_curator_reply_skips_state(enrolled_user, mock_update, mock_context, mock_bot):
+    """
+    Тест: ответ куратора определяется по отправителю — состояние не загружается
+    """
+    from unittest.mock import Mock
+    from bot.config import config
+
+    student_id = enrolled_user["user"]["tg_id"]
+    await db.save_support_question(555, student_id)
+
+    update = mock_update(config.CURATOR_ID, "ответ", reply_to_message=Mock(message_id=555))
+
+    with count_queries() as counter:
+        await receive_text_handler(update, mock_context)
+
+    assert counter.count == 1  # только поиск студента по message_id
+    mock_bot.send_message.assert_awaited_once()
+    assert mock_bot.send_message.call_args[0][0] == student_id
+
+
+@pytest.mark.asyncio
+async def test_router_voice_while_waiting_hw(enrolled_user, mock_update, mock_context):
+    """
+    Тест: голосовое при сдаче ДЗ — отказ, без пересылки куратору
+    """
+    from unittest.mock import Mock
+
+    user_id = enrolled_user["user"]["tg_id"]
+    await set_state(user_id, UserState.WAITING_HW)
+    update = mock_update(user_id)
+    update.message.voice = Mock()
+
+    await receive_media_handler(update, mock_context)
+
+    assert "Голосовые" in update.message.reply_text.call_args[0][0]
+    update.message.forward.assert_not_called()
@@ -0,0 +1,33 @@
+"""
+Тесты клавиатур (bot/keyboards.py)
+"""
+
+import pytest
+
+pytestmark = [pytest.mark.unit]
+
+from bot.keyboards import cancel_keyboard, lesson_keyboard, main_menu_keyboard, no_auth_keyboard
+
+
+def test_static_keyboards_shared():
+    """
+    Тест: статичные клавиатуры не пересобираются, изменить их нельзя
+    """
+    assert main_menu_keyboard() is main_menu_keyboard()
+    assert cancel_keyboard() is cancel_keyboard()
+    assert no_auth_keyboard() is no_auth_keyboard()
+
+    with pytest.raises(AttributeError):
+        main_menu_keyboard().inline_keyboard = ()
+
+
+def test_lesson_keyboard_memoized():
+    """
+    Тест: клавиатура урока собирается один раз на (has_homework, lesson_id)
+    """
+    with_homework = lesson_keyboard(True, 5)
+
+    assert lesson_keyboard(True, 5) is with_homework
+    assert lesson_keyboard(False, 5) is not with_homework
+    assert with_homework.inline_keyboard[0][0].callback_data == "submit_hw:5"
+    assert lesson_keyboard(False, 5).inline_keyboard[0][0].callback_data == "mark_done:5"
@@ -0,0 +1,114 @@
+"""
+Тесты контекстов уроков из файлов и их перезагрузки (bot/services/lesson_contexts.py)
+"""
+
+import json
+import shutil
+
+import pytest
+
+pytestmark = [pytest.mark.unit]
+
+from bot.services.lesson_contexts import (
+    DEFAULT_CONTEXTS_DIR, LESSONS_FILE, PROFILE_FILE,
+    ContextStore, ContextValidationError, context_store, load_contexts
+)
+from bot.services.prompts import PromptRegistry
+
+
+@pytest.fixture
+def contexts_dir(tmp_path):
+    """Копия поставляемых файлов контекстов"""
+    for name in (PROFILE_FILE, LESSONS_FILE):
+        shutil.copy(DEFAULT_CONTEXTS_DIR / name, tmp_path / name)
+    return tmp_path
+
+
+def edit_lessons(directory, change):
+    path = directory / LESSONS_FILE
+    data = json.loads(path.read_text(encoding="utf-8"))
+    change(data)
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+def test_shipped_contexts_valid():
+    """
+    Тест: поставляемые файлы проходят проверку, все 18 уроков на месте
+    """
+    contexts = load_contexts(DEFAULT_CONTEXTS_DIR)
+
+    assert contexts.version
+    assert sorted(contexts.lessons) == list(range(1, 19))
+    assert contexts.lesson(1)["has_detailed_context"]
+    assert contexts.profile.startswith("\n") and contexts.profile.endswith("\n")
+
+
+def test_invalid_file_rejected(contexts_dir):
+    """
+    Тест: ошибка в файле — перезагрузка отклоняется, действующие контексты остаются
+    """
+    store = ContextStore(contexts_dir, poll_interval=0)
+    before = store.current
+
+    def break_lesson(data):
+        del data["lessons"]["1"]["grading_scale"]["accept"]
+        data["lessons"]["2"]["bogus"] = 1
+
+    edit_lessons(contexts_dir, break_lesson)
+
+    with pytest.raises(ContextValidationError) as error:
+        store.reload()
+
+    assert len(error.value.errors) == 2
+    assert store.current is before
+
+    (contexts_dir / LESSONS_FILE).write_text("{not json", encoding="utf-8")
+    with pytest.raises(ContextValidationError):
+        store.reload()
+    assert store.current is before
+
+
+def test_reload_swaps_and_reports_changes(contexts_dir):
+    """
+    Тест: перезагрузка подменяет контексты, сообщает изменённые уроки и вызывает подписчиков
+    """
+    store = ContextStore(contexts_dir, poll_interval=0)
+    old = store.current
+    seen = []
+    store.subscribe(lambda before, after: seen.append((before.version, after.version)))
+
+    assert store.reload() == (old, [])
+    assert seen == []
+
+    def change(data):
+        data["version"] = "2024.2"
+        data["lessons"]["3"]["title"] = "Новое название"
+
+    edit_lessons(contexts_dir, change)
+    new, changed = store.reload()
+
+    assert changed == [3]
+    assert store.current is new and new.version == "2024.2"
+    assert seen == [(old.version, "2024.2")]
+
+    (contexts_dir / PROFILE_FILE).write_text("Новый профиль", encoding="utf-8")
+    _, changed = store.reload()
+    assert changed == list(range(1, 19))
+
+
+def test_registry_rerenders_after_reload(contexts_dir, monkeypatch):
+    """
+    Тест: после перезагрузки реестр перерисовывает промпт — отпечаток меняется
+    """
+    monkeypatch.setattr(context_store, "directory", contexts_dir)
+    monkeypatch.setattr(context_store, "_current", None)
+    registry = PromptRegistry()
+    old = registry.get(1, "Урок 1", "Задание")
+
+    edit_lessons(contexts_dir, lambda data: data["lessons"]["1"]["key_concepts"].append("Новая концепция"))
+    context_store.reload()
+    new = registry.get(1, "Урок 1", "Задание")
+
+    assert new.fingerprint != old.fingerprint
+    assert "• Новая концепция" in new.text
+    assert registry.get(1, "Урок 1", "Задание") is new
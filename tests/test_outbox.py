@@ -0,0 +1,179 @@
+"""
+Тесты очереди исходящих сообщений (outbox)
+
+Проверяем постановку в очередь, захват пачек, повторы и запись напоминаний после доставки.
+"""
+
+import pytest
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.integration]
+
+import asyncio
+from datetime import datetime, timedelta
+
+from bot.database import queries as db
+from bot.database.connection import get_pool
+from bot.services import scheduler
+from bot.services.outbox import drain_outbox, KIND_REMINDER_SOFT
+
+
+async def outbox_rows():
+    pool = await get_pool()
+    return await pool.fetch("SELECT * FROM outbox ORDER BY id")
+
+
+# ============================================
+# Tests: enqueue_messages() / claim_outbox_batch()
+# ============================================
+
+@pytest.mark.asyncio
+async def test_enqueue_dedupe_while_pending(db_pool):
+    """
+    Тест: сообщение с тем же dedupe_key не ставится повторно, пока не доставлено
+    """
+    assert await db.enqueue_messages([(1, "a", "reminder_soft", "reminder_soft:1")]) == 1
+    assert await db.enqueue_messages([(1, "a", "reminder_soft", "reminder_soft:1")]) == 0
+    assert await db.enqueue_messages([(2, "b", "broadcast", None), (2, "b", "broadcast", None)]) == 2
+
+
+@pytest.mark.asyncio
+async def test_claim_skip_locked_no_overlap(db_pool):
+    """
+    Тест: параллельные воркеры забирают разные сообщения
+    """
+    await db.enqueue_messages([(i, "text", "broadcast", None) for i in range(10)])
+
+    first, second = await asyncio.gather(
+        db.claim_outbox_batch(limit=6),
+        db.claim_outbox_batch(limit=6)
+    )
+
+    first_ids = {m.id for m in first}
+    second_ids = {m.id for m in second}
+    assert not first_ids & second_ids
+    assert len(first_ids | second_ids) == 10
+    assert all(m.status == "SENDING" and m.attempts == 1 for m in first + second)
+
+
+@pytest.mark.asyncio
+async def test_claim_expired_lease(db_pool):
+    """
+    Тест: SENDING с истёкшей арендой (воркер упал) забирается повторно
+    """
+    await db.enqueue_messages([(1, "text", "broadcast", None)])
+    await db.claim_outbox_batch(limit=10, lease_seconds=0)
+    await asyncio.sleep(0.01)
+
+    again = await db.claim_outbox_batch(limit=10)
+    assert len(again) == 1
+    assert again[0].attempts == 2
+
+
+# ============================================
+# Tests: drain_outbox()
+# ============================================
+
+@pytest.mark.asyncio
+async def test_drain_marks_delivered(db_pool, mock_bot):
+    """
+    Тест: доставленные сообщения помечаются DELIVERED и больше не отправляются
+    """
+    await db.enqueue_messages([(1, "a", "broadcast", None), (2, "b", "broadcast", None)])
+
+    assert await drain_outbox(mock_bot) == 2
+    assert await drain_outbox(mock_bot) == 0
+
+    assert mock_bot.send_message.call_count == 2
+    assert all(row["status"] == "DELIVERED" and row["sent_at"] for row in await outbox_rows())
+
+
+@pytest.mark.asyncio
+async def test_drain_failure_retries_later(db_pool, mock_bot):
+    """
+    Тест: ошибка отправки → PENDING с паузой, после исчерпания попыток → FAILED
+    """
+    from bot.config import config
+
+    mock_bot.send_message.side_effect = Exception("Network error")
+    await db.enqueue_messages([(1, "a", "broadcast", None)])
+
+    await drain_outbox(mock_bot)
+
+    row = (await outbox_rows())[0]
+    assert row["status"] == "PENDING"
+    assert row["attempts"] == 1
+    assert row["last_error"] == "Network error"
+    assert row["next_attempt_at"] > datetime.utcnow()
+
+    # Сразу не повторяем
+    assert await drain_outbox(mock_bot) == 0
+
+    # Последняя попытка
+    pool = await get_pool()
+    await pool.execute(
+        "UPDATE outbox SET attempts = $1, next_attempt_at = NOW()",
+        config.OUTBOX_MAX_ATTEMPTS - 1
+    )
+    await drain_outbox(mock_bot)
+    assert (await outbox_rows())[0]["status"] == "FAILED"
+
+
+@pytest.mark.asyncio
+async def test_reminder_logged_only_after_delivery(sample_lessons, db_pool, mock_bot):
+    """
+    Тест: напоминание попадает в reminders только после доставки
+    """
+    pool = await get_pool()
+    user_id = 777777
+    await pool.execute(
+        """
+        INSERT INTO users (tg_id, username, full_name, state, last_activity)
+        VALUES ($1, 'u', 'U', 'idle', $2)
+        """,
+        user_id, datetime.utcnow() - timedelta(days=3)
+    )
+    await pool.execute(
+        "INSERT INTO enrollments (user_id, current_lesson_id) VALUES ($1, $2)",
+        user_id, sample_lessons[0]["id"]
+    )
+
+    await scheduler.send_reminders()
+
+    rows = await outbox_rows()
+    assert [(r["chat_id"], r["kind"]) for r in rows] == [(user_id, KIND_REMINDER_SOFT)]
+    assert await pool.fetchval("SELECT COUNT(*) FROM reminders") == 0
+
+    # Повторный запуск до доставки — не дублирует
+    await scheduler.send_reminders()
+    assert len(await outbox_rows()) == 1
+
+    await drain_outbox(mock_bot)
+    assert await pool.fetchval(
+        "SELECT COUNT(*) FROM reminders WHERE user_id = $1 AND reminder_type = 'soft'",
+        user_id
+    ) == 1
+
+
+@pytest.mark.asyncio
+async def test_unlock_enqueues_notification_atomically(sample_lessons, enrolled_user):
+    """
+    Тест: открытие урока и уведомление в outbox — одним запросом, без отправки
+    """
+    pool = await get_pool()
+    user_id = enrolled_user["user"]["tg_id"]
+    await pool.execute(
+        """
+        UPDATE user_progress
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
+        WHERE user_id = $1 AND lesson_id = $2
+        """,
+        user_id, enrolled_user["current_lesson_id"], datetime.utcnow() - timedelta(days=2)
+    )
+
+    await scheduler.check_lesson_unlocks()
+
+    rows = await outbox_rows()
+    assert len(rows) == 1
+    assert rows[0]["chat_id"] == user_id
+    assert rows[0]["kind"] == "lesson_unlock"
+    assert "Урок 2: Урок 2: Тестовый урок" in rows[0]["text"]
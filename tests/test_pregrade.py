@@ -0,0 +1,109 @@
+"""
+Тесты локальной предпроверки ответов на ДЗ
+
+Проверяем, что очевидный мусор отсекается, а нормальные ответы доходят до модели.
+"""
+
+import pytest
+
+pytestmark = [pytest.mark.unit]
+
+from unittest.mock import AsyncMock, patch
+
+from bot.services import llm
+from bot.services.pregrade import pregrade
+
+TASK = "Опишите своими словами, что такое тренинг и чем он отличается от урока в школе."
+
+GOOD_ANSWERS = [
+    "Тренинг — это короткий формат обучения, после которого человек начинает по-другому действовать. "
+    "В отличие от урока в школе, здесь важен навык, а не знания.",
+    "Для меня тренинг — это про изменение поведения. Я вспоминаю свой первый тренинг по продажам: "
+    "через неделю я реально стал иначе разговаривать с клиентами.",
+]
+
+
+@pytest.mark.parametrize("answer, reason", [
+    ("ок", "brush_off"),
+    ("Сделал!", "brush_off"),
+    ("  готово.  ", "brush_off"),
+    ("Тренинг — это обучение", "too_short"),
+    ("ааааааааааааааааааааааааааааааааааааааааааааааааааааааааа", "low_entropy"),
+    ("ывыв ывыв ывыв ывыв ывыв ывыв ывыв ывыв ывыв ывыв ывыв ывыв ывыв", "low_entropy"),
+    ("тренинг урок тренинг урок тренинг урок тренинг урок тренинг урок тренинг урок", "repetitive"),
+    ("кккк пррр дддд ттттт смщщщ вввввв ннннннн бббббб ггггг жжжжж ззззз", "keyboard_mash"),
+])
+def test_pregrade_rejects_junk(answer, reason):
+    """
+    Тест: мусор отсекается с понятной причиной
+    """
+    decision = pregrade(answer, TASK)
+
+    assert decision.reject
+    assert decision.reason == reason
+
+
+@pytest.mark.parametrize("answer", GOOD_ANSWERS)
+def test_pregrade_passes_real_answers(answer):
+    """
+    Тест: нормальные ответы пропускаются к модели
+    """
+    decision = pregrade(answer, TASK)
+
+    assert not decision.reject
+    assert decision.reason == "ok"
+    assert decision.metrics["overlap"] > 0
+
+
+@pytest.mark.parametrize("answer, reason", [
+    ("Ok, I felt calmer and my voice got lower and steadier during practice.", "few_words"),
+    ("мама мыла раму вечером после работы вместе с папой и старшим братом", "off_topic"),
+])
+def test_pregrade_borderline_goes_to_model(answer, reason):
+    """
+    Тест: ответ на другом языке или без общих слов с заданием — не мусор,
+    помечается и уходит к модели
+    """
+    decision = pregrade(answer, TASK)
+
+    assert not decision.reject
+    assert decision.reason == reason
+
+
+def test_pregrade_long_answer_without_overlap_passes():
+    """
+    Тест: развёрнутый ответ без общих слов с заданием — решает модель
+    """
+    answer = (
+        "Вспоминаю, как мой наставник однажды остановил занятие и попросил каждого рассказать "
+        "о своей главной ошибке за неделю. Это было неожиданно, но именно тогда мы начали меняться."
+    )
+
+    assert not pregrade(answer, TASK).reject
+
+
+def test_pregrade_without_lesson_text():
+    """
+    Тест: задания нет (или оно из пары слов) — проверка пересечения не применяется
+    """
+    answer = "мама мыла раму вечером после работы вместе с папой и старшим братом"
+
+    for lesson_text in (None, "", "Задание"):
+        decision = pregrade(answer, lesson_text)
+        assert not decision.reject
+        assert "overlap" not in decision.metrics
+
+
+@pytest.mark.asyncio
+async def test_check_homework_skips_llm_for_junk():
+    """
+    Тест: мусор → REVISE из шаблонов без вызова модели
+    """
+    create = AsyncMock()
+
+    with patch.object(llm.client.chat.completions, "create", create):
+        result = await llm.check_homework_with_ai(1, "Урок 1", TASK, "сделал")
+
+    create.assert_not_called()
+    assert result["verdict"] == "REVISE"
+    assert result["message"] in llm.FALLBACK_REVISE
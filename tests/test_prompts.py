@@ -0,0 +1,122 @@
+"""
+Тесты реестра системных промптов
+
+Проверяем общий префикс, отпечатки, поиск по номеру урока и перерисовку.
+"""
+
+import pytest
+
+pytestmark = [pytest.mark.unit]
+
+from types import SimpleNamespace
+
+from bot.services.lesson_contexts import context_store
+from bot.services.prompts import PromptRegistry, build_system_prompt, fingerprint, render_prompt
+
+SYSTEM_PROMPT = build_system_prompt(context_store.current.profile)
+
+
+def make_lessons():
+    return [
+        SimpleNamespace(order_num=n, title=f"Урок {n}", content_text=f"Задание урока {n}")
+        for n in range(1, 19)
+    ]
+
+
+@pytest.fixture
+def registry():
+    registry = PromptRegistry()
+    registry.load(make_lessons())
+    return registry
+
+
+def test_all_lessons_rendered(registry):
+    """
+    Тест: все 18 уроков отрендерены, у каждого — общий префикс с профилем
+    """
+    snapshot = registry.snapshot()
+
+    assert list(snapshot) == list(range(1, 19))
+    assert context_store.current.profile in SYSTEM_PROMPT
+    assert all(text.startswith(SYSTEM_PROMPT) for text in snapshot.values())
+
+
+def test_detailed_and_basic_prompts(registry):
+    """
+    Тест: урок с детальным контекстом получает концепции и шкалу, остальные — базовый промпт
+    """
+    lesson_1 = registry.get(1, "Урок 1", "Задание урока 1")
+    lesson_2 = registry.get(2, "Урок 2", "Задание урока 2")
+
+    assert lesson_1.detailed
+    assert "КЛЮЧЕВЫЕ КОНЦЕПЦИИ" in lesson_1.text
+    assert f"• {context_store.current.lessons[1]['key_concepts'][0]}" in lesson_1.text
+    assert '"level"' in lesson_1.text
+
+    assert not lesson_2.detailed
+    assert "Детального контекста и шкалы для этого урока нет" in lesson_2.text
+    # Название — из контекста урока, задание — из БД
+    assert "КОНТЕКСТ УРОКА 2: Способы передачи знаний" in lesson_2.text
+    assert "Задание урока 2" in lesson_2.text
+
+
+def test_messages_share_invariant_prefix(registry):
+    """
+    Тест: первое сообщение одинаково для всех уроков (кэш префикса у провайдера),
+    урок и ответ студента — после него
+    """
+    messages = [registry.get(n, f"Урок {n}", f"Задание урока {n}").messages("Мой ответ") for n in (1, 2, 10)]
+
+    assert {m[0]["content"] for m in messages} == {SYSTEM_PROMPT}
+    assert all(m[0]["role"] == "system" for m in messages)
+    assert "КОНТЕКСТ УРОКА 1" in messages[0][1]["content"]
+    assert "КОНТЕКСТ УРОКА" not in SYSTEM_PROMPT
+    assert messages[0][-1] == {"role": "user", "content": "Ответ студента:\n\nМой ответ"}
+
+
+def test_fingerprints_stable_and_distinct(registry):
+    """
+    Тест: отпечаток детерминирован и различается между уроками
+    """
+    fingerprints = registry.fingerprints()
+
+    assert len(set(fingerprints.values())) == 18
+    assert fingerprints[1] == fingerprint(registry.snapshot()[1])
+
+    other = PromptRegistry()
+    other.load(make_lessons())
+    assert other.fingerprints() == fingerprints
+
+
+def test_get_returns_cached_prompt(registry):
+    """
+    Тест: при тех же данных урока промпт не перерисовывается
+    """
+    first = registry.get(3, "Урок 3", "Задание урока 3")
+    second = registry.get(3, "Урок 3", "Задание урока 3")
+
+    assert first is second
+
+
+def test_get_rerenders_on_changed_task(registry):
+    """
+    Тест: задание урока в БД изменилось → промпт перерисован
+    """
+    old = registry.get(3, "Урок 3", "Задание урока 3")
+    new = registry.get(3, "Урок 3", "Новое задание")
+
+    assert new.fingerprint != old.fingerprint
+    assert "Новое задание" in new.text
+    assert registry.get(3, "Урок 3", "Новое задание") is new
+
+
+def test_get_without_load_renders_on_demand():
+    """
+    Тест: пустой реестр (промпты не прогреты) — промпт рендерится при обращении
+    """
+    registry = PromptRegistry()
+
+    prompt = registry.get(5, "Урок 5", "Задание")
+
+    assert prompt == render_prompt(5, "Урок 5", "Задание")
+    assert registry.snapshot() == {5: prompt.text}
@@ -31,7 +31,7 @@ async def test_get_users_ready_for_next_lesson_basic(sample_lessons, enrolled_us
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id,
@@ -60,7 +60,7 @@ async def test_get_users_ready_not_enough_time(sample_lessons, enrolled_user):
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id,
@@ -87,7 +87,7 @@ async def test_get_users_ready_exactly_1_day_not_enough(sample_lessons, enrolled
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id,
@@ -114,7 +114,7 @@ async def test_get_users_ready_exactly_2_days(sample_lessons, enrolled_user):
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id,
@@ -142,7 +142,7 @@ async def test_get_users_ready_already_unlocked(sample_lessons, enrolled_user):
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id,
@@ -196,8 +196,8 @@ async def test_get_users_ready_last_lesson(sample_lessons, db_pool):
     completed_at = datetime.utcnow() - timedelta(days=2)
     await pool.execute(
         """
-        INSERT INTO user_progress (user_id, lesson_id, status, completed_at)
-        VALUES ($1, $2, 'COMPLETED', $3)
+        INSERT INTO user_progress (user_id, lesson_id, status, completed_at, unlock_at)
+        VALUES ($1, $2, 'COMPLETED', $3, $3::timestamp::date + 2)
         """,
         user_id, last_lesson_id, completed_at
     )
@@ -305,6 +305,201 @@ async def test_unlock_next_lesson_idempotent(sample_lessons, enrolled_user):
     assert count == 1
 
 
+# ============================================
+# Tests: unlock_ready_lessons()
+# ============================================
+
+@pytest.mark.asyncio
+async def test_unlock_ready_lessons_bulk(sample_lessons, db_pool):
+    """
+    Тест: все готовые студенты открываются одним запросом, с номером и названием урока
+    """
+    from bot.database.connection import count_queries
+
+    pool = await get_pool()
+    completed_at = datetime.utcnow() - timedelta(days=2)
+
+    for i in range(20):
+        user_id = 500000 + i
+        await pool.execute(
+            "INSERT INTO users (tg_id, username, full_name, state) VALUES ($1, $2, $3, 'idle')",
+            user_id, f"user{i}", f"User {i}"
+        )
+        await pool.execute(
+            "INSERT INTO enrollments (user_id, current_lesson_id) VALUES ($1, $2)",
+            user_id, sample_lessons[0]["id"]
+        )
+        await pool.execute(
+            """
+            INSERT INTO user_progress (user_id, lesson_id, status, completed_at, unlock_at)
+            VALUES ($1, $2, 'COMPLETED', $3, $3::timestamp::date + 2)
+            """,
+            user_id, sample_lessons[0]["id"], completed_at
+        )
+
+    with count_queries() as counter:
+        unlocked = await db.unlock_ready_lessons()
+
+    assert counter.count == 1
+    assert len(unlocked) == 20
+    assert all(row["order_num"] == 2 for row in unlocked)
+    assert all(row["title"] == "Урок 2: Тестовый урок" for row in unlocked)
+
+    opened = await pool.fetchval(
+        "SELECT COUNT(*) FROM user_progress WHERE lesson_id = $1 AND status = 'OPEN'",
+        sample_lessons[1]["id"]
+    )
+    assert opened == 20
+
+    # Повторный запуск ничего не открывает
+    assert await db.unlock_ready_lessons() == []
+
+
+@pytest.mark.asyncio
+async def test_unlock_ready_lessons_not_ready(sample_lessons, enrolled_user):
+    """
+    Тест: урок завершён вчера → ничего не открывается
+    """
+    pool = await get_pool()
+    user_id = enrolled_user["user"]["tg_id"]
+
+    await pool.execute(
+        """
+        UPDATE user_progress
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
+        WHERE user_id = $1 AND lesson_id = $2
+        """,
+        user_id, enrolled_user["current_lesson_id"], datetime.utcnow() - timedelta(days=1)
+    )
+
+    assert await db.unlock_ready_lessons() == []
+
+
+# ============================================
+# Tests: unlock_at (таймер открытия)
+# ============================================
+
+@pytest.mark.asyncio
+async def test_complete_lesson_sets_unlock_at(sample_lessons, enrolled_user):
+    """
+    Тест: complete_lesson взводит таймер — полночь через 2 календарных дня (тестовая политика)
+    """
+    pool = await get_pool()
+    user_id = enrolled_user["user"]["tg_id"]
+    lesson_id = enrolled_user["current_lesson_id"]
+
+    await db.complete_lesson(user_id, lesson_id)
+
+    progress = await db.get_user_progress(user_id, lesson_id)
+    today = await pool.fetchval("SELECT CURRENT_DATE")
+    assert progress.unlock_at == datetime.combine(today + timedelta(days=2), datetime.min.time())
+
+
+@pytest.mark.asyncio
+async def test_unlock_at_policy_timezone(sample_lessons, enrolled_user, monkeypatch):
+    """
+    Тест: политика открытия — календарные дни и час в Config.TIMEZONE
+    """
+    from bot.config import config
+
+    monkeypatch.setattr(config, "TIMEZONE", "Asia/Almaty")
+    monkeypatch.setattr(config, "UNLOCK_DELAY_DAYS", 1)
+    monkeypatch.setattr(config, "UNLOCK_HOUR", 10)
+
+    pool = await get_pool()
+    user_id = enrolled_user["user"]["tg_id"]
+    lesson_id = enrolled_user["current_lesson_id"]
+
+    await db.complete_lesson(user_id, lesson_id)
+
+    # Завтра 10:00 по Алматы
+    local_unlock = await pool.fetchval(
+        "SELECT unlock_at::timestamptz AT TIME ZONE 'Asia/Almaty' FROM user_progress WHERE user_id = $1 AND lesson_id = $2",
+        user_id, lesson_id
+    )
+    local_today = await pool.fetchval("SELECT (NOW() AT TIME ZONE 'Asia/Almaty')::date")
+    assert local_unlock == datetime.combine(local_today + timedelta(days=1), datetime.min.time()) + timedelta(hours=10)
+
+
+@pytest.mark.asyncio
+async def test_arm_missing_unlock_timers(sample_lessons, enrolled_user, monkeypatch):
+    """
+    Тест: урок, завершённый до появления unlock_at, получает таймер по той же
+    политике (день завершения в TIMEZONE + дни, UNLOCK_HOUR); повтор ничего не меняет
+    """
+    from bot.config import config
+
+    monkeypatch.setattr(config, "TIMEZONE", "Asia/Almaty")
+    monkeypatch.setattr(config, "UNLOCK_DELAY_DAYS", 2)
+    monkeypatch.setattr(config, "UNLOCK_HOUR", 10)
+
+    pool = await get_pool()
+    user_id = enrolled_user["user"]["tg_id"]
+    lesson_id = enrolled_user["current_lesson_id"]
+    await pool.execute(
+        "UPDATE user_progress SET status = 'COMPLETED', completed_at = NOW() - INTERVAL '1 day', unlock_at = NULL "
+        "WHERE user_id = $1 AND lesson_id = $2",
+        user_id, lesson_id
+    )
+
+    assert await db.arm_missing_unlock_timers() == 1
+    assert await db.arm_missing_unlock_timers() == 0
+
+    local_unlock, local_completed = await pool.fetchrow(
+        """
+        SELECT unlock_at::timestamptz AT TIME ZONE 'Asia/Almaty', completed_at::timestamptz AT TIME ZONE 'Asia/Almaty'
+        FROM user_progress WHERE user_id = $1 AND lesson_id = $2
+        """,
+        user_id, lesson_id
+    )
+    expected = datetime.combine(local_completed.date() + timedelta(days=2), datetime.min.time()) + timedelta(hours=10)
+    assert local_unlock == expected
+
+
+@pytest.mark.asyncio
+async def test_record_homework_accept_sets_unlock_at(sample_lessons, enrolled_user):
+    """
+    Тест: принятое ДЗ взводит таймер, REVISE — нет
+    """
+    user_id = enrolled_user["user"]["tg_id"]
+    lesson_id = enrolled_user["current_lesson_id"]
+
+    await db.record_homework_submission(user_id, lesson_id, "ответ", "text", "REVISE", "доработай", "WAITING_HW")
+    assert (await db.get_user_progress(user_id, lesson_id)).unlock_at is None
+
+    await db.record_homework_submission(user_id, lesson_id, "ответ", "text", "ACCEPT", "ок", "idle")
+    assert (await db.get_user_progress(user_id, lesson_id)).unlock_at is not None
+
+
+@pytest.mark.asyncio
+async def test_unlock_ready_lessons_clears_fired_timers(sample_lessons, enrolled_user):
+    """
+    Тест: сработавший таймер сбрасывается — и после открытия, и когда открывать нечего
+    """
+    pool = await get_pool()
+    user_id = enrolled_user["user"]["tg_id"]
+    past = datetime.utcnow() - timedelta(minutes=1)
+
+    # Урок 1 — таймер наступил; урок 18 (не текущий) — тоже, но открывать нечего
+    await pool.execute(
+        "UPDATE user_progress SET status = 'COMPLETED', completed_at = $2, unlock_at = $2 WHERE user_id = $1",
+        user_id, past
+    )
+    await pool.execute(
+        """
+        INSERT INTO user_progress (user_id, lesson_id, status, completed_at, unlock_at)
+        VALUES ($1, $2, 'COMPLETED', $3, $3)
+        """,
+        user_id, sample_lessons[17]["id"], past
+    )
+
+    unlocked = await db.unlock_ready_lessons()
+
+    assert [row["order_num"] for row in unlocked] == [2]
+    pending = await pool.fetchval("SELECT COUNT(*) FROM user_progress WHERE unlock_at IS NOT NULL")
+    assert pending == 0
+
+
 # ============================================
 # Tests: get_users_for_reminder()
 # ============================================
@@ -530,3 +725,116 @@ async def test_update_last_activity_clears_reminders(sample_lessons, enrolled_us
         user_id
     )
     assert count == 0
+
+
+# ============================================
+# Tests: record_homework_submission()
+# ============================================
+
+@pytest.mark.asyncio
+async def test_record_homework_submission_accept(sample_lessons, enrolled_user):
+    """
+    Тест: ACCEPT → submission + урок COMPLETED + состояние IDLE одним запросом
+    """
+    from bot.database.connection import count_queries
+
+    pool = await get_pool()
+    user_id = enrolled_user["user"]["tg_id"]
+    lesson_id = enrolled_user["current_lesson_id"]
+    await db.update_user_state(user_id, "PROCESSING")
+
+    with count_queries() as counter:
+        submission = await db.record_homework_submission(
+            user_id, lesson_id, "ответ", "text", "ACCEPT", "Принято", "IDLE"
+        )
+
+    assert counter.count == 1
+    assert submission.ai_verdict == "ACCEPT"
+
+    progress = await db.get_user_progress(user_id, lesson_id)
+    assert progress.status == "COMPLETED"
+    assert progress.completed_at is not None
+    assert (await db.get_user(user_id)).state == "IDLE"
+    assert await pool.fetchval("SELECT COUNT(*) FROM submissions WHERE user_id = $1", user_id) == 1
+
+
+@pytest.mark.asyncio
+async def test_record_homework_submission_revise(sample_lessons, enrolled_user):
+    """
+    Тест: REVISE → submission сохранён, урок НЕ завершён, состояние WAITING_HW
+    """
+    user_id = enrolled_user["user"]["tg_id"]
+    lesson_id = enrolled_user["current_lesson_id"]
+
+    await db.record_homework_submission(
+        user_id, lesson_id, "ок", "text", "REVISE", "Доработай", "WAITING_HW"
+    )
+
+    progress = await db.get_user_progress(user_id, lesson_id)
+    assert progress.status == "OPEN"
+    assert progress.completed_at is None
+    assert (await db.get_user(user_id)).state == "WAITING_HW"
+    assert not await db.has_accepted_submission(user_id, lesson_id)
+
+
+# ============================================
+# Tests: lesson_catalog (кэш уроков + LISTEN/NOTIFY)
+# ============================================
+
+@pytest.mark.asyncio
+async def test_lesson_catalog_serves_from_memory(sample_lessons):
+    """
+    Тест: после загрузки каталога get_lesson/get_lesson_by_order не ходят в БД
+    """
+    from unittest.mock import patch
+    from bot.database.lesson_catalog import lesson_catalog
+
+    await lesson_catalog.start()
+    assert lesson_catalog.loaded
+    assert len(lesson_catalog.all()) == 18
+
+    with patch("bot.database.queries.get_pool", side_effect=AssertionError("запрос в БД")):
+        lesson = await db.get_lesson(sample_lessons[4]["id"])
+        by_order = await db.get_lesson_by_order(5)
+
+    assert lesson.order_num == 5
+    assert by_order is lesson
+
+
+@pytest.mark.asyncio
+async def test_lesson_catalog_reloads_on_notify(sample_lessons):
+    """
+    Тест: изменение таблицы lessons → NOTIFY → каталог перечитывается
+    """
+    import asyncio
+    from bot.database.lesson_catalog import lesson_catalog
+
+    pool = await get_pool()
+    await lesson_catalog.start()
+
+    await pool.execute(
+        "UPDATE lessons SET title = 'Новое название' WHERE order_num = 3"
+    )
+
+    for _ in range(50):
+        if lesson_catalog.get_by_order(3).title == "Новое название":
+            break
+        await asyncio.sleep(0.05)
+
+    lesson = await db.get_lesson_by_order(3)
+    assert lesson.title == "Новое название"
+
+
+@pytest.mark.asyncio
+async def test_lesson_catalog_stop_falls_back_to_db(sample_lessons):
+    """
+    Тест: после остановки каталога запросы снова идут в БД
+    """
+    from bot.database.lesson_catalog import lesson_catalog
+
+    await lesson_catalog.start()
+    await lesson_catalog.stop()
+    assert not lesson_catalog.loaded
+
+    lesson = await db.get_lesson(sample_lessons[0]["id"])
+    assert lesson.order_num == 1
@@ -0,0 +1,107 @@
+"""
+Тесты массовой перепроверки сдач (bot/regrade.py)
+"""
+
+import json
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.integration]
+
+from bot import regrade
+from bot.database import queries as db
+from bot.services import llm
+
+ANSWER = (
+    "Тренинг — это активное обучение через практику и собственный опыт участников, "
+    "а урок в школе чаще строится на передаче готовых знаний от учителя."
+)
+
+
+def make_response(verdict: str, message: str = "Отзыв"):
+    content = json.dumps({"verdict": verdict, "message": message}, ensure_ascii=False)
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+async def make_submissions(enrolled_user, verdicts):
+    """Текстовые сдачи по урокам 1, 2, ... с исходными вердиктами"""
+    user_id = enrolled_user["user"]["tg_id"]
+    lessons = enrolled_user["lessons"]
+    submissions = []
+    for lesson, verdict in zip(lessons, verdicts):
+        submissions.append(
+            await db.create_submission(user_id, lesson["id"], ANSWER, "text", verdict, "старый отзыв")
+        )
+    # Файлы не перепроверяются
+    await db.create_submission(user_id, lessons[0]["id"], "report.pdf", "file", "ACCEPT", "ок")
+    return submissions
+
+
+async def test_regrade_saves_and_resumes(enrolled_user):
+    """
+    Тест: прогон сохраняет вердикты, повторный запуск пропускает перепроверенные
+    """
+    await make_submissions(enrolled_user, ["ACCEPT", "ACCEPT", "REVISE"])
+    create = AsyncMock(return_value=make_response("REVISE"))
+
+    with patch.object(llm.client.chat.completions, "create", create):
+        stats = await regrade.regrade("v2", concurrency=2, rate=0)
+        again = await regrade.regrade("v2", concurrency=2, rate=0)
+
+    assert (stats.graded, stats.saved, stats.errors) == (3, 3, 0)
+    assert again.graded == 0
+    assert create.await_count == 3
+
+    report = await db.get_regrade_report("v2")
+    assert [(r["lesson_number"], r["same"], r["accept_to_revise"]) for r in report] == [
+        (1, 0, 1), (2, 0, 1), (3, 1, 0)
+    ]
+    assert "Совпадение: 1/3" in regrade.format_report("v2", report)
+
+
+async def test_regrade_filters_and_skips_fallback(enrolled_user):
+    """
+    Тест: фильтр по урокам; fallback-вердикты (API недоступен) не сохраняются
+    """
+    await make_submissions(enrolled_user, ["ACCEPT", "ACCEPT", "REVISE"])
+
+    with patch.object(llm.client.chat.completions, "create", AsyncMock(side_effect=ConnectionError())):
+        stats = await regrade.regrade("v3", lessons=[1, 3], rate=0)
+
+    assert (stats.graded, stats.fallback) == (0, 2)
+    assert await db.get_regrade_report("v3") == []
+
+
+async def test_batch_export_import_roundtrip(enrolled_user, tmp_path):
+    """
+    Тест: выгрузка для Batch API и загрузка результатов; ошибочные строки пропускаются
+    """
+    submissions = await make_submissions(enrolled_user, ["ACCEPT", "REVISE"])
+    requests_path = tmp_path / "batch.jsonl"
+
+    exported = await regrade.export_batch("batch", str(requests_path))
+
+    lines = [json.loads(line) for line in requests_path.read_text(encoding="utf-8").splitlines()]
+    assert exported == len(lines) == 2
+    assert lines[0]["url"] == regrade.BATCH_URL
+    assert lines[0]["body"]["messages"][-1]["content"].endswith(ANSWER)
+
+    output = [
+        {
+            "custom_id": lines[0]["custom_id"],
+            "response": {"status_code": 200, "body": {"choices": [
+                {"message": {"content": '{"verdict": "ACCEPT", "message": "Хорошо"}'}}
+            ]}},
+            "error": None,
+        },
+        {"custom_id": lines[1]["custom_id"], "response": None, "error": {"message": "expired"}},
+    ]
+    output_path = tmp_path / "output.jsonl"
+    output_path.write_text("\n".join(json.dumps(item) for item in output), encoding="utf-8")
+
+    stats = await regrade.import_batch("batch", str(output_path))
+
+    assert (stats.saved, stats.errors) == (1, 1)
+    rows = await enrolled_user["pool"].fetch("SELECT submission_id, verdict FROM regrade_results")
+    assert [(r["submission_id"], r["verdict"]) for r in rows] == [(submissions[0].id, "ACCEPT")]
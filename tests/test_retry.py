@@ -0,0 +1,165 @@
+"""
+Тесты повторов запросов к OpenAI (bot/services/retry.py)
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import openai
+import pytest
+
+from bot.services import llm
+from bot.services.retry import (
+    LatencyTracker, RetryPolicy, hedged, is_transient, llm_retry_policy, MIN_ATTEMPT_SECONDS
+)
+from bot.services.telemetry import llm_telemetry, OUTCOME_ERROR, OUTCOME_OK
+
+ANSWER = (
+    "Тренинг — это активное обучение через практику и собственный опыт участников, "
+    "а урок в школе чаще строится на передаче готовых знаний от учителя."
+)
+
+_REQUEST = httpx.Request("POST", "https://api.openai.test/v1/chat/completions")
+
+
+def status_error(code: int, headers: dict = None) -> openai.APIStatusError:
+    response = httpx.Response(code, request=_REQUEST, headers=headers or {})
+    return openai.APIStatusError(f"status {code}", response=response, body=None)
+
+
+def make_response(verdict: str = "ACCEPT"):
+    content = json.dumps({"verdict": verdict, "message": "Хорошо"}, ensure_ascii=False)
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+# ============================================
+# Tests: политика
+# ============================================
+
+def test_transient_errors():
+    """
+    Тест: 429, 5xx, обрыв и таймаут повторяем; 400/401 — нет
+    """
+    assert is_transient(status_error(429))
+    assert is_transient(status_error(503))
+    assert is_transient(openai.APIConnectionError(request=_REQUEST))
+    assert is_transient(asyncio.TimeoutError())
+    assert not is_transient(status_error(400))
+    assert not is_transient(status_error(401))
+    assert not is_transient(ValueError("bad json"))
+
+
+def test_backoff_and_deadline():
+    """
+    Тест: пауза растёт с номером попытки (с разбросом), Retry-After соблюдается,
+    без запаса времени и после последней попытки повтора нет
+    """
+    policy = RetryPolicy(max_attempts=4, base_delay=1, max_delay=3, deadline=30)
+
+    assert all(0 <= policy.backoff(1) <= 1 for _ in range(50))
+    assert all(0 <= policy.backoff(3) <= 3 for _ in range(50))
+    assert policy.backoff(1, status_error(429, {"retry-after": "5"})) == 5
+
+    assert policy.next_delay(1, status_error(500), remaining=20) is not None
+    assert policy.next_delay(1, status_error(400), remaining=20) is None
+    assert policy.next_delay(4, status_error(500), remaining=20) is None
+    assert policy.next_delay(1, status_error(500), remaining=MIN_ATTEMPT_SECONDS) is None
+    assert policy.stats.deadline_exhausted == 1
+    assert policy.stats.permanent_errors == 1
+
+
+def test_latency_p95():
+    """
+    Тест: p95 только при достаточном числе замеров
+    """
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for n in range(9):
+        tracker.record(n)
+    assert tracker.p95() is None
+
+    for n in range(9, 100):
+        tracker.record(n)
+    assert tracker.p95() == 95
+
+
+# ============================================
+# Tests: страхующий запрос
+# ============================================
+
+@pytest.mark.asyncio
+async def test_hedged_second_request_wins():
+    """
+    Тест: первый запрос завис — страхующий отвечает, первый отменяется
+    """
+    policy = RetryPolicy()
+    started = []
+    first_cancelled = asyncio.Event()
+
+    async def factory():
+        n = len(started)
+        started.append(n)
+        if n == 0:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                first_cancelled.set()
+                raise
+        return f"response {n}"
+
+    result, won = await hedged(factory, hedge_after=0.01, stats=policy.stats)
+    await asyncio.sleep(0)
+
+    assert (result, won) == ("response 1", True)
+    assert first_cancelled.is_set()
+    assert (policy.stats.hedges, policy.stats.hedge_wins) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_hedged_fast_first_no_hedge():
+    """
+    Тест: быстрый ответ — второй запрос не отправляется
+    """
+    factory = AsyncMock(return_value="ok")
+
+    assert await hedged(factory, hedge_after=1) == ("ok", False)
+    assert factory.await_count == 1
+
+
+# ============================================
+# Tests: check_homework_with_ai
+# ============================================
+
+@pytest.mark.asyncio
+async def test_transient_error_retried():
+    """
+    Тест: обрыв соединения → повтор → вердикт модели (не fallback), обе попытки в телеметрии
+    """
+    create = AsyncMock(side_effect=[openai.APIConnectionError(request=_REQUEST), make_response("REVISE")])
+
+    with patch.object(llm.client.chat.completions, "create", create), \
+            patch.object(llm.config, "LLM_CACHE_ENABLED", False), \
+            patch.object(llm_retry_policy, "base_delay", 0.01):
+        result = await llm.check_homework_with_ai(1, "Урок 1", "Задание", ANSWER)
+
+    assert result == {"verdict": "REVISE", "message": "Хорошо", "fallback": False}
+    assert create.await_count == 2
+    calls = list(llm_telemetry._buffer)[-2:]
+    assert [(c.attempt, c.outcome) for c in calls] == [(1, OUTCOME_ERROR), (2, OUTCOME_OK)]
+
+
+@pytest.mark.asyncio
+async def test_permanent_error_not_retried():
+    """
+    Тест: 400 от API — без повторов, сразу fallback
+    """
+    create = AsyncMock(side_effect=status_error(400))
+
+    with patch.object(llm.client.chat.completions, "create", create), \
+            patch.object(llm.config, "LLM_CACHE_ENABLED", False):
+        result = await llm.check_homework_with_ai(1, "Урок 1", "Задание", ANSWER)
+
+    assert result["fallback"] is True
+    assert create.await_count == 1
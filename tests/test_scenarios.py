@@ -14,6 +14,7 @@ from unittest.mock import AsyncMock
 from bot.database import queries as db
 from bot.database.connection import get_pool
 from bot.services import scheduler
+from bot.services.outbox import drain_outbox
 
 
 class CourseSimulator:
@@ -37,7 +38,8 @@ class CourseSimulator:
         await self.pool.execute(
             """
             UPDATE user_progress
-            SET completed_at = completed_at - INTERVAL '1 day' * $2
+            SET completed_at = completed_at - INTERVAL '1 day' * $2,
+                unlock_at = unlock_at - INTERVAL '1 day' * $2
             WHERE user_id = $1 AND status = 'COMPLETED'
             """,
             self.user_id, days
@@ -64,8 +66,8 @@ class CourseSimulator:
 
     async def run_scheduler(self):
         """Запустить scheduler (симуляция cron job)"""
-        scheduler.set_bot(self.mock_bot)
         await scheduler.check_lesson_unlocks()
+        await drain_outbox(self.mock_bot)
 
     async def get_current_lesson_order(self) -> int:
         """Получить номер текущего урока"""
@@ -185,8 +187,8 @@ async def test_scenario_skip_lesson_reminder(sample_lessons, enrolled_user, mock
     )
 
     # Запускаем отправку напоминаний
-    scheduler.set_bot(mock_bot)
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
 
     # Проверяем — получил мягкое напоминание
     assert mock_bot.send_message.call_count == 1
@@ -202,6 +204,7 @@ async def test_scenario_skip_lesson_reminder(sample_lessons, enrolled_user, mock
     )
 
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
 
     # Проверяем — получил настойчивое напоминание
     assert mock_bot.send_message.call_count == 2
@@ -210,6 +213,7 @@ async def test_scenario_skip_lesson_reminder(sample_lessons, enrolled_user, mock
 
     # Повторный вызов — напоминание не отправляется
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
     assert mock_bot.send_message.call_count == 2  # Всё ещё 2
 
 
@@ -383,8 +387,8 @@ async def test_scenario_multiple_students_parallel(sample_lessons, db_pool, mock
 
     # Через 2 дня запускаем scheduler
     await students[0].advance_days(2)
-    scheduler.set_bot(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем — студенту 0 открылся урок 2
     assert await students[0].get_current_lesson_order() == 2
@@ -13,6 +13,7 @@ from unittest.mock import AsyncMock, call
 from bot.database import queries as db
 from bot.database.connection import get_pool
 from bot.services import scheduler
+from bot.services.outbox import drain_outbox
 
 
 # ============================================
@@ -33,17 +34,15 @@ async def test_check_lesson_unlocks_sends_notification(sample_lessons, enrolled_
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, lesson_id, completed_at
     )
 
-    # Устанавливаем мок бота
-    scheduler.set_bot(mock_bot)
-
     # Запускаем scheduler
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем, что бот вызвал send_message
     assert mock_bot.send_message.called
@@ -69,17 +68,15 @@ async def test_check_lesson_unlocks_updates_enrollment(sample_lessons, enrolled_
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, lesson_id, completed_at
     )
 
-    # Устанавливаем мок бота
-    scheduler.set_bot(mock_bot)
-
     # Запускаем scheduler
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем enrollment
     enrollment = await pool.fetchrow(
@@ -102,8 +99,8 @@ async def test_check_lesson_unlocks_no_users(sample_lessons, enrolled_user, mock
     Тест: нет пользователей для открытия уроков → ничего не отправляется
     """
     # Урок не завершён — пользователь не попадёт в список
-    scheduler.set_bot(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем, что send_message не вызывался
     assert not mock_bot.send_message.called
@@ -139,15 +136,15 @@ async def test_check_lesson_unlocks_multiple_users(sample_lessons, db_pool, mock
 
         await pool.execute(
             """
-            INSERT INTO user_progress (user_id, lesson_id, status, completed_at)
-            VALUES ($1, $2, 'COMPLETED', $3)
+            INSERT INTO user_progress (user_id, lesson_id, status, completed_at, unlock_at)
+            VALUES ($1, $2, 'COMPLETED', $3, $3::timestamp::date + 2)
             """,
             user_id, sample_lessons[0]["id"], completed_at
         )
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем — 3 уведомления отправлено
     assert mock_bot.send_message.call_count == 3
@@ -167,18 +164,17 @@ async def test_check_lesson_unlocks_idempotent(sample_lessons, enrolled_user, mo
     await pool.execute(
         """
         UPDATE user_progress
-        SET status = 'COMPLETED', completed_at = $3
+        SET status = 'COMPLETED', completed_at = $3, unlock_at = $3::timestamp::date + 2
         WHERE user_id = $1 AND lesson_id = $2
         """,
         user_id, lesson_id, completed_at
     )
 
-    # Устанавливаем мок бота
-    scheduler.set_bot(mock_bot)
-
     # Запускаем scheduler ДВАЖДЫ
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем — send_message вызван только ОДИН РАЗ
     assert mock_bot.send_message.call_count == 1
@@ -214,8 +210,8 @@ async def test_check_lesson_unlocks_bot_error_continues(sample_lessons, db_pool,
 
         await pool.execute(
             """
-            INSERT INTO user_progress (user_id, lesson_id, status, completed_at)
-            VALUES ($1, $2, 'COMPLETED', $3)
+            INSERT INTO user_progress (user_id, lesson_id, status, completed_at, unlock_at)
+            VALUES ($1, $2, 'COMPLETED', $3, $3::timestamp::date + 2)
             """,
             user_id, sample_lessons[0]["id"], completed_at
         )
@@ -224,8 +220,8 @@ async def test_check_lesson_unlocks_bot_error_continues(sample_lessons, db_pool,
     mock_bot.send_message.side_effect = [Exception("Network error"), AsyncMock()]
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем — send_message вызван 2 раза (не остановился на ошибке)
     assert mock_bot.send_message.call_count == 2
@@ -258,15 +254,15 @@ async def test_check_lesson_unlocks_last_lesson_no_notification(sample_lessons,
     completed_at = datetime.utcnow() - timedelta(days=2)
     await pool.execute(
         """
-        INSERT INTO user_progress (user_id, lesson_id, status, completed_at)
-        VALUES ($1, $2, 'COMPLETED', $3)
+        INSERT INTO user_progress (user_id, lesson_id, status, completed_at, unlock_at)
+        VALUES ($1, $2, 'COMPLETED', $3, $3::timestamp::date + 2)
         """,
         user_id, sample_lessons[17]["id"], completed_at
     )
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.check_lesson_unlocks()
+    await drain_outbox(mock_bot)
 
     # Проверяем — send_message НЕ вызван
     assert not mock_bot.send_message.called
@@ -302,8 +298,8 @@ async def test_send_reminders_soft_3_days(sample_lessons, db_pool, mock_bot):
     )
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
 
     # Проверяем — отправлено 1 сообщение
     assert mock_bot.send_message.call_count == 1
@@ -345,8 +341,8 @@ async def test_send_reminders_strong_7_days(sample_lessons, db_pool, mock_bot):
     await db.log_reminder(user_id, "soft")
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
 
     # Проверяем — отправлено 1 сообщение (только strong)
     assert mock_bot.send_message.call_count == 1
@@ -403,8 +399,8 @@ async def test_send_reminders_both_types(sample_lessons, db_pool, mock_bot):
     await db.log_reminder(user_id_2, "soft")
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
 
     # Проверяем — отправлено 2 сообщения (soft для user1, strong для user2)
     assert mock_bot.send_message.call_count == 2
@@ -436,8 +432,8 @@ async def test_send_reminders_logs_reminder(sample_lessons, db_pool, mock_bot):
     )
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
 
     # Проверяем запись в reminders
     reminder = await pool.fetchrow(
@@ -473,9 +469,10 @@ async def test_send_reminders_idempotent(sample_lessons, db_pool, mock_bot):
     )
 
     # Запускаем scheduler ДВАЖДЫ
-    scheduler.set_bot(mock_bot)
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
 
     # Проверяем — send_message вызван только ОДИН РАЗ
     assert mock_bot.send_message.call_count == 1
@@ -507,8 +504,8 @@ async def test_send_reminders_no_spam_after_14_days(sample_lessons, db_pool, moc
     )
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
 
     # Проверяем — send_message НЕ вызван
     assert not mock_bot.send_message.called
@@ -542,8 +539,110 @@ async def test_send_reminders_bot_error_continues(sample_lessons, db_pool, mock_
     mock_bot.send_message.side_effect = [Exception("Network error"), AsyncMock()]
 
     # Запускаем scheduler
-    scheduler.set_bot(mock_bot)
     await scheduler.send_reminders()
+    await drain_outbox(mock_bot)
 
     # Проверяем — send_message вызван 2 раза
     assert mock_bot.send_message.call_count == 2
+
+
+# ============================================
+# Tests: run_exclusive() (несколько worker-ов)
+# ============================================
+
+@pytest.mark.asyncio
+async def test_run_exclusive_records_job_run(db_pool):
+    """
+    Тест: задача выполняется и оставляет метаданные запуска
+    """
+    calls = []
+
+    async def test_job():
+        calls.append(1)
+
+    assert await scheduler.run_exclusive(test_job) is True
+
+    assert len(calls) == 1
+    pool = await get_pool()
+    row = await pool.fetchrow("SELECT * FROM job_runs WHERE job_name = 'test_job'")
+    assert row["status"] == "OK"
+    assert row["runs"] == 1
+    assert row["finished_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_run_exclusive_concurrent_runs_once(db_pool):
+    """
+    Тест: два worker-а запускают задачу одновременно → выполняет один
+    """
+    import asyncio
+
+    calls = []
+
+    async def slow_job():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+
+    results = await asyncio.gather(
+        scheduler.run_exclusive(slow_job),
+        scheduler.run_exclusive(slow_job)
+    )
+
+    assert sorted(results) == [False, True]
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_run_exclusive_min_interval_skips_recent(db_pool):
+    """
+    Тест: ежедневная задача уже выполнена недавно → повтор пропускается
+    """
+    calls = []
+
+    async def daily_job():
+        calls.append(1)
+
+    assert await scheduler.run_exclusive(daily_job, min_interval=3600) is True
+    assert await scheduler.run_exclusive(daily_job, min_interval=3600) is False
+    assert len(calls) == 1
+
+    # Без ограничения — выполняется снова
+    assert await scheduler.run_exclusive(daily_job) is True
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_run_exclusive_records_error(db_pool):
+    """
+    Тест: ошибка задачи записывается, блокировка освобождается
+    """
+    fail = [True]
+
+    async def failing_job():
+        if fail[0]:
+            raise Exception("boom")
+
+    assert await scheduler.run_exclusive(failing_job) is False
+
+    pool = await get_pool()
+    row = await pool.fetchrow("SELECT * FROM job_runs WHERE job_name = 'failing_job'")
+    assert row["status"] == "ERROR"
+    assert row["error"] == "boom"
+
+    fail[0] = False
+    assert await scheduler.run_exclusive(failing_job) is True
+
+
+@pytest.mark.asyncio
+async def test_run_exclusive_records_unlock_failure(db_pool, monkeypatch):
+    """
+    Тест: сбой открытия уроков попадает в job_runs как ERROR (задача не глотает ошибку)
+    """
+    monkeypatch.setattr(db, "unlock_ready_lessons", AsyncMock(side_effect=Exception("db down")))
+
+    assert await scheduler.run_exclusive(scheduler.check_lesson_unlocks) is False
+
+    pool = await get_pool()
+    row = await pool.fetchrow("SELECT * FROM job_runs WHERE job_name = 'check_lesson_unlocks'")
+    assert row["status"] == "ERROR"
+    assert row["error"] == "db down"
@@ -0,0 +1,108 @@
+"""
+Тесты отправителя сообщений (лимиты Telegram, RetryAfter)
+"""
+
+import pytest
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.unit]
+
+import time
+from unittest.mock import AsyncMock
+
+from telegram.error import RetryAfter, Forbidden
+
+from bot.services.sender import MessageSender, RateLimiter
+
+
+# ============================================
+# Tests: RateLimiter
+# ============================================
+
+@pytest.mark.asyncio
+async def test_rate_limiter_burst_then_spacing():
+    """
+    Тест: burst слотов сразу, дальше — с интервалом 1/rate
+    """
+    limiter = RateLimiter(rate=10, burst=3)
+    now = 100.0
+
+    waits = [limiter.reserve(now) for _ in range(5)]
+
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3] == pytest.approx(0.1)
+    assert waits[4] == pytest.approx(0.2)
+
+
+# ============================================
+# Tests: MessageSender
+# ============================================
+
+@pytest.mark.asyncio
+async def test_send_many_reports_each_recipient(mock_bot):
+    """
+    Тест: ошибка одного получателя не мешает остальным, результат — по каждому
+    """
+    async def send_message(chat_id, text, **kwargs):
+        if chat_id == 2:
+            raise Forbidden("bot was blocked by the user")
+
+    mock_bot.send_message = AsyncMock(side_effect=send_message)
+    sender = MessageSender(rate_per_second=1000)
+
+    report = await sender.send_many(mock_bot, [(1, "a"), (2, "b"), (3, "c")])
+
+    assert report.sent == 2
+    assert report.failed == 1
+    assert report.delivered_ids == [1, 3]
+    failed = [r for r in report.results if not r.ok][0]
+    assert failed.chat_id == 2
+    assert "blocked" in failed.error
+
+
+@pytest.mark.asyncio
+async def test_send_retries_after_retry_after(mock_bot):
+    """
+    Тест: RetryAfter → ждём и повторяем
+    """
+    mock_bot.send_message = AsyncMock(side_effect=[RetryAfter(0), None])
+    sender = MessageSender(rate_per_second=1000)
+
+    result = await sender.send(mock_bot, 1, "text")
+
+    assert result.ok
+    assert result.attempts == 2
+    assert mock_bot.send_message.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_send_gives_up_after_max_retries(mock_bot):
+    """
+    Тест: RetryAfter дольше max_retries → неуспех, без бесконечных попыток
+    """
+    mock_bot.send_message = AsyncMock(side_effect=RetryAfter(0))
+    sender = MessageSender(rate_per_second=1000, max_retries=2)
+
+    result = await sender.send(mock_bot, 1, "text")
+
+    assert not result.ok
+    assert result.attempts == 3
+
+
+@pytest.mark.asyncio
+async def test_send_per_chat_interval(mock_bot):
+    """
+    Тест: сообщения в один чат разнесены на per_chat_interval, в разные — нет
+    """
+    sender = MessageSender(rate_per_second=1000, per_chat_interval=0.2)
+
+    start = time.monotonic()
+    await sender.send_many(mock_bot, [(1, "a"), (2, "b"), (3, "c")])
+    different_chats = time.monotonic() - start
+
+    start = time.monotonic()
+    await sender.send_many(mock_bot, [(7, "a"), (7, "b"), (7, "c")])
+    same_chat = time.monotonic() - start
+
+    assert different_chats < 0.1
+    assert same_chat >= 0.35
+    assert mock_bot.send_message.call_count == 6
@@ -0,0 +1,145 @@
+"""
+Тесты индекса похожих ответов (bot/services/similarity.py)
+"""
+
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from bot.database import queries as db
+from bot.services import similarity
+from bot.services.prompts import prompt_registry
+from bot.services.similarity import IndexedAnswer, SimilarityIndex, similarity_index
+
+ANSWER = (
+    "Тренинг — это активное обучение через практику и собственный опыт участников, "
+    "а урок в школе чаще строится на передаче готовых знаний от учителя. "
+    "На тренинге важна групповая динамика и обратная связь."
+)
+# Тот же ответ с косметическими правками
+NEAR_COPY = (
+    "тренинг - это активное обучение через практику и собственный опыт участников; "
+    "а урок в школе чаще строится на передаче готовых знаний от учителя!! "
+    "На тренинге важна групповая динамика и обратная связь"
+)
+OTHER = (
+    "Главное отличие в роли ведущего: тренер не читает лекцию, а создаёт условия, "
+    "в которых люди сами приходят к выводам, пробуя новое поведение в упражнениях."
+)
+
+
+# ============================================
+# Tests: подписи и индекс
+# ============================================
+
+def test_signature_similarity():
+    """
+    Тест: косметические правки почти не меняют подпись, другой ответ — меняет
+    """
+    base = similarity.signature(ANSWER)
+
+    assert similarity.similarity(base, similarity.signature(NEAR_COPY)) >= 0.9
+    assert similarity.similarity(base, similarity.signature(OTHER)) < 0.3
+    assert similarity.signature("Коротко: да") is None
+    assert similarity.unpack_signature(similarity.pack_signature(base)) == base
+
+
+def test_index_find_per_lesson():
+    """
+    Тест: поиск только в своём уроке и только выше порога
+    """
+    index = SimilarityIndex(threshold=0.9)
+    index.add(1, IndexedAnswer(10, 111, "ACCEPT", "Хорошо", similarity.signature(ANSWER), "fp-1"))
+
+    match = index.find(1, similarity.signature(NEAR_COPY), "fp-1")
+
+    assert match is not None and match.answer.submission_id == 10
+    assert index.find(2, similarity.signature(NEAR_COPY), "fp-1") is None
+    assert index.find(1, similarity.signature(OTHER), "fp-1") is None
+    # Вердикт, полученный другим промптом урока, не переиспользуется
+    assert index.find(1, similarity.signature(NEAR_COPY), "fp-2") is None
+
+
+# ============================================
+# Tests: проверка ДЗ и БД
+# ============================================
+
+async def make_second_student(pool, tg_id: int = 222222222):
+    await pool.execute(
+        "INSERT INTO users (tg_id, username, full_name, state) VALUES ($1, 'copycat', 'Copy Cat', 'waiting_hw')",
+        tg_id
+    )
+    return tg_id
+
+
+@pytest.mark.asyncio
+async def test_copied_answer_reuses_verdict(enrolled_user, mock_update, mock_context):
+    """
+    Тест: почти копия чужого ответа — вердикт без модели, куратору уведомление
+    """
+    from bot.handlers.homework import grade_text_homework
+
+    pool = enrolled_user["pool"]
+    author = enrolled_user["user"]["tg_id"]
+    copycat = await make_second_student(pool)
+    lesson = await db.get_lesson(enrolled_user["current_lesson_id"])
+
+    check = AsyncMock(return_value={"verdict": "REVISE", "message": "Раскрой подробнее", "fallback": False})
+    with patch("bot.handlers.homework.check_homework_with_ai", check):
+        await grade_text_homework(mock_update(author, ANSWER), mock_context, author, lesson, ANSWER)
+        update = mock_update(copycat, NEAR_COPY)
+        await grade_text_homework(update, mock_context, copycat, lesson, NEAR_COPY)
+
+    assert check.await_count == 1
+    assert "Раскрой подробнее" in update.message.reply_text.call_args[0][0]
+    assert similarity_index.stats.cross_user >= 1
+
+    rows = await pool.fetch(
+        """
+        SELECT s.user_id, s.ai_verdict, ss.duplicate_of
+        FROM submission_signatures ss JOIN submissions s ON s.id = ss.submission_id
+        ORDER BY ss.submission_id
+        """
+    )
+    assert [(r["user_id"], r["ai_verdict"]) for r in rows] == [(author, "REVISE"), (copycat, "REVISE")]
+    assert rows[0]["duplicate_of"] is None and rows[1]["duplicate_of"] is not None
+
+    alert = await pool.fetchrow("SELECT chat_id, kind, text FROM outbox")
+    assert alert["kind"] == "duplicate_alert"
+    assert str(author) in alert["text"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_and_backfill(enrolled_user):
+    """
+    Тест: старые сдачи получают подписи без отпечатка промпта (в поиск не идут),
+    новые подписи из БД догружаются инкрементально
+    """
+    user_id = enrolled_user["user"]["tg_id"]
+    lesson_id = enrolled_user["current_lesson_id"]
+    old = await db.create_submission(user_id, lesson_id, ANSWER, "text", "ACCEPT", "Хорошо")
+    await db.create_submission(user_id, lesson_id, "Коротко: да", "text", "REVISE", "Мало")
+    await db.create_submission(user_id, lesson_id, OTHER, "text", "REVISE", "—", is_fallback=True)
+
+    index = SimilarityIndex(threshold=0.9, refresh_seconds=3600)
+    assert await index.backfill() == 2
+    assert await index.backfill() == 0
+
+    # Подпись посчитана, но промпт старой сдачи неизвестен — её вердикт не переиспользуется
+    assert await enrolled_user["pool"].fetchval(
+        "SELECT prompt_fingerprint IS NULL FROM submission_signatures WHERE submission_id = $1", old.id
+    )
+    assert len(index) == 0
+    assert index.find(lesson_id, similarity.signature(NEAR_COPY)) is None
+
+    lesson = await db.get_lesson(lesson_id)
+    prompt = prompt_registry.get(lesson.order_num, lesson.title, lesson.content_text or "")
+
+    # Подпись, сохранённая другим worker-ом, появляется после refresh
+    other = await db.create_submission(user_id, lesson_id, OTHER, "text", "REVISE", "Подробнее")
+    await db.save_submission_signatures([
+        (other.id, lesson_id, similarity.pack_signature(similarity.signature(OTHER)), None, None, prompt.fingerprint)
+    ])
+    assert await index.refresh() == 0  # интервал не прошёл
+    assert await index.refresh(force=True) == 1
+    assert index.find(lesson_id, similarity.signature(OTHER)).answer.submission_id == other.id
@@ -0,0 +1,139 @@
+"""
+Тесты потокового отзыва на ДЗ: разбор недописанного JSON, прореживание
+правок сообщения и проверка с stream=True.
+"""
+
+import pytest
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+from telegram.error import BadRequest, RetryAfter
+
+from bot.services import llm
+from bot.services.live_message import LiveMessage, TYPING_SUFFIX
+
+ANSWER = (
+    "Тренинг — это активное обучение через практику и собственный опыт участников, "
+    "а урок в школе чаще строится на передаче готовых знаний от учителя."
+)
+
+
+def fake_stream(pieces):
+    """Поток чанков в формате chat.completions (stream=True)"""
+    async def stream():
+        for piece in pieces:
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+    return stream()
+
+
+# ============================================
+# Tests: partial_json_field()
+# ============================================
+
+def test_partial_json_field_progressive():
+    """
+    Тест: значение поля извлекается по мере дописывания JSON
+    """
+    full = '{"verdict": "ACCEPT", "message": "Хорошо.\\nЕщё \\"мысль\\" \\u2014 тут"}'
+
+    assert llm.partial_json_field(full[:20], "message") is None
+    assert llm.partial_json_field(full[:38], "message") == "Хоро"
+    assert llm.partial_json_field(full, "message") == 'Хорошо.\nЕщё "мысль" — тут'
+
+
+def test_partial_json_field_cut_escape():
+    """
+    Тест: обрезанная escape-последовательность в конце отбрасывается
+    """
+    assert llm.partial_json_field('{"message": "ок \\u20', "message") == "ок "
+    assert llm.partial_json_field('{"message": "ок\\', "message") == "ок"
+
+
+# ============================================
+# Tests: LiveMessage
+# ============================================
+
+@pytest.mark.asyncio
+async def test_live_message_throttles_edits():
+    """
+    Тест: промежуточные правки не чаще min_interval, итоговая — всегда
+    """
+    message = Mock(edit_text=AsyncMock())
+    live = LiveMessage(message, min_interval=60)
+
+    await live.update("Отзыв")
+    await live.update("Отзыв длиннее")
+    await live.finish("Отзыв целиком", reply_markup=None)
+
+    texts = [c.args[0] for c in message.edit_text.call_args_list]
+    assert texts == ["Отзыв" + TYPING_SUFFIX, "Отзыв целиком"]
+    assert live.shown
+
+
+@pytest.mark.asyncio
+async def test_live_message_retry_after_and_errors():
+    """
+    Тест: RetryAfter откладывает правки; «message is not modified» — не ошибка
+    """
+    message = Mock(edit_text=AsyncMock(side_effect=RetryAfter(timedelta(seconds=30))))
+    live = LiveMessage(message, min_interval=0)
+
+    await live.update("раз")
+    await live.update("раз два")
+
+    assert message.edit_text.call_count == 1
+    assert not live.shown
+
+    message.edit_text = AsyncMock(side_effect=BadRequest("Message is not modified"))
+    assert await live.finish("итог")
+
+
+# ============================================
+# Tests: check_homework_with_ai(on_progress=...)
+# ============================================
+
+@pytest.mark.asyncio
+async def test_check_homework_streams_message():
+    """
+    Тест: on_progress получает растущий текст отзыва, вердикт разобран из полного ответа
+    """
+    pieces = ['{"verdict": "RE', 'VISE", "mess', 'age": "Раскрой ', 'подробнее', '"}']
+    create = AsyncMock(return_value=fake_stream(pieces))
+    progress = AsyncMock()
+
+    with patch.object(llm.config, "LLM_CACHE_ENABLED", False), \
+            patch.object(llm.client.chat.completions, "create", create):
+        result = await llm.check_homework_with_ai(1, "Урок 1", "Задание", ANSWER, on_progress=progress)
+
+    assert create.call_args.kwargs["stream"] is True
+    assert [c.args[0] for c in progress.call_args_list] == ["Раскрой ", "Раскрой подробнее", "Раскрой подробнее"]
+    assert result == {"verdict": "REVISE", "message": "Раскрой подробнее", "fallback": False}
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_grade_text_homework_edits_placeholder(enrolled_user, mock_update, mock_context):
+    """
+    Тест: итог проверки дописывается в сообщение-заглушку, а не новым сообщением
+    """
+    from bot.database import queries as db
+    from bot.handlers.homework import grade_text_homework
+
+    user_id = enrolled_user["user"]["tg_id"]
+    lesson = await db.get_lesson(enrolled_user["current_lesson_id"])
+    update = mock_update(user_id, ANSWER)
+    status_msg = Mock(edit_text=AsyncMock(), delete=AsyncMock())
+
+    async def streaming_check(**kwargs):
+        await kwargs["on_progress"]("Раскрой")
+        return {"verdict": "REVISE", "message": "Раскрой подробнее", "fallback": False}
+
+    with patch("bot.handlers.homework.check_homework_with_ai", streaming_check):
+        await grade_text_homework(update, mock_context, user_id, lesson, ANSWER, status_msg)
+
+    texts = [c.args[0] for c in status_msg.edit_text.call_args_list]
+    assert texts == ["Раскрой" + TYPING_SUFFIX, "Раскрой подробнее\n\nПопробуй ещё раз:"]
+    status_msg.delete.assert_not_called()
+    update.message.reply_text.assert_not_called()
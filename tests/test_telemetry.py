@@ -0,0 +1,169 @@
+"""
+Тесты телеметрии LLM (bot/services/telemetry.py, таблица llm_calls)
+"""
+
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from bot.database import queries as db
+from bot.services import llm
+from bot.services.telemetry import (
+    LLMCall, TelemetryWriter, llm_telemetry,
+    OUTCOME_OK, OUTCOME_TIMEOUT, OUTCOME_CIRCUIT_OPEN
+)
+
+ANSWER = (
+    "Тренинг — это активное обучение через практику и собственный опыт участников, "
+    "а урок в школе чаще строится на передаче готовых знаний от учителя."
+)
+
+
+def make_response(content: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int):
+    usage = SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens)
+    )
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+# ============================================
+# Tests: TelemetryWriter
+# ============================================
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_writer_flushes_in_batches(db_pool):
+    """
+    Тест: записи пишутся пачками, все попадают в llm_calls
+    """
+    writer = TelemetryWriter(batch_size=2, flush_interval=60)
+    for n in range(5):
+        writer.record(LLMCall(model="m", lesson_number=n + 1, outcome=OUTCOME_OK, latency_ms=100))
+
+    insert = AsyncMock(side_effect=db.insert_llm_calls)
+    with patch.object(db, "insert_llm_calls", insert):
+        written = await writer.flush()
+
+    assert written == 5
+    assert [len(c.args[0]) for c in insert.call_args_list] == [2, 2, 1]
+    assert await db_pool.fetchval("SELECT COUNT(*) FROM llm_calls") == 5
+    assert writer.stats.written == 5
+
+
+@pytest.mark.asyncio
+async def test_writer_drops_on_overflow_and_db_error():
+    """
+    Тест: переполненный буфер вытесняет старые записи; ошибка БД не пробрасывается
+    """
+    writer = TelemetryWriter(batch_size=10, flush_interval=60, max_buffer=2)
+    for n in range(3):
+        writer.record(LLMCall(model="m", lesson_number=n, outcome=OUTCOME_OK))
+
+    assert writer.stats.dropped == 1
+
+    with patch.object(db, "insert_llm_calls", AsyncMock(side_effect=ConnectionError("db down"))):
+        assert await writer.flush() == 0
+
+    assert writer.stats.dropped == 3
+
+
+# ============================================
+# Tests: get_llm_call_summary()
+# ============================================
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_llm_call_summary_per_lesson(db_pool):
+    """
+    Тест: сводка по урокам — p50/p95 без отбитых breaker-ом, токены, стоимость,
+    размер ответов студентов без повторов
+    """
+    writer = TelemetryWriter()
+    for latency in (100, 200, 300, 400):
+        writer.record(LLMCall(
+            model="m", lesson_number=1, outcome=OUTCOME_OK, latency_ms=latency,
+            prompt_tokens=1000, completion_tokens=100, cached_tokens=500,
+            answer_tokens=300, answer_tokens_sent=200
+        ))
+    writer.record(LLMCall(model="m", lesson_number=1, outcome=OUTCOME_CIRCUIT_OPEN, answer_tokens=900))
+    # Повтор той же проверки — ответ студента в размерах не дублируется
+    writer.record(LLMCall(
+        model="m", lesson_number=1, outcome=OUTCOME_TIMEOUT, latency_ms=5000,
+        answer_tokens=300, answer_tokens_sent=200, attempt=2
+    ))
+    writer.record(LLMCall(model="m", lesson_number=2, outcome=OUTCOME_TIMEOUT, latency_ms=15000))
+    await writer.flush()
+
+    with patch.object(db.config, "LLM_PRICE_INPUT_PER_1M", 1.0), \
+            patch.object(db.config, "LLM_PRICE_CACHED_INPUT_PER_1M", 0.5), \
+            patch.object(db.config, "LLM_PRICE_OUTPUT_PER_1M", 2.0):
+        rows = await db.get_llm_call_summary(24)
+
+    lesson1, lesson2, total = rows
+    assert lesson1["lesson_number"] == 1
+    assert lesson1["calls"] == 6
+    assert lesson1["failures"] == 2
+    assert lesson1["p50_ms"] == 300
+    assert lesson1["p95_ms"] == pytest.approx(4080)
+    # Размер ответов — по первым попыткам, без отбитых breaker-ом
+    assert lesson1["answers"] == 4
+    assert (lesson1["answer_tokens"], lesson1["answer_tokens_sent"]) == (1200, 800)
+    assert lesson1["answers_trimmed"] == 4
+    assert lesson1["prompt_tokens"] == 4000
+    # 4 × (500 × 1.0 + 500 × 0.5 + 100 × 2.0) / 1M
+    assert lesson1["cost_usd"] == pytest.approx(4 * 950 / 1_000_000)
+    assert lesson2["failures"] == 1
+    assert total["lesson_number"] is None
+    assert total["calls"] == 7
+
+
+# ============================================
+# Tests: check_homework_with_ai() пишет телеметрию
+# ============================================
+
+@pytest.mark.asyncio
+async def test_check_homework_records_usage():
+    """
+    Тест: успешный вызов — токены и задержка; таймаут — исход и причина
+    """
+    response = make_response('{"verdict": "ACCEPT", "message": "Хорошо"}', 1200, 80, 1024)
+
+    with patch.object(llm.config, "LLM_CACHE_ENABLED", False), \
+            patch.object(llm.client.chat.completions, "create", AsyncMock(return_value=response)):
+        await llm.check_homework_with_ai(3, "Урок 3", "Задание", ANSWER)
+    ok = llm_telemetry._buffer[-1]
+
+    with patch.object(llm.config, "LLM_CACHE_ENABLED", False), \
+            patch.object(llm.client.chat.completions, "create", AsyncMock(side_effect=TimeoutError())):
+        await llm.check_homework_with_ai(3, "Урок 3", "Задание", ANSWER)
+    failed = llm_telemetry._buffer[-1]
+
+    assert ok.outcome == OUTCOME_OK
+    assert (ok.lesson_number, ok.prompt_tokens, ok.completion_tokens, ok.cached_tokens) == (3, 1200, 80, 1024)
+    assert ok.prompt_fingerprint
+    assert failed.outcome == OUTCOME_TIMEOUT
+    assert failed.fallback_reason.startswith("TimeoutError")
+
+
+@pytest.mark.asyncio
+@pytest.mark.integration
+async def test_llm_stat_handler(db_pool, mock_update, mock_context):
+    """
+    Тест: /llmstat выводит строку по уроку и итог
+    """
+    from bot.handlers.admin import llm_stat_handler
+
+    writer = TelemetryWriter()
+    writer.record(LLMCall(model="m", lesson_number=5, outcome=OUTCOME_OK, latency_ms=1500))
+    await writer.flush()
+
+    update = mock_update(999)
+    with patch.object(db.config, "ADMIN_IDS", [999]):
+        await llm_stat_handler(update, mock_context)
+
+    text = update.message.reply_text.call_args[0][0]
+    assert "Урок 5: 1 выз., 1.5с / 1.5с" in text
+    assert "Всего:" in text
@@ -0,0 +1,175 @@
+"""
+Тесты кэша вердиктов LLM
+
+Проверяем нормализацию ответа, LRU в памяти, БД, TTL и интеграцию с проверкой ДЗ.
+"""
+
+import pytest
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.integration]
+
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from bot.database.connection import count_queries, get_pool
+from bot.services import llm
+from bot.services.verdict_cache import VerdictCache, answer_hash, normalize_answer, verdict_cache
+
+FP = "0123456789abcdef"
+
+# Осмысленные ответы (проходят локальную предпроверку)
+ANSWER = "Тренинг для меня — это короткий формат, после которого человек начинает действовать иначе"
+OTHER_ANSWER = "Я понял, что главное в тренинге не знания, а навык, который человек применит завтра на работе"
+
+
+def llm_response(verdict: str, message: str):
+    content = json.dumps({"verdict": verdict, "message": message})
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+# ============================================
+# Tests: нормализация
+# ============================================
+
+def test_normalize_trivial_edits():
+    """
+    Тест: регистр, пробелы, ё и знаки по краям не меняют ключ
+    """
+    assert normalize_answer("  Тренинг —  это\nизменение поведения! ") == "тренинг — это изменение поведения"
+    assert answer_hash("Ёлка растёт.") == answer_hash("елка  растет")
+    assert answer_hash("тренинг это урок") != answer_hash("тренинг это не урок")
+
+
+# ============================================
+# Tests: VerdictCache
+# ============================================
+
+@pytest.mark.asyncio
+async def test_cache_memory_hit_without_db(db_pool):
+    """
+    Тест: повтор после put — из памяти, без запросов к БД
+    """
+    cache = VerdictCache(max_size=10, ttl_seconds=3600)
+    await cache.put(FP, "Мой ответ", "REVISE", "Доработай")
+
+    with count_queries() as counter:
+        cached = await cache.get(FP, "мой   ответ.")
+
+    assert cached == {"verdict": "REVISE", "message": "Доработай"}
+    assert counter.count == 0
+    assert cache.stats.memory_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_db_hit_shared_between_workers(db_pool):
+    """
+    Тест: другой процесс (пустая память) получает вердикт из БД
+    """
+    await VerdictCache().put(FP, "Мой ответ", "ACCEPT", "Отлично")
+
+    other = VerdictCache()
+    assert await other.get(FP, "Мой ответ") == {"verdict": "ACCEPT", "message": "Отлично"}
+    assert other.stats.db_hits == 1
+
+    # Теперь — из памяти
+    assert await other.get(FP, "Мой ответ") is not None
+    assert other.stats.memory_hits == 1
+
+    pool = await get_pool()
+    assert await pool.fetchval("SELECT hits FROM llm_verdict_cache") == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_ttl_expired(db_pool):
+    """
+    Тест: устаревшая запись не отдаётся
+    """
+    await VerdictCache(ttl_seconds=3600).put(FP, "Мой ответ", "ACCEPT", "Отлично")
+    pool = await get_pool()
+    await pool.execute("UPDATE llm_verdict_cache SET created_at = NOW() - INTERVAL '2 hours'")
+
+    cache = VerdictCache(ttl_seconds=3600)
+    assert await cache.get(FP, "Мой ответ") is None
+    assert cache.stats.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_lru_eviction(db_pool):
+    """
+    Тест: память ограничена max_size — вытесняется самый старый
+    """
+    cache = VerdictCache(max_size=2)
+    await cache.put(FP, "один", "ACCEPT", "1")
+    await cache.put(FP, "два", "ACCEPT", "2")
+    await cache.put(FP, "три", "ACCEPT", "3")
+
+    with count_queries() as counter:
+        await cache.get(FP, "один")
+    assert counter.count == 1  # ушли в БД
+
+
+@pytest.mark.asyncio
+async def test_cache_bypass(db_pool):
+    """
+    Тест: bypass — кэш не читается
+    """
+    cache = VerdictCache()
+    await cache.put(FP, "Мой ответ", "ACCEPT", "Отлично")
+
+    assert await cache.get(FP, "Мой ответ", bypass=True) is None
+    assert cache.stats.bypassed == 1
+
+
+# ============================================
+# Tests: check_homework_with_ai() + кэш
+# ============================================
+
+@pytest.mark.asyncio
+async def test_check_homework_uses_cache(db_pool):
+    """
+    Тест: повторный (слегка изменённый) ответ не вызывает модель
+    """
+    create = AsyncMock(return_value=llm_response("REVISE", "Раскрой мысль"))
+
+    with patch.object(llm.client.chat.completions, "create", create):
+        first = await llm.check_homework_with_ai(2, "Урок 2", "Задание", ANSWER)
+        second = await llm.check_homework_with_ai(2, "Урок 2", "Задание", "  " + ANSWER.lower() + ".")
+
+    assert first == second == {"verdict": "REVISE", "message": "Раскрой мысль", "fallback": False}
+    assert create.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_check_homework_cache_bypass_refreshes(db_pool):
+    """
+    Тест: use_cache=False — модель вызывается заново, кэш обновляется
+    """
+    create = AsyncMock(side_effect=[
+        llm_response("REVISE", "Раскрой мысль"),
+        llm_response("ACCEPT", "Теперь хорошо")
+    ])
+
+    with patch.object(llm.client.chat.completions, "create", create):
+        await llm.check_homework_with_ai(2, "Урок 2", "Задание", ANSWER)
+        fresh = await llm.check_homework_with_ai(2, "Урок 2", "Задание", ANSWER, use_cache=False)
+        cached = await llm.check_homework_with_ai(2, "Урок 2", "Задание", ANSWER)
+
+    assert create.await_count == 2
+    assert fresh == cached == {"verdict": "ACCEPT", "message": "Теперь хорошо", "fallback": False}
+
+
+@pytest.mark.asyncio
+async def test_check_homework_fallback_not_cached(db_pool):
+    """
+    Тест: ошибка модели → fallback, в кэш не попадает
+    """
+    create = AsyncMock(side_effect=Exception("timeout"))
+
+    with patch.object(llm.client.chat.completions, "create", create):
+        await llm.check_homework_with_ai(2, "Урок 2", "Задание", OTHER_ANSWER)
+        await llm.check_homework_with_ai(2, "Урок 2", "Задание", OTHER_ANSWER)
+
+    assert create.await_count == 2
+    pool = await get_pool()
+    assert await pool.fetchval("SELECT COUNT(*) FROM llm_verdict_cache") == 0
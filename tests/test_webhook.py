@@ -0,0 +1,134 @@
+"""
+Тесты HTTP-сервера webhook
+
+Проверяем секрет, постановку в очередь, переполнение очереди и /health.
+"""
+
+import pytest
+
+pytestmark = [pytest.mark.asyncio, pytest.mark.unit]
+
+import asyncio
+from types import SimpleNamespace
+from aiohttp.test_utils import TestClient, TestServer
+from telegram import Bot
+
+from bot.config import config
+from bot.webhook import SECRET_HEADER, create_web_app
+
+SECRET = "s3cret"
+
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+        "text": "привет"
+    }
+}
+
+
+@pytest.fixture
+def webhook_config(monkeypatch):
+    monkeypatch.setattr(config, "WEBHOOK_URL", "https://example.com/telegram")
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", SECRET)
+
+
+def make_app(queue_size: int = 10, running: bool = True):
+    """Минимальная замена Application: бот, очередь, флаг running"""
+    return SimpleNamespace(bot=Bot("123:test"), update_queue=asyncio.Queue(maxsize=queue_size), running=running)
+
+
+async def make_client(app) -> TestClient:
+    client = TestClient(TestServer(create_web_app(app)))
+    await client.start_server()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_wrong_secret(webhook_config):
+    """
+    Тест: без правильного секрета → 403, в очередь ничего не попадает
+    """
+    app = make_app()
+    client = await make_client(app)
+    try:
+        resp = await client.post("/telegram", json=UPDATE, headers={SECRET_HEADER: "wrong"})
+        assert resp.status == 403
+        resp = await client.post("/telegram", json=UPDATE)
+        assert resp.status == 403
+    finally:
+        await client.close()
+
+    assert app.update_queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_webhook_enqueues_update(webhook_config):
+    """
+    Тест: корректное обновление → 200 и Update в очереди приложения
+    """
+    app = make_app()
+    client = await make_client(app)
+    try:
+        resp = await client.post("/telegram", json=UPDATE, headers={SECRET_HEADER: SECRET})
+        assert resp.status == 200
+    finally:
+        await client.close()
+
+    update = app.update_queue.get_nowait()
+    assert update.update_id == 1
+    assert update.message.text == "привет"
+
+
+@pytest.mark.asyncio
+async def test_webhook_bad_json(webhook_config):
+    """
+    Тест: мусор вместо JSON → 400
+    """
+    client = await make_client(make_app())
+    try:
+        resp = await client.post("/telegram", data=b"not json", headers={SECRET_HEADER: SECRET})
+        assert resp.status == 400
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_webhook_queue_full(webhook_config):
+    """
+    Тест: очередь переполнена → 503 (Telegram повторит доставку)
+    """
+    app = make_app(queue_size=1)
+    client = await make_client(app)
+    try:
+        first = await client.post("/telegram", json=UPDATE, headers={SECRET_HEADER: SECRET})
+        second = await client.post("/telegram", json=UPDATE, headers={SECRET_HEADER: SECRET})
+    finally:
+        await client.close()
+
+    assert first.status == 200
+    assert second.status == 503
+    assert app.update_queue.qsize() == 1
+
+
+@pytest.mark.asyncio
+async def test_health(webhook_config):
+    """
+    Тест: /health отдаёт состояние и заполненность очереди
+    """
+    app = make_app(queue_size=5)
+    app.update_queue.put_nowait(object())
+    client = await make_client(app)
+    try:
+        resp = await client.get("/health")
+        assert resp.status == 200
+        assert await resp.json() == {"status": "ok", "queue_size": 1, "queue_max": 5}
+
+        app.running = False
+        resp = await client.get("/health")
+        assert resp.status == 503
+    finally:
+        await client.close()